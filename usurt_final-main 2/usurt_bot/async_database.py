@@ -0,0 +1,387 @@
+import asyncio
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from database import Database, Profile, SearchCriteria
+from services.cache import TTLCache
+from services.query_tracer import QueryStats, QueryTracer
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database.
+
+    Все записи выполняются в одном потоке через единственное соединение-писатель,
+    чтения распределяются по небольшому пулу read-only соединений (только в
+    режиме WAL, иначе они тоже идут через писателя). Обработчики только ждут
+    результат и не блокируют цикл событий aiogram.
+
+    В режиме write_behind лайки, жалобы и регистрации копятся в очереди
+    писателя и сбрасываются групповым коммитом; чтения, которым нужно видеть
+    свои записи (взаимный лайк, число жалоб), выполняются через писателя.
+
+    Анкеты читаются через LRU-кэш: в нем лежат неизменяемые записи
+    (Profile - кортеж), которые сбрасываются при любом изменении анкеты.
+    Личная статистика кэшируется на stats_ttl секунд и сбрасывается, когда
+    пользователь ставит или получает лайк.
+
+    observer(method, seconds), если задан, получает время каждого вызова,
+    включая ожидание свободного соединения (см. BotMetrics.observe_db).
+    Слушатели add_profile_listener узнают user_id каждой измененной анкеты
+    (None - изменились все анкеты).
+    """
+
+    def __init__(
+        self,
+        db_path: str = "university_dating.db",
+        readers: int = 2,
+        write_behind: bool = False,
+        flush_rows: int = 100,
+        flush_interval: float = 0.05,
+        pragmas: Optional[Dict[str, Any]] = None,
+        stats_ttl: float = 30.0,
+        stats_cache_size: int = 10_000,
+        profile_cache_size: int = 10_000,
+        observer: Optional[Callable[[str, float], None]] = None,
+        tracer: Optional[QueryTracer] = None,
+    ):
+        self.db_path = db_path
+        self.observer = observer
+        # Общий для писателя и читателей: статистика SQL-запросов
+        self.tracer = tracer
+        # Кэшируется и отсутствие анкеты: has_profile спрашивает о нем часто
+        self._profiles = TTLCache(max_size=profile_cache_size)
+        self._profile_epoch = 0
+        self._profile_listeners: List[Callable[[Optional[int]], None]] = []
+        self._user_stats = TTLCache(max_size=stats_cache_size, ttl=stats_ttl)
+        # Растет при каждом сбросе статистики: результат чтения, начатого до
+        # сброса, в кэш не попадает
+        self._stats_epoch = 0
+        self.write_behind = write_behind
+        # Таймер сброса очереди отложенной записи, даже если пакет не набран
+        self.flush_interval = flush_interval
+        self._flush_task: Optional[asyncio.Task] = None
+        self._writer = Database(
+            db_path,
+            write_behind=write_behind,
+            flush_rows=flush_rows,
+            flush_interval=flush_interval,
+            pragmas=pragmas,
+            tracer=tracer,
+        )
+        self._write_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="db-writer"
+        )
+        # Настройки соединения после открытия не меняются - читаем их один раз
+        self.pragmas = self._writer.get_pragmas()
+
+        # In-memory база не видна другим соединениям - читаем через писателя
+        if db_path == ":memory:":
+            readers = 0
+        # Без WAL читатели ждут писателя на блокировке файла и только
+        # добавляют задержку (bench_handler_latency) - тоже читаем через писателя
+        elif readers > 0 and self.pragmas["journal_mode"] != "wal":
+            logger.info(
+                "journal_mode не WAL: чтения идут через писателя, пул читателей не создается"
+            )
+            readers = 0
+        self._readers: queue.SimpleQueue[Database] = queue.SimpleQueue()
+        self._reader_count = max(readers, 0)
+        for _ in range(self._reader_count):
+            self._readers.put(
+                Database(db_path, read_only=True, pragmas=pragmas, tracer=tracer)
+            )
+        self._read_executor = (
+            ThreadPoolExecutor(
+                max_workers=self._reader_count, thread_name_prefix="db-reader"
+            )
+            if self._reader_count
+            else None
+        )
+
+    async def _write(self, method: str, *args: Any) -> Any:
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+        return await self._run(
+            method, self._write_executor, getattr(self._writer, method), *args
+        )
+
+    async def _read(self, method: str, *args: Any) -> Any:
+        if self._read_executor is None:
+            return await self._write(method, *args)
+        return await self._run(
+            method, self._read_executor, self._call_reader, method, args
+        )
+
+    async def _run(
+        self, method: str, executor: ThreadPoolExecutor, func, *args: Any
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        if self.observer is None:
+            return await loop.run_in_executor(executor, func, *args)
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        finally:
+            self.observer(method, time.perf_counter() - started)
+
+    async def _read_your_writes(self, method: str, *args: Any) -> Any:
+        """Чтение, которое должно видеть записи из очереди отложенной записи"""
+        if self.write_behind:
+            return await self._write(method, *args)
+        return await self._read(method, *args)
+
+    def _call_reader(self, method: str, args: tuple) -> Any:
+        # Число потоков равно числу соединений, поэтому get() не блокируется
+        reader = self._readers.get()
+        try:
+            return getattr(reader, method)(*args)
+        finally:
+            self._readers.put(reader)
+
+    # --- Пользователи и анкеты ---
+
+    async def add_user(self, user_id: int, username: str, full_name: str):
+        await self._write("add_user", user_id, username, full_name)
+
+    async def save_profile(self, user_id: int, profile_data: Dict):
+        await self._write("save_profile", user_id, profile_data)
+        self._invalidate_profile(user_id)
+        self._invalidate_stats(user_id)
+
+    async def get_profile(self, user_id: int) -> Optional[Profile]:
+        """Анкета из кэша или из базы; возвращаемую запись менять нельзя"""
+        profile = self._profiles.get(user_id, _MISSING)
+        if profile is not _MISSING:
+            return profile
+        epoch = self._profile_epoch
+        profile = await self._read("get_profile", user_id)
+        # Анкету изменили, пока шло чтение, - результат мог устареть
+        if epoch == self._profile_epoch:
+            self._profiles.set(user_id, profile)
+        return profile
+
+    def _invalidate_profile(self, user_id: int):
+        self._profile_epoch += 1
+        self._profiles.pop(user_id)
+        for listener in self._profile_listeners:
+            listener(user_id)
+
+    def add_profile_listener(self, listener: Callable[[Optional[int]], None]):
+        self._profile_listeners.append(listener)
+
+    def remove_profile_listener(self, listener: Callable[[Optional[int]], None]):
+        self._profile_listeners.remove(listener)
+
+    def profile_cache_stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._profiles),
+            "max_size": self._profiles.max_size,
+            "hits": self._profiles.hits,
+            "misses": self._profiles.misses,
+            "evictions": self._profiles.evictions,
+        }
+
+    def top_queries(self, n: int = 10) -> Optional[List[QueryStats]]:
+        """Самые дорогие запросы с запуска; None, если трассировка выключена"""
+        if self.tracer is None:
+            return None
+        return self.tracer.top(n)
+
+    async def delete_profile(self, user_id: int):
+        await self._write("delete_profile", user_id)
+        self._invalidate_profile(user_id)
+        self._invalidate_stats(user_id)
+
+    async def set_profile_active(self, user_id: int, active: bool):
+        await self._write("set_profile_active", user_id, active)
+        self._invalidate_profile(user_id)
+
+    async def get_all_profiles(self, exclude_user_id: int) -> List[Profile]:
+        return await self._read("get_all_profiles", exclude_user_id)
+
+    async def migrate_gender_values(self) -> int:
+        updated = await self._write("migrate_gender_values")
+        self._profile_epoch += 1
+        self._profiles.clear()
+        for listener in self._profile_listeners:
+            listener(None)
+        return updated
+
+    async def get_profiles_by_gender(
+        self, exclude_user_id: int, gender: str
+    ) -> List[Profile]:
+        return await self._read("get_profiles_by_gender", exclude_user_id, gender)
+
+    async def get_feed_page(
+        self,
+        viewer_id: int,
+        after_user_id: int = 0,
+        gender: Optional[str] = None,
+        limit: int = 10,
+        criteria: Optional[SearchCriteria] = None,
+    ) -> List[Profile]:
+        return await self._read(
+            "get_feed_page", viewer_id, after_user_id, gender, limit, criteria
+        )
+
+    async def get_feed_ids(
+        self,
+        viewer_id: int,
+        after_user_id: int = 0,
+        gender: Optional[str] = None,
+        limit: int = 10,
+        criteria: Optional[SearchCriteria] = None,
+    ) -> List[int]:
+        return await self._read(
+            "get_feed_ids", viewer_id, after_user_id, gender, limit, criteria
+        )
+
+    async def filter_feed_ids(
+        self, viewer_id: int, user_ids: List[int], criteria: SearchCriteria
+    ) -> List[int]:
+        return await self._read("filter_feed_ids", viewer_id, user_ids, criteria)
+
+    async def search_profiles(
+        self, viewer_id: int, text: str, offset: int = 0, limit: int = 10
+    ) -> List[Profile]:
+        return await self._read("search_profiles", viewer_id, text, offset, limit)
+
+    async def get_ranking_rows(
+        self, user_ids: Optional[List[int]] = None
+    ) -> List[tuple]:
+        return await self._read("get_ranking_rows", user_ids)
+
+    async def get_viewed_ids(self, viewer_id: int) -> List[int]:
+        return await self._read("get_viewed_ids", viewer_id)
+
+    async def get_likers(self, user_id: int) -> List[int]:
+        return await self._read("get_likers", user_id)
+
+    async def save_search_criteria(self, user_id: int, criteria: SearchCriteria):
+        await self._write("save_search_criteria", user_id, criteria)
+
+    async def get_search_criteria(self, user_id: int) -> Optional[SearchCriteria]:
+        return await self._read("get_search_criteria", user_id)
+
+    async def get_faculties(self, limit: int = 10) -> List[str]:
+        return await self._read("get_faculties", limit)
+
+    # --- Лайки и жалобы ---
+
+    async def add_like(self, from_user_id: int, to_user_id: int):
+        await self._write("add_like", from_user_id, to_user_id)
+        self._invalidate_stats(from_user_id, to_user_id)
+
+    async def like(self, from_user_id: int, to_user_id: int) -> bool:
+        is_match = await self._write("like", from_user_id, to_user_id)
+        self._invalidate_stats(from_user_id, to_user_id)
+        return is_match
+
+    async def has_like(self, from_user_id: int, to_user_id: int) -> bool:
+        return await self._read_your_writes("has_like", from_user_id, to_user_id)
+
+    async def record_view(self, viewer_id: int, target_id: int, action: str):
+        await self._write("record_view", viewer_id, target_id, action)
+
+    async def has_view(self, viewer_id: int, target_id: int) -> bool:
+        # Просмотры всегда идут через очередь отложенной записи - читаем писателем
+        return await self._write("has_view", viewer_id, target_id)
+
+    async def flush(self):
+        """Сбрасывает очередь отложенной записи на диск"""
+        await self._write("flush")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Пустой сброс не ходит в поток писателя и не попадает в db_latency
+            if not self._writer.pending_rows:
+                continue
+            try:
+                # Своя метка: сбросы по таймеру не смешиваются с вызовами flush()
+                await self._run(
+                    "flush[timer]", self._write_executor, self._writer.flush
+                )
+            except Exception as e:
+                logger.error(f"Ошибка при сбросе отложенной записи: {e}")
+
+    async def add_complaint(self, from_user_id: int, to_user_id: int, reason: str = ""):
+        await self._write("add_complaint", from_user_id, to_user_id, reason)
+
+    async def get_complaints_count(self, to_user_id: int) -> int:
+        return await self._read_your_writes("get_complaints_count", to_user_id)
+
+    async def block_user(self, user_id: int):
+        await self._write("block_user", user_id)
+        self._invalidate_profile(user_id)
+
+    async def unblock_user(self, user_id: int):
+        await self._write("unblock_user", user_id)
+        self._invalidate_profile(user_id)
+
+    async def is_user_blocked(self, user_id: int) -> bool:
+        return await self._read("is_user_blocked", user_id)
+
+    # --- Статистика ---
+
+    async def get_total_users(self) -> int:
+        return await self._read("get_total_users")
+
+    async def get_total_profiles(self) -> int:
+        return await self._read("get_total_profiles")
+
+    async def get_active_profiles_count(self) -> int:
+        return await self._read("get_active_profiles_count")
+
+    async def get_mutual_likes(self, user_id: int) -> List[Profile]:
+        return await self._read("get_mutual_likes", user_id)
+
+    async def get_matches_count(self, user_id: int) -> int:
+        return await self._read("get_matches_count", user_id)
+
+    async def get_user_stats(self, user_id: int) -> Optional[Dict]:
+        stats = self._user_stats.get(user_id)
+        if stats is not None:
+            return stats
+        epoch = self._stats_epoch
+        stats = await self._read_your_writes("get_user_stats", user_id)
+        if stats is not None and epoch == self._stats_epoch:
+            self._user_stats.set(user_id, stats)
+        return stats
+
+    def _invalidate_stats(self, *user_ids: int):
+        self._stats_epoch += 1
+        for user_id in user_ids:
+            self._user_stats.pop(user_id)
+
+    async def get_user_likes_count(self, user_id: int) -> int:
+        return await self._read("get_user_likes_count", user_id)
+
+    async def get_user_likes_received_count(self, user_id: int) -> int:
+        return await self._read("get_user_likes_received_count", user_id)
+
+    async def get_pragmas(self) -> Dict[str, Any]:
+        """Настройки SQLite писателя, прочитанные при открытии базы"""
+        return dict(self.pragmas)
+
+    async def close(self):
+        """Дожидается выполнения запросов и закрывает все соединения"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await asyncio.to_thread(self._shutdown)
+
+    def _shutdown(self):
+        if self._read_executor is not None:
+            self._read_executor.shutdown(wait=True)
+        self._write_executor.shutdown(wait=True)
+        for _ in range(self._reader_count):
+            self._readers.get().close()
+        self._writer.close()
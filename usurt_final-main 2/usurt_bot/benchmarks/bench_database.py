@@ -0,0 +1,535 @@
+"""Бенчмарк публичных методов Database на синтетической базе 10k / 100k / 1M анкет.
+
+База заполняется детерминированно (--seed): пользователи, анкеты, лайки с
+долей взаимных, матчи, просмотры и жалобы. Заполненная база кэшируется в
+--data-dir и для каждого прогона копируется, поэтому пишущие методы не
+портят эталон. Каждый метод вызывается, пока не выйдет --budget секунд
+(не меньше --min-iterations раз); в отчет идут медиана, p95 и среднее.
+
+Результаты сохраняются в JSON (--output). С --baseline результаты
+сравниваются с прошлым прогоном, и скрипт завершается с кодом 1, если медиана
+какого-то метода выросла больше чем на --threshold.
+
+Запуск из папки usurt_bot:
+    python benchmarks/bench_database.py --scales 10k,100k --output now.json
+    python benchmarks/bench_database.py --scales 10k,100k --baseline now.json
+"""
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from config_data.config import STORAGE_PRESETS  # noqa: E402
+from database import (  # noqa: E402
+    INSERT_LIKE,
+    Database,
+    SearchCriteria,
+    normalize_gender,
+)
+
+# Меняется при изменении схемы заполнения - старые кэшированные базы не подходят
+SEED_VERSION = 4
+FACULTIES = ("ИТ", "Экономика", "Строительство", "Транспорт", "Управление", "Механика")
+GENDERS = ("мужской", "женский")
+# Новые пользователи для пишущих методов получают id выше засеянных
+WRITE_ID_OFFSET = 10_000_000
+# Методы, которые не измеряются: закрытие соединения и чтение настроек
+NOT_BENCHMARKED = {"close", "get_pragmas"}
+
+# Описание анкеты - три увлечения из списка: поиск по слову находит ~15% анкет
+INTERESTS = (
+    "гитара",
+    "походы",
+    "шахматы",
+    "аниме",
+    "бег",
+    "фотография",
+    "настолки",
+    "кино",
+    "программирование",
+    "йога",
+    "танцы",
+    "футбол",
+    "книги",
+    "путешествия",
+    "кофе",
+    "волейбол",
+    "рисование",
+    "музыка",
+    "театр",
+    "сноуборд",
+)
+
+
+class Context(NamedTuple):
+    scale: int
+    rng: random.Random
+
+    def user(self) -> int:
+        return self.rng.randint(1, self.scale)
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[Database, Context, int], object]
+    # Подготовка к вызову, время которой не учитывается
+    prepare: Optional[Callable[[Database, Context, int], object]] = None
+
+
+def _profile(rng: random.Random, user_id: int) -> Dict:
+    return {
+        "name": f"User {user_id}",
+        "age": rng.randint(17, 25),
+        "gender": rng.choice(GENDERS),
+        "faculty": rng.choice(FACULTIES),
+        "course": rng.randint(1, 5),
+        "bio": "Люблю " + ", ".join(rng.sample(INTERESTS, 3)),
+        "photo_id": f"photo_{user_id}",
+    }
+
+
+def _criteria(rng: random.Random) -> SearchCriteria:
+    """Случайные критерии поиска: каждое ограничение задано примерно в половине случаев"""
+    age_min = rng.randint(17, 23)
+    return SearchCriteria(
+        gender=rng.choice(GENDERS + (None,)),
+        faculty=rng.choice(FACULTIES) if rng.random() < 0.7 else None,
+        courses=tuple(rng.sample(range(1, 6), rng.randint(1, 2)))
+        if rng.random() < 0.5
+        else (),
+        age_min=age_min if rng.random() < 0.5 else None,
+        age_max=age_min + rng.randint(1, 3) if rng.random() < 0.5 else None,
+    )
+
+
+def _queue_views(db: Database, ctx: Context, i: int):
+    # На одну строку меньше порога - сброс делает уже замеряемый вызов
+    viewer = ctx.user()
+    for target in range(1, db.flush_rows):
+        db.record_view(viewer, WRITE_ID_OFFSET + target, "skip")
+
+
+# Порядок важен: сначала чтения, затем записи, удаление - последним
+CASES = [
+    Case("get_profile", lambda db, ctx, i: db.get_profile(ctx.user())),
+    Case("is_user_blocked", lambda db, ctx, i: db.is_user_blocked(ctx.user())),
+    Case("has_like", lambda db, ctx, i: db.has_like(ctx.user(), ctx.user())),
+    Case("has_view", lambda db, ctx, i: db.has_view(ctx.user(), ctx.user())),
+    Case(
+        "get_complaints_count", lambda db, ctx, i: db.get_complaints_count(ctx.user())
+    ),
+    Case("get_total_users", lambda db, ctx, i: db.get_total_users()),
+    Case("get_total_profiles", lambda db, ctx, i: db.get_total_profiles()),
+    Case(
+        "get_active_profiles_count", lambda db, ctx, i: db.get_active_profiles_count()
+    ),
+    Case("get_mutual_likes", lambda db, ctx, i: db.get_mutual_likes(ctx.user())),
+    Case("get_matches_count", lambda db, ctx, i: db.get_matches_count(ctx.user())),
+    Case("get_user_stats", lambda db, ctx, i: db.get_user_stats(ctx.user())),
+    Case(
+        "get_user_likes_count", lambda db, ctx, i: db.get_user_likes_count(ctx.user())
+    ),
+    Case(
+        "get_user_likes_received_count",
+        lambda db, ctx, i: db.get_user_likes_received_count(ctx.user()),
+    ),
+    Case(
+        "get_feed_page",
+        lambda db, ctx, i: db.get_feed_page(
+            ctx.user(), ctx.user(), gender=ctx.rng.choice(GENDERS)
+        ),
+    ),
+    Case(
+        "get_feed_ids",
+        lambda db, ctx, i: db.get_feed_ids(ctx.user(), ctx.user(), limit=50),
+    ),
+    # Не метод, а отдельный сценарий: лента по сохраненным критериям поиска
+    Case(
+        "get_feed_ids[criteria]",
+        lambda db, ctx, i: db.get_feed_ids(
+            ctx.user(), ctx.user(), limit=20, criteria=_criteria(ctx.rng)
+        ),
+    ),
+    Case(
+        "filter_feed_ids",
+        lambda db, ctx, i: db.filter_feed_ids(
+            ctx.user(), [ctx.user() for _ in range(10)], SearchCriteria()
+        ),
+    ),
+    Case(
+        "search_profiles",
+        lambda db, ctx, i: db.search_profiles(
+            ctx.user(), ctx.rng.choice(INTERESTS)[:5], 0, 6
+        ),
+    ),
+    Case("get_viewed_ids", lambda db, ctx, i: db.get_viewed_ids(ctx.user())),
+    Case("get_likers", lambda db, ctx, i: db.get_likers(ctx.user())),
+    # Полная загрузка хранилища ранжирования и обновление одной анкеты
+    Case("get_ranking_rows", lambda db, ctx, i: db.get_ranking_rows()),
+    Case("get_ranking_rows[one]", lambda db, ctx, i: db.get_ranking_rows([ctx.user()])),
+    Case("get_search_criteria", lambda db, ctx, i: db.get_search_criteria(ctx.user())),
+    Case("get_faculties", lambda db, ctx, i: db.get_faculties()),
+    Case("get_all_profiles", lambda db, ctx, i: db.get_all_profiles(ctx.user())),
+    Case(
+        "get_profiles_by_gender",
+        lambda db, ctx, i: db.get_profiles_by_gender(
+            ctx.user(), ctx.rng.choice(GENDERS)
+        ),
+    ),
+    Case(
+        "add_user",
+        lambda db, ctx, i: db.add_user(WRITE_ID_OFFSET + i, f"new{i}", f"New {i}"),
+    ),
+    Case(
+        "save_profile",
+        lambda db, ctx, i: db.save_profile(
+            WRITE_ID_OFFSET + i, _profile(ctx.rng, WRITE_ID_OFFSET + i)
+        ),
+    ),
+    Case("add_like", lambda db, ctx, i: db.add_like(ctx.user(), ctx.user())),
+    Case("like", lambda db, ctx, i: db.like(ctx.user(), ctx.user())),
+    Case(
+        "record_view",
+        lambda db, ctx, i: db.record_view(ctx.user(), WRITE_ID_OFFSET + i, "skip"),
+    ),
+    Case("flush", lambda db, ctx, i: db.flush(), prepare=_queue_views),
+    Case(
+        "save_search_criteria",
+        lambda db, ctx, i: db.save_search_criteria(ctx.user(), _criteria(ctx.rng)),
+    ),
+    Case(
+        "add_complaint",
+        lambda db, ctx, i: db.add_complaint(ctx.user(), ctx.user(), "спам"),
+    ),
+    Case(
+        "set_profile_active",
+        lambda db, ctx, i: db.set_profile_active(ctx.user(), bool(i % 2)),
+    ),
+    Case("block_user", lambda db, ctx, i: db.block_user(ctx.user())),
+    Case("unblock_user", lambda db, ctx, i: db.unblock_user(ctx.user())),
+    Case("migrate_gender_values", lambda db, ctx, i: db.migrate_gender_values()),
+    Case("delete_profile", lambda db, ctx, i: db.delete_profile(WRITE_ID_OFFSET + i)),
+]
+
+
+def uncovered_methods() -> List[str]:
+    """Публичные методы Database, для которых нет замера"""
+    public = {
+        name
+        for name, _ in inspect.getmembers(Database, inspect.isfunction)
+        if not name.startswith("_")
+    }
+    return sorted(public - NOT_BENCHMARKED - {case.name for case in CASES})
+
+
+def parse_scale(value: str) -> int:
+    value = value.strip().lower()
+    for suffix, factor in (("k", 1_000), ("m", 1_000_000)):
+        if value.endswith(suffix):
+            return int(float(value[:-1]) * factor)
+    return int(value)
+
+
+# --- Заполнение ---
+
+
+def seed(path: str, scale: int, likes_per_user: int, mutual_rate: float, rng_seed: int):
+    """Заполняет пустую базу синтетическими данными масштаба scale"""
+    rng = random.Random(rng_seed)
+    # Заполнение не обязано переживать сбой - журнал и fsync не нужны;
+    # большой кэш страниц держит индексы в памяти при вставке
+    db = Database(
+        path,
+        pragmas={
+            "journal_mode": "OFF",
+            "synchronous": "OFF",
+            "cache_size": -512 * 1024,
+        },
+    )
+    cursor = db.conn.cursor()
+    chunk = 50_000
+    for start in range(1, scale + 1, chunk):
+        ids = range(start, min(start + chunk, scale + 1))
+        cursor.executemany(
+            "INSERT INTO users (user_id, username, full_name) VALUES (?, ?, ?)",
+            [(uid, f"user{uid}", f"User {uid}") for uid in ids],
+        )
+        rows = []
+        for uid in ids:
+            p = _profile(rng, uid)
+            # 95% анкет активны, 0.5% заблокированы
+            blocked = rng.random() < 0.005
+            active = not blocked and rng.random() < 0.95
+            rows.append(
+                (
+                    uid,
+                    p["name"],
+                    p["age"],
+                    normalize_gender(p["gender"]),
+                    p["faculty"],
+                    p["course"],
+                    p["bio"],
+                    p["photo_id"],
+                    int(active),
+                    int(blocked),
+                )
+            )
+        cursor.executemany(
+            "INSERT INTO profiles (user_id, name, age, gender, faculty, course, bio,"
+            " photo_id, active, blocked) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+        likes = []
+        for uid in ids:
+            for _ in range(likes_per_user):
+                target = rng.randint(1, scale)
+                if target == uid:
+                    continue
+                likes.append((uid, target))
+                if rng.random() < mutual_rate:
+                    likes.append((target, uid))
+        cursor.executemany(INSERT_LIKE, likes)
+        cursor.executemany(
+            "INSERT OR IGNORE INTO views (viewer_id, target_id, action) VALUES (?, ?, 'like')",
+            likes,
+        )
+        complaints = [
+            (rng.randint(1, scale), uid, "спам") for uid in ids if rng.random() < 0.01
+        ]
+        cursor.executemany(
+            "INSERT INTO complaints (from_user_id, to_user_id, reason) VALUES (?, ?, ?)",
+            complaints,
+        )
+        db.conn.commit()
+
+    cursor.execute(
+        """
+        INSERT OR IGNORE INTO matches (user_id, match_user_id)
+        SELECT DISTINCT l1.from_user_id, l1.to_user_id
+        FROM likes l1
+        JOIN likes l2
+            ON l2.from_user_id = l1.to_user_id AND l2.to_user_id = l1.from_user_id
+        """
+    )
+    db.conn.commit()
+    cursor.execute("ANALYZE")
+    db.close()
+
+
+def seeded_database(args, scale: int) -> str:
+    """Путь к засеянной базе; создает ее, если в кэше такой нет"""
+    os.makedirs(args.data_dir, exist_ok=True)
+    name = (
+        f"bench_v{SEED_VERSION}_{scale}_l{args.likes_per_user}"
+        f"_m{args.mutual_rate}_s{args.seed}.db"
+    )
+    path = os.path.join(args.data_dir, name)
+    if not os.path.exists(path):
+        print(f"Заполнение базы на {scale} анкет...", file=sys.stderr)
+        started = time.perf_counter()
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        seed(partial, scale, args.likes_per_user, args.mutual_rate, args.seed)
+        os.replace(partial, path)
+        print(f"  готово за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+    return path
+
+
+# --- Замеры ---
+
+
+def measure(
+    case: Case,
+    db: Database,
+    ctx: Context,
+    budget: float,
+    min_iterations: int,
+    max_iterations: int,
+) -> Dict:
+    timings = []
+    deadline = time.perf_counter() + budget
+    for i in range(max_iterations):
+        if i >= min_iterations and time.perf_counter() >= deadline:
+            break
+        if case.prepare is not None:
+            case.prepare(db, ctx, i)
+        started = time.perf_counter()
+        case.run(db, ctx, i)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "iterations": len(timings),
+        "median_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+        "mean_ms": statistics.mean(timings),
+    }
+
+
+def run_scale(args, scale: int, methods: Optional[set] = None) -> Dict[str, Dict]:
+    base_path = seeded_database(args, scale)
+    pragmas = STORAGE_PRESETS[args.storage].as_pragmas()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        shutil.copyfile(base_path, path)
+        # Сброс очереди просмотров только по числу строк, а не по таймеру,
+        # чтобы record_view и flush замерялись на одинаковых пакетах
+        db = Database(path, pragmas=pragmas, flush_interval=3600)
+        try:
+            for case in CASES:
+                if methods and case.name not in methods:
+                    continue
+                ctx = Context(scale, random.Random(f"{args.seed}:{case.name}"))
+                results[case.name] = measure(
+                    case, db, ctx, args.budget, args.min_iterations, args.max_iterations
+                )
+                print(
+                    f"{scale:>9} {case.name:<30} {results[case.name]['median_ms']:10.3f} ms",
+                    file=sys.stderr,
+                )
+        finally:
+            db.close()
+    return results
+
+
+def compare(
+    current: Dict, baseline: Dict, threshold: float, min_delta_ms: float
+) -> List[Dict]:
+    """Возвращает методы, медиана которых выросла больше чем на threshold
+
+    Изменения меньше min_delta_ms не считаются регрессией: на
+    микросекундных запросах это шум измерения.
+    """
+    regressions = []
+    for scale, methods in current["results"].items():
+        for method, now in methods.items():
+            before = baseline.get("results", {}).get(scale, {}).get(method)
+            if before is None:
+                continue
+            old, new = before["median_ms"], now["median_ms"]
+            if new - old > min_delta_ms and new > old * (1 + threshold):
+                regressions.append(
+                    {
+                        "scale": scale,
+                        "method": method,
+                        "baseline_ms": old,
+                        "current_ms": new,
+                        "ratio": new / old if old else float("inf"),
+                    }
+                )
+    return regressions
+
+
+def report(current: Dict, baseline: Optional[Dict]):
+    for scale, methods in current["results"].items():
+        print(f"\n{int(scale):,} анкет".replace(",", " "))
+        print(f"  {'метод':<30} {'медиана':>10} {'p95':>10} {'было':>10} {'изм.':>8}")
+        for method, now in methods.items():
+            line = f"  {method:<30} {now['median_ms']:8.3f}ms {now['p95_ms']:8.3f}ms"
+            before = (baseline or {}).get("results", {}).get(scale, {}).get(method)
+            if before:
+                change = (
+                    (now["median_ms"] / before["median_ms"] - 1) * 100
+                    if before["median_ms"]
+                    else 0
+                )
+                line += f" {before['median_ms']:8.3f}ms {change:+7.1f}%"
+            print(line)
+
+
+def run(args) -> int:
+    missing = uncovered_methods()
+    if missing:
+        print(f"Нет замеров для методов: {', '.join(missing)}", file=sys.stderr)
+
+    methods = set(args.methods.split(",")) if args.methods else None
+    current = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "storage": args.storage,
+            "seed": args.seed,
+            "likes_per_user": args.likes_per_user,
+            "mutual_rate": args.mutual_rate,
+        },
+        "results": {
+            str(scale): run_scale(args, scale, methods)
+            for scale in map(parse_scale, args.scales.split(","))
+        },
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    report(current, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if baseline is None:
+        return 0
+    regressions = compare(current, baseline, args.threshold, args.min_delta_ms)
+    for r in regressions:
+        print(
+            f"РЕГРЕССИЯ {r['scale']} {r['method']}: "
+            f"{r['baseline_ms']:.3f} -> {r['current_ms']:.3f} ms (x{r['ratio']:.2f})"
+        )
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales", default="10k,100k,1M", help="размеры базы через запятую"
+    )
+    parser.add_argument("--methods", help="замерить только эти методы (через запятую)")
+    parser.add_argument("--likes-per-user", type=int, default=10)
+    parser.add_argument(
+        "--mutual-rate", type=float, default=0.2, help="доля ответных лайков"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--storage", choices=sorted(STORAGE_PRESETS), default="production"
+    )
+    parser.add_argument(
+        "--data-dir",
+        default=os.path.join(tempfile.gettempdir(), "usurt_bench"),
+        help="куда кэшировать засеянные базы",
+    )
+    parser.add_argument("--budget", type=float, default=0.5, help="секунд на метод")
+    parser.add_argument("--min-iterations", type=int, default=3)
+    parser.add_argument("--max-iterations", type=int, default=2000)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="допустимый рост медианы (0.25 = 25%%)",
+    )
+    parser.add_argument(
+        "--min-delta-ms", type=float, default=0.05, help="рост меньше этого - шум"
+    )
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
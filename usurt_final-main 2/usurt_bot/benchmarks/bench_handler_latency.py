@@ -0,0 +1,142 @@
+"""Задержка обработчиков под конкурентной нагрузкой: синхронная Database
+против AsyncDatabase.
+
+Апдейты поступают с постоянной частотой (открытая модель нагрузки). Каждый
+четвёртый повторяет путь лайка: get_profile -> add_like -> has_like -> ответ
+в Telegram (имитируется asyncio.sleep), остальные только читают анкету.
+Задержка считается от момента поступления апдейта, поэтому блокировки цикла
+событий в неё попадают.
+
+Запуск из папки usurt_bot:
+    python benchmarks/bench_handler_latency.py --updates 2000 --rate 500
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from async_database import AsyncDatabase  # noqa: E402
+from config_data.config import STORAGE_PRESETS  # noqa: E402
+from database import Database  # noqa: E402
+
+PROFILE = {
+    "name": "Bench",
+    "age": 20,
+    "gender": "мужской",
+    "faculty": "ИТ",
+    "course": 2,
+    "bio": "Профиль для бенчмарка",
+    "photo_id": "photo",
+}
+
+
+def seed(db_path: str, users: int, pragmas: dict):
+    db = Database(db_path, pragmas=pragmas)
+    for user_id in range(1, users + 1):
+        db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        db.save_profile(user_id, PROFILE)
+    db.close()
+
+
+async def sync_handler(
+    db: Database, from_id: int, to_id: int, like: bool, api_delay: float
+):
+    db.get_profile(from_id)
+    if like:
+        db.add_like(from_id, to_id)
+        db.has_like(to_id, from_id)
+    await asyncio.sleep(api_delay)
+
+
+async def async_handler(
+    db: AsyncDatabase, from_id: int, to_id: int, like: bool, api_delay: float
+):
+    await db.get_profile(from_id)
+    if like:
+        await db.add_like(from_id, to_id)
+        await db.has_like(to_id, from_id)
+    await asyncio.sleep(api_delay)
+
+
+async def drive(handler, db, updates: int, rate: float, users: int, api_delay: float):
+    latencies = {"like": [], "read": []}
+    tasks = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def one(i: int, arrival: float):
+        from_id = i % users + 1
+        to_id = (i * 7) % users + 1
+        like = i % 4 == 0
+        await handler(db, from_id, to_id, like, api_delay)
+        latencies["like" if like else "read"].append(loop.time() - arrival)
+
+    for i in range(updates):
+        arrival = start + i / rate
+        delay = arrival - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(i, arrival)))
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(name: str, latencies, elapsed: float):
+    for kind, values in latencies.items():
+        ms = [x * 1000 for x in values]
+        print(
+            f"{name:<14} {kind:<5} p50={percentile(ms, 0.50):7.2f} ms  "
+            f"p99={percentile(ms, 0.99):7.2f} ms  max={max(ms):7.2f} ms  "
+            f"mean={statistics.mean(ms):7.2f} ms  wall={elapsed:5.2f} s"
+        )
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        pragmas = STORAGE_PRESETS[args.storage].as_pragmas()
+        seed(db_path, args.users, pragmas)
+
+        db = Database(db_path, pragmas=pragmas)
+        started = time.perf_counter()
+        latencies = await drive(
+            sync_handler, db, args.updates, args.rate, args.users, args.api_delay
+        )
+        report("Database", latencies, time.perf_counter() - started)
+        db.close()
+
+        adb = AsyncDatabase(db_path, readers=args.readers, pragmas=pragmas)
+        started = time.perf_counter()
+        latencies = await drive(
+            async_handler, adb, args.updates, args.rate, args.users, args.api_delay
+        )
+        report("AsyncDatabase", latencies, time.perf_counter() - started)
+        await adb.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=500, help="апдейтов в секунду")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--storage", choices=sorted(STORAGE_PRESETS), default="default")
+    parser.add_argument(
+        "--api-delay", type=float, default=0.005, help="имитация запроса к Bot API, с"
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Цена чтения ленты в записи Profile против словаря на каждую строку.
+
+Синтетическая база из --size анкет читается одним запросом ленты
+(get_feed_page с limit на всю базу) тремя способами:
+  - как было: SELECT * и словарь из восьми ключей на строку;
+  - Profile со всеми полями (фабрика строк курсора);
+  - Profile только с полями списка матчей и обрезанным описанием.
+Для каждого печатается медиана времени и память, которую занимает
+результат (tracemalloc, отдельным прогоном - он замедляет выполнение).
+
+Запуск из папки usurt_bot:
+    python benchmarks/bench_profile_rows.py --size 100k
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_database import _profile, parse_scale  # noqa: E402
+from database import (  # noqa: E402
+    GENDER_LABELS,
+    PROFILE_COLUMNS,
+    Database,
+    SearchCriteria,
+    normalize_gender,
+    profile_columns,
+)
+
+LIST_COLUMNS = profile_columns(
+    "user_id", "name", "age", "faculty", "course", "bio", bio_length=51
+)
+
+
+def legacy_profile(row: tuple) -> dict:
+    """Словарь анкеты, как его строили до Profile"""
+    return {
+        "user_id": row[0],
+        "name": row[1],
+        "age": row[2],
+        "gender": GENDER_LABELS.get(row[3], row[3]),
+        "faculty": row[4],
+        "course": row[5],
+        "bio": row[6],
+        "photo_id": row[7],
+    }
+
+
+def seed(path: str, size: int, rng_seed: int):
+    rng = random.Random(rng_seed)
+    db = Database(path, pragmas={"journal_mode": "OFF", "synchronous": "OFF"})
+    rows = []
+    for user_id in range(1, size + 1):
+        p = _profile(rng, user_id)
+        rows.append(
+            (
+                user_id,
+                p["name"],
+                p["age"],
+                normalize_gender(p["gender"]),
+                p["faculty"],
+                p["course"],
+                p["bio"],
+                p["photo_id"],
+            )
+        )
+    db.conn.executemany(
+        "INSERT INTO profiles (user_id, name, age, gender, faculty, course, bio, photo_id)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    db.conn.commit()
+    db.close()
+
+
+def read_feed(db: Database, columns: str, size: int, legacy: bool = False) -> list:
+    query, params = db._feed_query(columns, 0, 0, SearchCriteria(), size)
+    if legacy:
+        cursor = db.conn.cursor()
+        cursor.execute(query, params)
+        return [legacy_profile(row) for row in cursor.fetchall()]
+    cursor = db._profile_cursor()
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def measure_time(func, iterations: int) -> float:
+    times = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times)
+
+
+def measure_memory(func) -> int:
+    """Байт, которые занимает результат func после ее завершения"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=parse_scale, default=parse_scale("100k"))
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "feed.db")
+        seed(path, args.size, args.seed)
+        db = Database(path)
+        cases = {
+            "dict на строку (SELECT *)": lambda: read_feed(
+                db, "*", args.size, legacy=True
+            ),
+            "Profile, все поля": lambda: read_feed(db, PROFILE_COLUMNS, args.size),
+            "Profile, поля списка": lambda: read_feed(db, LIST_COLUMNS, args.size),
+        }
+        print(f"Лента из {args.size:,} анкет".replace(",", " "))
+        for name, func in cases.items():
+            func()  # прогрев кэша страниц
+            elapsed = measure_time(func, args.iterations)
+            memory = measure_memory(func)
+            print(
+                f"  {name:<28}{elapsed:8.1f} мс  {memory / 2**20:7.1f} МБ"
+                f"  {memory / args.size:6.0f} Б/анкету"
+            )
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Стоимость ранжирования ленты на один запрос (services.ranking).
+
+Хранилище ProfileColumns строится из синтетических анкет без базы, затем
+для случайных зрителей выбираются k лучших кандидатов: без фильтра, по полу
+и по полным критериям. Отдельно замеряется обновление одной анкеты (apply) -
+то, что происходит перед ранжированием после записи анкеты. Для сравнения
+печатается та же оценка циклом Python по списку словарей.
+
+Запуск из папки usurt_bot:
+    python benchmarks/bench_ranking.py --sizes 10k,100k,1m --k 20
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from benchmarks.bench_database import FACULTIES, parse_scale  # noqa: E402
+from database import SearchCriteria  # noqa: E402
+from services.ranking import ProfileColumns, RankingWeights  # noqa: E402
+
+WEEK = 7 * 24 * 3600
+
+
+def make_rows(size: int, rng: random.Random, now: float) -> list:
+    return [
+        (
+            user_id,
+            rng.randint(17, 25),
+            rng.randint(1, 5),
+            rng.choice(FACULTIES),
+            rng.choice("mf"),
+            int(rng.expovariate(0.2)),
+            now - rng.uniform(0, 4 * WEEK) if rng.random() < 0.8 else None,
+        )
+        for user_id in range(1, size + 1)
+    ]
+
+
+def python_top(
+    rows: list, viewer: tuple, k: int, weights: RankingWeights, now: float
+) -> list:
+    """Та же оценка без NumPy - точка отсчета"""
+    max_likes = max(row[5] for row in rows) or 1
+    scored = []
+    for user_id, age, course, faculty, gender, likes, last_active in rows:
+        if user_id == viewer[0]:
+            continue
+        recency = (
+            2 ** (-(now - last_active) / weights.recency_half_life)
+            if last_active
+            else 0.0
+        )
+        score = (
+            weights.faculty * (faculty == viewer[3])
+            + weights.course / (1 + abs(course - viewer[2]))
+            + weights.age / (1 + abs(age - viewer[1]) / 2)
+            + weights.recency * recency
+            + weights.popularity * math.log1p(likes) / math.log1p(max_likes)
+        )
+        scored.append((-score, user_id))
+    scored.sort()
+    return [user_id for _, user_id in scored[:k]]
+
+
+def measure(func, iterations: int) -> tuple[float, float]:
+    times = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        func(i)
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(0.95 * (len(times) - 1))]
+
+
+def run_size(size: int, args):
+    rng = random.Random(args.seed)
+    now = time.time()
+    weights = RankingWeights()
+    rows = make_rows(size, rng, now)
+
+    started = time.perf_counter()
+    columns = ProfileColumns(rows, weights, now=now)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"\n{size:,} анкет".replace(",", " "))
+    print(f"  построение хранилища          {build_ms:9.1f} мс")
+
+    def viewer() -> int:
+        return rng.randint(1, size)
+
+    def liked_you() -> list:
+        return rng.sample(range(1, size + 1), 10)
+
+    def viewed() -> set:
+        return set(rng.sample(range(1, size + 1), args.viewed))
+
+    cases = {
+        "top-k, все анкеты": lambda i: columns.top(viewer(), args.k),
+        "top-k, пол + лайки + просмотры": lambda i: columns.top(
+            viewer(), args.k, SearchCriteria(gender="f"), liked_you(), viewed()
+        ),
+        "top-k, полные критерии": lambda i: columns.top(
+            viewer(),
+            args.k,
+            SearchCriteria("m", rng.choice(FACULTIES), (2, 3), 18, 22),
+        ),
+        "apply: одна анкета": lambda i: columns.apply(
+            [(viewer(), 20, 2, "ИТ", "f", 3, now)], []
+        ),
+    }
+    for name, func in cases.items():
+        median, p95 = measure(func, args.iterations)
+        print(f"  {name:<30}{median:9.3f} мс  p95 {p95:8.3f} мс")
+
+    if size <= args.python_limit:
+        sample = rows[rng.randrange(size)]
+        median, p95 = measure(
+            lambda i: python_top(rows, sample, args.k, weights, now),
+            max(args.iterations // 20, 3),
+        )
+        print(
+            f"  {'цикл Python (для сравнения)':<30}{median:9.3f} мс  p95 {p95:8.3f} мс"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", default="10k,100k", help="размеры хранилища через запятую"
+    )
+    parser.add_argument(
+        "--k", type=int, default=20, help="кандидатов за одно ранжирование"
+    )
+    parser.add_argument(
+        "--viewed", type=int, default=500, help="уже оцененных анкет у зрителя"
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument(
+        "--python-limit",
+        type=parse_scale,
+        default=parse_scale("100k"),
+        help="до какого размера замерять цикл Python",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    for size in args.sizes.split(","):
+        run_size(parse_scale(size), args)
+
+
+if __name__ == "__main__":
+    main()
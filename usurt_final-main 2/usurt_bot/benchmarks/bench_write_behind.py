@@ -0,0 +1,74 @@
+"""Устойчивая пропускная способность лайков с отложенной записью и без нее.
+
+Несколько конкурентных "пользователей" в течение заданного времени ставят
+лайки так же, как process_like: like (лайк и проверка взаимности).
+Печатается число лайков в секунду и задержка одного лайка.
+
+Запуск из папки usurt_bot:
+    python benchmarks/bench_write_behind.py --seconds 5 --clients 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from async_database import AsyncDatabase  # noqa: E402
+
+
+async def run_mode(db_path: str, write_behind: bool, args) -> None:
+    db = AsyncDatabase(
+        db_path,
+        readers=args.readers,
+        write_behind=write_behind,
+        flush_rows=args.flush_rows,
+        flush_interval=args.flush_interval_ms / 1000,
+    )
+    latencies = []
+    deadline = time.perf_counter() + args.seconds
+
+    async def client(client_id: int):
+        to_id = 0
+        while time.perf_counter() < deadline:
+            to_id += 1
+            started = time.perf_counter()
+            await db.like(client_id, to_id)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(1, args.clients + 1)))
+    await db.flush()
+    elapsed = time.perf_counter() - started
+    await db.close()
+
+    latencies.sort()
+    p99 = latencies[int(0.99 * (len(latencies) - 1))] * 1000
+    mode = "write-behind" if write_behind else "commit per like"
+    print(
+        f"{mode:<16} {len(latencies) / elapsed:9.0f} likes/s  "
+        f"p50={latencies[len(latencies) // 2] * 1000:6.2f} ms  p99={p99:6.2f} ms"
+    )
+
+
+async def run(args):
+    for write_behind in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            await run_mode(os.path.join(tmp, "bench.db"), write_behind, args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--flush-rows", type=int, default=100)
+    parser.add_argument("--flush-interval-ms", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
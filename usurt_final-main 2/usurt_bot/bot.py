@@ -1,90 +1,192 @@
 import asyncio
 import logging
-import sys
-from pathlib import Path
-
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from config_data.config import load_config
-from database import Database
+from typing import Optional, Sequence
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.storage.base import BaseStorage
+from async_database import AsyncDatabase
+from config_data.config import Config, load_config
+from config_data.logging_config import setup_logging
+from handlers.admin_handlers import setup_admin_handlers
 from handlers.base_handlers import setup_base_handlers
 from handlers.match_handlers import setup_match_handlers
 from handlers.profile_handlers import setup_profile_handlers
 from handlers.search_handlers import setup_search_handlers
 from key_boards.main_menu import set_main_menu
-from middleware.logging_middleware import LoggingMiddleware
+from middleware import (
+    APIMetricsMiddleware,
+    HandlerMetricsMiddleware,
+    LoggingMiddleware,
+    MetricsMiddleware,
+)
+from services.metrics import BotMetrics, start_metrics_server
+from services.notifications import NotificationQueue
+from services.query_tracer import QueryTracer
+from services.ranking import CandidateRanker
+from services.services import CandidateQueue
+from storage import BoundedMemoryStorage, SQLiteStorage
+from webhook_server import run_webhook
+
+
+def setup_dispatcher(
+    dp: Dispatcher,
+    db: AsyncDatabase,
+    candidates: CandidateQueue,
+    notifications: NotificationQueue,
+    metrics: Optional[BotMetrics] = None,
+    admin_ids: Sequence[int] = (),
+) -> Router:
+    """Регистрирует middleware и обработчики; используется и в tools/loadtest.py"""
+    logger = logging.getLogger(__name__)
+
+    # Регистрация middleware
+    if metrics is not None:
+        dp.update.outer_middleware(MetricsMiddleware(metrics))
+        handler_metrics = HandlerMetricsMiddleware(metrics)
+        dp.message.middleware(handler_metrics)
+        dp.callback_query.middleware(handler_metrics)
+    logging_middleware = LoggingMiddleware(db)
+    dp.message.middleware(logging_middleware)
+    dp.callback_query.middleware(logging_middleware)
+
+    base_router = Router()
+
+    # Регистрация обработчиков
+    logger.info("Setting up handlers...")
+    setup_base_handlers(base_router, db)
+    setup_profile_handlers(base_router, db, candidates)
+    setup_search_handlers(base_router, db, candidates, notifications)
+    setup_match_handlers(base_router, db)
+    setup_admin_handlers(base_router, db, list(admin_ids))
+    logger.info("Handlers setup completed")
 
+    dp.include_router(base_router)
+    logger.info("Router included in dispatcher")
+    return base_router
 
-# Настройка логирования
-def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[logging.FileHandler("bot.log"), logging.StreamHandler(sys.stdout)],
+
+def create_storage(config: Config) -> BaseStorage:
+    """Хранилище состояний FSM по настройкам config.fsm"""
+    if config.fsm.kind == "sqlite":
+        return SQLiteStorage(config.fsm.path, state_ttl=config.fsm.state_ttl)
+    return BoundedMemoryStorage(
+        max_entries=config.fsm.max_entries, idle_ttl=config.fsm.state_ttl
     )
 
 
-async def main():
-    # Настройка логирования
-    setup_logging()
+async def setup_ranker(db: AsyncDatabase, config: Config) -> Optional[CandidateRanker]:
+    """Загружает ранжирование ленты; None - лента отдается по порядку user_id"""
+    if not config.ranking.enabled:
+        return None
+    ranker = CandidateRanker(db, reload_interval=config.ranking.reload_interval)
+    try:
+        await ranker.load()
+    except Exception as e:
+        logging.getLogger(__name__).error(
+            f"Ошибка при загрузке хранилища ранжирования, ранжирование отключено: {e}"
+        )
+        db.remove_profile_listener(ranker.mark_dirty)
+        return None
+    return ranker
+
+
+async def main(config: Config):
     logger = logging.getLogger(__name__)
     logger.info("Starting bot")
 
-    # Загрузка конфигурации
-    config = load_config()
     if not config.tg_bot.token:
         logger.error("No token provided!")
         return
 
+    metrics = BotMetrics() if config.metrics.enabled else None
+
     # Инициализация базы данных
-    db = Database()
+    db = AsyncDatabase(
+        config.db.path,
+        readers=config.db.readers,
+        write_behind=config.db.write_behind,
+        flush_rows=config.db.flush_rows,
+        flush_interval=config.db.flush_interval_ms / 1000,
+        pragmas=config.db.tuning.as_pragmas(),
+        profile_cache_size=config.db.profile_cache_size,
+        observer=metrics.observe_db if metrics else None,
+        tracer=QueryTracer(config.db.slow_query_ms / 1000) if config.db.trace else None,
+    )
+    candidates = CandidateQueue(db, ranker=await setup_ranker(db, config))
 
     # Инициализация бота и диспетчера
-    storage = MemoryStorage()
+    # Dispatcher сам закрывает хранилище при остановке - очередь записи сбрасывается
     bot = Bot(token=config.tg_bot.token)
-    dp = Dispatcher(storage=storage)
-
-    # Регистрация middleware
-    logging_middleware = LoggingMiddleware(db)
-    dp.message.middleware(logging_middleware)
-    dp.callback_query.middleware(logging_middleware)
+    dp = Dispatcher(storage=create_storage(config))
+    notifications = NotificationQueue(
+        bot,
+        workers=config.notifications.workers,
+        global_rate=config.notifications.global_rate,
+        per_chat_rate=config.notifications.per_chat_rate,
+        max_retries=config.notifications.max_retries,
+    )
+    if metrics is not None:
+        bot.session.middleware(APIMetricsMiddleware(metrics))
+        metrics.notification_queue.set_function(notifications.qsize)
 
     # Настройка главного меню
     await set_main_menu(bot)
 
-    # Регистрация роутеров
-    from aiogram import Router
-
-    base_router = Router()
-
-    # Регистрация обработчиков
-    logger.info("Setting up handlers...")
-    setup_base_handlers(base_router, db)
-    setup_profile_handlers(base_router, db)
-    setup_search_handlers(base_router, db)
-    setup_match_handlers(base_router, db)
-    logger.info("Handlers setup completed")
-
-    dp.include_router(base_router)
-    logger.info("Router included in dispatcher")
-
-    # Удаление вебхука и запуск бота
-    await bot.delete_webhook(drop_pending_updates=True)
-    logger.info("Bot started successfully!")
+    setup_dispatcher(
+        dp, db, candidates, notifications, metrics, config.tg_bot.admin_ids
+    )
 
+    metrics_runner = None
     try:
-        await dp.start_polling(bot)
+        notifications.start()
+        # Метрики - всегда на отдельном локальном сервере, не на порту вебхука
+        if metrics is not None:
+            metrics_runner = await start_metrics_server(
+                metrics, config.metrics.host, config.metrics.port
+            )
+            logger.info(
+                f"Metrics available on http://{config.metrics.host}:{config.metrics.port}/metrics"
+            )
+        if config.webhook:
+            logger.info("Bot started successfully (webhook)!")
+            await run_webhook(dp, bot, config.webhook)
+        else:
+            # Удаление вебхука и запуск бота
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info("Bot started successfully!")
+            # Сессию бота закрываем сами - после отправки очереди уведомлений
+            await dp.start_polling(bot, close_bot_session=False)
     except Exception as e:
         logger.error(f"Error during bot execution: {e}")
     finally:
-        db.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await notifications.close(config.notifications.drain_timeout)
+        await bot.session.close()
+        # Дописываем очередь отложенной записи до закрытия соединений
+        await db.flush()
+        await db.close()
         logger.info("Bot stopped!")
 
 
 if __name__ == "__main__":
+    log_listener = None
     try:
-        asyncio.run(main())
+        # Загрузка конфигурации и настройка логирования: запись в файл и stdout
+        # идет в фоновом потоке, listener дописывает очередь при остановке
+        config = load_config()
+        log_listener = setup_logging(config.logging)
+        asyncio.run(main(config))
     except (KeyboardInterrupt, SystemExit):
         logging.getLogger(__name__).info("Bot stopped!")
     except Exception as e:
+        if log_listener is None:
+            # Конфигурация не загрузилась - логирование еще не настроено
+            logging.basicConfig(
+                level=logging.INFO,
+                format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            )
         logging.getLogger(__name__).error(f"Unexpected error: {e}")
+    finally:
+        if log_listener is not None:
+            log_listener.stop()
@@ -1,6 +1,7 @@
 import os
-from dataclasses import dataclass
-from typing import Optional
+import re
+from dataclasses import dataclass, field, replace
+from typing import Dict, Optional
 
 from dotenv import load_dotenv
 
@@ -11,18 +12,255 @@ class TgBot:
     admin_ids: list[int]
 
 
+@dataclass
+class StorageTuning:
+    """Настройки SQLite, применяемые к каждому соединению при подключении"""
+
+    journal_mode: str = "DELETE"
+    synchronous: str = "FULL"
+    mmap_size: int = 0
+    # Отрицательное значение - размер в КиБ, положительное - в страницах
+    cache_size: int = -2000
+    temp_store: str = "DEFAULT"
+    busy_timeout: int = 5000
+
+    def as_pragmas(self) -> dict[str, str | int]:
+        # busy_timeout первым: смена journal_mode уже может ждать блокировку
+        return {
+            "busy_timeout": self.busy_timeout,
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "mmap_size": self.mmap_size,
+            "cache_size": self.cache_size,
+            "temp_store": self.temp_store,
+        }
+
+
+STORAGE_PRESETS = {
+    # Значения SQLite по умолчанию
+    "default": StorageTuning(),
+    # WAL: читатели не ждут писателя; NORMAL в WAL не теряет целостность,
+    # fsync только при чекпоинте; 256 МиБ mmap и 64 МиБ кэша страниц
+    "production": StorageTuning(
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        mmap_size=256 * 1024 * 1024,
+        cache_size=-64 * 1024,
+        temp_store="MEMORY",
+        busy_timeout=5000,
+    ),
+}
+
+
 @dataclass
 class Database:
     path: str
+    readers: int = 2
+    # Отложенная запись лайков, жалоб и регистраций с групповым коммитом
+    write_behind: bool = False
+    flush_interval_ms: int = 50
+    flush_rows: int = 100
+    # Сколько анкет держать в LRU-кэше AsyncDatabase
+    profile_cache_size: int = 10_000
+    # Статистика SQL-запросов (/top_queries) и журнал медленных запросов
+    trace: bool = False
+    slow_query_ms: float = 50
+    tuning: StorageTuning = field(default_factory=StorageTuning)
+
+
+def load_storage_tuning() -> StorageTuning:
+    """Пресет DB_PROFILE с точечными переопределениями из DB_* переменных"""
+    profile = os.getenv("DB_PROFILE", "default").lower()
+    if profile not in STORAGE_PRESETS:
+        raise ValueError(f"Неизвестный DB_PROFILE: {profile}")
+    tuning = STORAGE_PRESETS[profile]
+
+    overrides = {}
+    for name, cast in (
+        ("journal_mode", str),
+        ("synchronous", str),
+        ("mmap_size", int),
+        ("cache_size", int),
+        ("temp_store", str),
+        ("busy_timeout", int),
+    ):
+        value = os.getenv(f"DB_{name.upper()}")
+        if value:
+            overrides[name] = cast(value)
+    return replace(tuning, **overrides)
+
+
+@dataclass
+class Notifications:
+    """Очередь исходящих уведомлений о лайках и матчах"""
+
+    workers: int = 4
+    # Лимиты Telegram: ~30 сообщений/с на бота и ~1 сообщение/с в один чат
+    global_rate: float = 30.0
+    per_chat_rate: float = 1.0
+    max_retries: int = 3
+    # Сколько ждать отправки оставшейся очереди при остановке бота
+    drain_timeout: float = 10.0
+
+
+@dataclass
+class FsmStorage:
+    """Где хранятся состояния FSM (незаконченные анкеты)"""
+
+    # memory - в памяти процесса, sqlite - в отдельном файле SQLite
+    kind: str = "memory"
+    path: str = "fsm_storage.db"
+    # Анкета, брошенная на столько секунд, забывается
+    state_ttl: float = 24 * 3600
+    # Предел числа записей в памяти (memory), старые вытесняются
+    max_entries: int = 50_000
+
+
+@dataclass
+class Webhook:
+    """Режим вебхука: встроенный aiohttp-сервер вместо long polling"""
+
+    # Публичный адрес, на который Telegram шлет апдейты, без пути
+    base_url: str
+    # Проверяется в заголовке X-Telegram-Bot-Api-Secret-Token; без него сервер
+    # на 0.0.0.0 принял бы поддельные апдейты от кого угодно
+    secret_token: str
+    path: str = "/webhook"
+    host: str = "0.0.0.0"
+    port: int = 8080
+    # Сколько соединений Telegram открывает к серверу одновременно (1-100)
+    max_connections: int = 40
+    # Сколько апдейтов обрабатывается одновременно, остальные ждут ответа
+    max_concurrent_updates: int = 100
+
+    @property
+    def url(self) -> str:
+        return self.base_url.rstrip("/") + self.path
+
+
+@dataclass
+class Metrics:
+    """Метрики в формате Prometheus на /metrics"""
+
+    enabled: bool = True
+    # Отдельный сервер в обоих режимах; по умолчанию доступен только локально
+    host: str = "127.0.0.1"
+    port: int = 9100
+
+
+@dataclass
+class Ranking:
+    """Ранжирование ленты по столбцовому хранилищу анкет (services.ranking)"""
+
+    enabled: bool = True
+    # Раз в столько секунд хранилище перезагружается: лайки меняют популярность
+    reload_interval: float = 600.0
+
+
+@dataclass
+class Logging:
+    """Журнал: очередь + фоновый поток, JSON-файл с ротацией по размеру"""
+
+    level: str = "INFO"
+    path: str = "bot.log"
+    # Размер файла, после которого он ротируется, и число старых файлов
+    max_bytes: int = 10 * 1024 * 1024
+    backup_count: int = 5
+    # text | json - формат вывода в stdout (файл всегда в JSON)
+    console_format: str = "text"
+    # Записей в очереди, после этого новые отбрасываются
+    queue_size: int = 10_000
+    # Доля записей INFO и ниже по имени логгера, например клики
+    sampling: Dict[str, float] = field(default_factory=dict)
 
 
 @dataclass
 class Config:
     tg_bot: TgBot
     db: Database
+    notifications: Notifications = field(default_factory=Notifications)
+    fsm: FsmStorage = field(default_factory=FsmStorage)
+    # None - long polling
+    webhook: Optional[Webhook] = None
+    metrics: Metrics = field(default_factory=Metrics)
+    ranking: Ranking = field(default_factory=Ranking)
+    logging: Logging = field(default_factory=Logging)
     debug: bool = False
 
 
+def load_fsm_storage() -> FsmStorage:
+    kind = os.getenv("FSM_STORAGE", "memory").lower()
+    if kind not in ("memory", "sqlite"):
+        raise ValueError(f"Неизвестный FSM_STORAGE: {kind}")
+    return FsmStorage(
+        kind=kind,
+        path=os.getenv("FSM_DB_PATH", "fsm_storage.db"),
+        state_ttl=float(os.getenv("FSM_STATE_TTL_HOURS", "24")) * 3600,
+        max_entries=int(os.getenv("FSM_MAX_ENTRIES", "50000")),
+    )
+
+
+def load_webhook() -> Optional[Webhook]:
+    """Настройки вебхука, если BOT_MODE=webhook"""
+    mode = os.getenv("BOT_MODE", "polling").lower()
+    if mode == "polling":
+        return None
+    if mode != "webhook":
+        raise ValueError(f"Неизвестный BOT_MODE: {mode}")
+
+    base_url = os.getenv("WEBHOOK_BASE_URL")
+    if not base_url:
+        raise ValueError("WEBHOOK_BASE_URL не найден в переменных окружения")
+    secret_token = os.getenv("WEBHOOK_SECRET")
+    if not secret_token:
+        raise ValueError("WEBHOOK_SECRET не найден в переменных окружения")
+    # Telegram принимает 1-256 символов A-Z, a-z, 0-9, _ и -
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", secret_token):
+        raise ValueError(
+            "WEBHOOK_SECRET: допустимы 1-256 символов A-Z, a-z, 0-9, _ и -"
+        )
+    return Webhook(
+        base_url=base_url,
+        secret_token=secret_token,
+        path=os.getenv("WEBHOOK_PATH", "/webhook"),
+        host=os.getenv("WEBAPP_HOST", "0.0.0.0"),
+        port=int(os.getenv("WEBAPP_PORT", "8080")),
+        max_connections=int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40")),
+        max_concurrent_updates=int(os.getenv("WEBHOOK_MAX_UPDATES", "100")),
+    )
+
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    """'middleware.logging_middleware=0.1,handlers=0.5' -> доли по логгерам"""
+    rates = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition("=")
+        rate = float(rate)
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError(
+                f"Доля LOG_SAMPLING для {name.strip()} должна быть от 0 до 1"
+            )
+        rates[name.strip()] = rate
+    return rates
+
+
+def load_logging() -> Logging:
+    console_format = os.getenv("LOG_CONSOLE_FORMAT", "text").lower()
+    if console_format not in ("text", "json"):
+        raise ValueError(f"Неизвестный LOG_CONSOLE_FORMAT: {console_format}")
+    return Logging(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        path=os.getenv("LOG_PATH", "bot.log"),
+        max_bytes=int(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024,
+        backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+        console_format=console_format,
+        queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+        sampling=parse_sampling(os.getenv("LOG_SAMPLING", "")),
+    )
+
+
 def load_config(path: str | None = None) -> Config:
     """Загружает конфигурацию из переменных окружения"""
     # Всегда ищем .env в usurt_bot/.env относительно этого файла
@@ -45,12 +283,54 @@ def load_config(path: str | None = None) -> Config:
 
     # Путь к базе данных
     db_path = os.getenv("DB_PATH", "university_dating.db")
+    db_readers = int(os.getenv("DB_READERS", "2"))
+    write_behind = os.getenv("DB_WRITE_BEHIND", "False").lower() == "true"
+    flush_interval_ms = int(os.getenv("DB_FLUSH_INTERVAL_MS", "50"))
+    flush_rows = int(os.getenv("DB_FLUSH_ROWS", "100"))
+    profile_cache_size = int(os.getenv("DB_PROFILE_CACHE_SIZE", "10000"))
+    trace = os.getenv("DB_TRACE", "False").lower() == "true"
+    slow_query_ms = float(os.getenv("DB_SLOW_QUERY_MS", "50"))
+
+    notifications = Notifications(
+        workers=int(os.getenv("NOTIFY_WORKERS", "4")),
+        global_rate=float(os.getenv("NOTIFY_GLOBAL_RATE", "30")),
+        per_chat_rate=float(os.getenv("NOTIFY_PER_CHAT_RATE", "1")),
+        max_retries=int(os.getenv("NOTIFY_MAX_RETRIES", "3")),
+        drain_timeout=float(os.getenv("NOTIFY_DRAIN_TIMEOUT", "10")),
+    )
+
+    metrics = Metrics(
+        enabled=os.getenv("METRICS_ENABLED", "True").lower() == "true",
+        host=os.getenv("METRICS_HOST", "127.0.0.1"),
+        port=int(os.getenv("METRICS_PORT", "9100")),
+    )
+
+    ranking = Ranking(
+        enabled=os.getenv("RANKING_ENABLED", "True").lower() == "true",
+        reload_interval=float(os.getenv("RANKING_RELOAD_S", "600")),
+    )
 
     # Режим отладки
     debug = os.getenv("DEBUG", "False").lower() == "true"
 
     return Config(
         tg_bot=TgBot(token=token, admin_ids=admin_ids),
-        db=Database(path=db_path),
+        db=Database(
+            path=db_path,
+            readers=db_readers,
+            write_behind=write_behind,
+            flush_interval_ms=flush_interval_ms,
+            flush_rows=flush_rows,
+            profile_cache_size=profile_cache_size,
+            trace=trace,
+            slow_query_ms=slow_query_ms,
+            tuning=load_storage_tuning(),
+        ),
+        notifications=notifications,
+        fsm=load_fsm_storage(),
+        webhook=load_webhook(),
+        metrics=metrics,
+        ranking=ranking,
+        logging=load_logging(),
         debug=debug,
     )
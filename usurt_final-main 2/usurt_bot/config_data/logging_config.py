@@ -0,0 +1,142 @@
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional
+
+from config_data.config import Logging
+
+# Стандартные поля LogRecord - все остальное пришло через extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON; поля из extra= попадают в запись как есть"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+            + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю записей INFO и ниже для выбранных логгеров.
+
+    rates - доля по имени логгера (и его потомков), например
+    {"middleware.logging_middleware": 0.1} - каждая десятая запись.
+    Выборка детерминированная: доли накапливаются, поэтому из 1000 записей
+    при 0.1 проходит ровно 100. Предупреждения и ошибки проходят всегда.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = dict(rates)
+        self._credit: Dict[str, float] = {}
+        # Доля для каждого встреченного имени логгера, с учетом родителей
+        self._resolved: Dict[str, Optional[str]] = {}
+        self.dropped = 0
+
+    def _rule_for(self, name: str) -> Optional[str]:
+        if name not in self._resolved:
+            rule = None
+            parts = name.split(".")
+            for i in range(len(parts), 0, -1):
+                prefix = ".".join(parts[:i])
+                if prefix in self.rates:
+                    rule = prefix
+                    break
+            self._resolved[name] = rule
+        return self._resolved[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rule = self._rule_for(record.name)
+        if rule is None:
+            return True
+        credit = self._credit.get(rule, 0.0) + self.rates[rule]
+        # Допуск на ошибку округления: 10 раз по 0.1 дают 0.999...
+        if credit >= 1.0 - 1e-9:
+            self._credit[rule] = credit - 1.0
+            return True
+        self._credit[rule] = credit
+        self.dropped += 1
+        return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler, который не форматирует запись в цикле событий и не ждет.
+
+    Форматирование (подстановка аргументов, JSON) выполняет поток
+    QueueListener. Когда очередь заполнена, запись отбрасывается - лог не
+    должен тормозить обработку апдейтов.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Очередь живет в том же процессе - записи не нужно сериализовать
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(config: Logging) -> QueueListener:
+    """Настраивает корневой логгер: запись в очередь, вывод - в фоновом потоке.
+
+    Файл (JSON, с ротацией по размеру) и stdout обслуживает QueueListener,
+    поэтому цикл событий не пишет на диск. Возвращает запущенный listener -
+    его нужно остановить при завершении, чтобы дописать очередь.
+    """
+    file_handler = RotatingFileHandler(
+        config.path,
+        maxBytes=config.max_bytes,
+        backupCount=config.backup_count,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler(sys.stdout)
+    if config.console_format == "json":
+        console_handler.setFormatter(JsonFormatter())
+    else:
+        console_handler.setFormatter(
+            logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        )
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(config.queue_size))
+    if config.sampling:
+        queue_handler.addFilter(SamplingFilter(config.sampling))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(config.level)
+
+    listener = QueueListener(queue_handler.queue, file_handler, console_handler)
+    listener.start()
+    return listener
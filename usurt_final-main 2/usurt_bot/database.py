@@ -1,13 +1,366 @@
+import logging
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
 
+from services.query_tracer import QueryTracer, TracingConnection
+
+logger = logging.getLogger(__name__)
+
+# Действия пользователя с чужой анкетой, после которых она больше не показывается
+VIEW_ACTIONS = ("like", "skip", "complain")
+
+INSERT_USER = (
+    "INSERT OR IGNORE INTO users (user_id, username, full_name) VALUES (?, ?, ?)"
+)
+INSERT_LIKE = "INSERT INTO likes (from_user_id, to_user_id) VALUES (?, ?)"
+# Матч хранится двумя строками - по одной на каждого участника
+INSERT_MATCH = "INSERT OR IGNORE INTO matches (user_id, match_user_id) VALUES (?, ?)"
+INSERT_COMPLAINT = (
+    "INSERT INTO complaints (from_user_id, to_user_id, reason) VALUES (?, ?, ?)"
+)
+# Пропуск не перетирает уже сохраненный лайк или жалобу
+UPSERT_VIEW = """INSERT INTO views (viewer_id, target_id, action) VALUES (?, ?, ?)
+    ON CONFLICT (viewer_id, target_id) DO UPDATE SET action = excluded.action
+    WHERE excluded.action != 'skip'"""
+
+# Триггеры, поддерживающие таблицу counters (см. Database._create_counters)
+COUNTER_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_users_insert AFTER INSERT ON users
+    BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'users';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_users_delete AFTER DELETE ON users
+    BEGIN
+        UPDATE counters SET value = value - 1 WHERE name = 'users';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_profiles_insert AFTER INSERT ON profiles
+    BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = 'profiles';
+        UPDATE counters SET value = value + (NEW.active = 1)
+            WHERE name = 'active_profiles';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_profiles_delete AFTER DELETE ON profiles
+    BEGIN
+        UPDATE counters SET value = value - 1 WHERE name = 'profiles';
+        UPDATE counters SET value = value - (OLD.active = 1)
+            WHERE name = 'active_profiles';
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_profiles_active AFTER UPDATE OF active ON profiles
+    BEGIN
+        UPDATE counters SET value = value + (NEW.active = 1) - (OLD.active = 1)
+            WHERE name = 'active_profiles';
+    END""",
+)
+
+# Полнотекстовый индекс анкет. Таблица без собственного содержимого
+# (content=''): в индекс попадает текст, в котором "ё" заменена на "е" -
+# unicode61 снимает диакритику только с латиницы. Сами анкеты читаются из
+# profiles по rowid = user_id. prefix='2 3' - готовые индексы коротких префиксов
+PROFILES_FTS = """CREATE VIRTUAL TABLE IF NOT EXISTS profiles_fts USING fts5(
+    name, faculty, bio,
+    content='',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)"""
+_FTS_COLUMNS = ", ".join(
+    f"replace(replace({{row}}.{column}, 'ё', 'е'), 'Ё', 'Е')"
+    for column in ("name", "faculty", "bio")
+)
+# Триггеры держат индекс в согласии с profiles (save_profile, delete_profile).
+# Из таблицы без содержимого строка удаляется командой 'delete' с теми же
+# значениями, что были записаны в индекс
+FTS_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_profiles_fts_insert AFTER INSERT ON profiles
+    BEGIN
+        INSERT INTO profiles_fts (rowid, name, faculty, bio)
+        VALUES (NEW.user_id, {_FTS_COLUMNS.format(row="NEW")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_profiles_fts_delete AFTER DELETE ON profiles
+    BEGIN
+        INSERT INTO profiles_fts (profiles_fts, rowid, name, faculty, bio)
+        VALUES ('delete', OLD.user_id, {_FTS_COLUMNS.format(row="OLD")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_profiles_fts_update
+    AFTER UPDATE OF name, faculty, bio ON profiles
+    BEGIN
+        INSERT INTO profiles_fts (profiles_fts, rowid, name, faculty, bio)
+        VALUES ('delete', OLD.user_id, {_FTS_COLUMNS.format(row="OLD")});
+        INSERT INTO profiles_fts (rowid, name, faculty, bio)
+        VALUES (NEW.user_id, {_FTS_COLUMNS.format(row="NEW")});
+    END""",
+)
+# Вес совпадения в имени, факультете и описании для bm25
+FTS_WEIGHTS = (3.0, 2.0, 1.0)
+# Не больше стольких слов из запроса пользователя
+FTS_MAX_TERMS = 8
+_FTS_TERM = re.compile(r"\w+")
+
+
+def fts_query(text: str) -> Optional[str]:
+    """Запрос FTS5 из свободного текста: все слова, каждое - как префикс
+
+    "Гитара, походы" -> '"гитара"* "походы"*'. Слова берутся в кавычки, поэтому
+    операторы FTS5 (AND, NEAR, двоеточие) во вводе ничего не ломают.
+    None, если в тексте нет ни одного слова.
+    """
+    terms = _FTS_TERM.findall(text.replace("ё", "е").replace("Ё", "Е"))[:FTS_MAX_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+# Пол хранится кодом 'm' / 'f' (CHECK в таблице); подписи - для показа
+GENDER_LABELS = {"m": "мужской", "f": "женский"}
+# Варианты, встречавшиеся в старых анкетах и во вводе пользователей
+GENDER_ALIASES = {
+    "m": ("мужской", "мужчина", "male", "m", "парень", "м"),
+    "f": ("женский", "женщина", "female", "f", "девушка", "ж"),
+}
+_GENDER_CODES = {
+    alias: code for code, aliases in GENDER_ALIASES.items() for alias in aliases
+}
+# Версия схемы в PRAGMA user_version: 1 - пол хранится кодами
+SCHEMA_VERSION = 1
+# Базы, созданные до CHECK на поле gender: SQLite не добавляет ограничение
+# к существующему столбцу без пересоздания таблицы, поэтому его заменяют триггеры
+GENDER_GUARD_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_profiles_gender_insert BEFORE INSERT ON profiles
+    WHEN NEW.gender NOT IN ('m', 'f')
+    BEGIN
+        SELECT RAISE(ABORT, 'CHECK constraint failed: gender');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_profiles_gender_update BEFORE UPDATE OF gender ON profiles
+    WHEN NEW.gender NOT IN ('m', 'f')
+    BEGIN
+        SELECT RAISE(ABORT, 'CHECK constraint failed: gender');
+    END""",
+)
+
+
+def normalize_gender(value: str) -> str:
+    """Код пола ('m' / 'f') по подписи, коду или старому варианту написания"""
+    code = _GENDER_CODES.get(str(value).strip().lower())
+    if code is None:
+        raise ValueError(f"Неизвестное значение пола: {value}")
+    return code
+
+
+class Profile(NamedTuple):
+    """Анкета в том виде, в каком ее отдают запросы Database.
+
+    Строится фабрикой строк курсора (_profile_factory) прямо из кортежа
+    sqlite3. Запрос выбирает только нужные ему поля (profile_columns),
+    остальные - None. Пол - код 'm' / 'f': односимвольные строки Python не
+    создает заново для каждой строки, подпись для показа - gender_label.
+    """
+
+    user_id: int
+    name: Optional[str] = None
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    faculty: Optional[str] = None
+    course: Optional[int] = None
+    bio: Optional[str] = None
+    photo_id: Optional[str] = None
+
+    @property
+    def gender_label(self) -> Optional[str]:
+        return GENDER_LABELS.get(self.gender, self.gender)
+
+
+def profile_columns(
+    *fields: str, alias: str = "", bio_length: Optional[int] = None
+) -> str:
+    """Список столбцов SELECT в порядке полей Profile
+
+    fields - какие поля читать (по умолчанию все), вместо остальных NULL.
+    bio_length обрезает описание через substr.
+    """
+    prefix = f"{alias}." if alias else ""
+    columns = []
+    for field in Profile._fields:
+        column = prefix + field
+        if fields and field not in fields:
+            columns.append("NULL")
+        elif field == "bio" and bio_length is not None:
+            columns.append(f"substr({column}, 1, {bio_length})")
+        else:
+            columns.append(column)
+    return ", ".join(columns)
+
+
+def _profile_factory(cursor: sqlite3.Cursor, row: tuple) -> Profile:
+    # Столбцы уже в порядке полей (profile_columns) - кортеж берется как есть
+    return tuple.__new__(Profile, row)
 
-import sqlite3
-from typing import Dict, List, Optional
+
+PROFILE_COLUMNS = profile_columns()
+# Списки анкет: в карточке списка описание обрезается, лишний символ - признак "..."
+MATCH_COLUMNS = profile_columns(
+    "user_id", "name", "age", "faculty", "course", "bio", alias="p", bio_length=51
+)
+SEARCH_RESULT_COLUMNS = profile_columns(
+    "user_id", "name", "age", "faculty", "bio", alias="p", bio_length=80
+)
+
+
+@dataclass(frozen=True)
+class SearchCriteria:
+    """Критерии поиска анкет; None или пустой кортеж - без ограничения.
+
+    Значения приводятся к каноническому виду при создании: пол - код
+    'm' / 'f', курсы - отсортированный кортеж без повторов.
+    """
+
+    gender: Optional[str] = None
+    faculty: Optional[str] = None
+    courses: Tuple[int, ...] = ()
+    age_min: Optional[int] = None
+    age_max: Optional[int] = None
+
+    def __post_init__(self):
+        if self.gender is not None:
+            object.__setattr__(self, "gender", normalize_gender(self.gender))
+        if self.faculty is not None:
+            object.__setattr__(self, "faculty", self.faculty.strip() or None)
+        object.__setattr__(
+            self, "courses", tuple(sorted({int(c) for c in self.courses}))
+        )
+        if (
+            self.age_min is not None
+            and self.age_max is not None
+            and self.age_min > self.age_max
+        ):
+            raise ValueError(f"Пустой диапазон возраста: {self.age_min}-{self.age_max}")
+
+    def where(self) -> Tuple[str, list]:
+        """Условия отбора (каждое начинается с AND) и их параметры
+
+        Равенства по полу и факультету обслуживает индекс
+        idx_profiles_search (active, faculty, gender): внутри него анкеты
+        лежат по user_id, поэтому лента по курсору не сортируется. Курсы
+        и возраст проверяются по строкам, которые индекс уже отобрал.
+        """
+        query = ""
+        params: list = []
+        if self.gender is not None:
+            query += " AND gender = ?"
+            params.append(self.gender)
+        if self.faculty is not None:
+            query += " AND faculty = ?"
+            params.append(self.faculty)
+        if self.courses:
+            query += f" AND course IN ({', '.join('?' * len(self.courses))})"
+            params.extend(self.courses)
+        if self.age_min is not None:
+            query += " AND age >= ?"
+            params.append(self.age_min)
+        if self.age_max is not None:
+            query += " AND age <= ?"
+            params.append(self.age_max)
+        return query, params
+
+
+def _criteria_from_row(row: tuple) -> SearchCriteria:
+    gender, faculty, courses, age_min, age_max = row
+    return SearchCriteria(
+        gender=gender,
+        faculty=faculty,
+        courses=tuple(int(c) for c in courses.split(",")) if courses else (),
+        age_min=age_min,
+        age_max=age_max,
+    )
+
+
+# Настройки производительности, которые можно передать в Database(pragmas=...)
+TUNABLE_PRAGMAS = (
+    "busy_timeout",
+    "journal_mode",
+    "synchronous",
+    "mmap_size",
+    "cache_size",
+    "temp_store",
+)
+# PRAGMA не принимает параметры запроса - значения проверяются заранее
+_PRAGMA_VALUE = re.compile(r"^-?\w+$")
+_SYNCHRONOUS_NAMES = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}
+_TEMP_STORE_NAMES = {0: "DEFAULT", 1: "FILE", 2: "MEMORY"}
 
 
 class Database:
-    def __init__(self, db_path: str = "university_dating.db"):
-        self.conn = sqlite3.connect(db_path)
-        self._create_tables()
+    # Анти-join с просмотрами; параметр - viewer_id
+    NOT_VIEWED = (
+        "NOT EXISTS (SELECT 1 FROM views v "
+        "WHERE v.viewer_id = ? AND v.target_id = profiles.user_id)"
+    )
+
+    def __init__(
+        self,
+        db_path: str = "university_dating.db",
+        read_only: bool = False,
+        write_behind: bool = False,
+        flush_rows: int = 100,
+        flush_interval: float = 0.05,
+        pragmas: Optional[Dict[str, Any]] = None,
+        tracer: Optional[QueryTracer] = None,
+    ):
+        # Отложенная запись: add_user/add_like/add_complaint (и всегда - просмотры)
+        # копятся в очереди и сбрасываются одним executemany + commit, когда
+        # набирается flush_rows строк или проходит flush_interval секунд
+        self.write_behind = write_behind
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._pending: dict[str, list[tuple]] = {}
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+        # Соединение может использоваться из потока исполнителя AsyncDatabase,
+        # поэтому проверка потока отключена: доступ сериализует сам фасад.
+        # С tracer все запросы соединения попадают в статистику QueryTracer
+        factory = TracingConnection if tracer is not None else sqlite3.Connection
+        if read_only:
+            uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+            self.conn = sqlite3.connect(
+                uri, uri=True, check_same_thread=False, factory=factory
+            )
+        else:
+            self.conn = sqlite3.connect(
+                db_path, check_same_thread=False, factory=factory
+            )
+        if tracer is not None:
+            self.conn.tracer = tracer
+        self._apply_pragmas(pragmas or {}, read_only)
+        if not read_only:
+            self._create_tables()
+
+    def _apply_pragmas(self, pragmas: Dict[str, Any], read_only: bool):
+        for name, value in pragmas.items():
+            if name not in TUNABLE_PRAGMAS:
+                raise ValueError(f"Неизвестная настройка SQLite: {name}")
+            if not _PRAGMA_VALUE.match(str(value)):
+                raise ValueError(f"Недопустимое значение {name}: {value}")
+            # Режим журнала хранится в файле базы - его задает только писатель
+            if name == "journal_mode" and read_only:
+                continue
+            self.conn.execute(f"PRAGMA {name} = {value}")
+
+    def get_pragmas(self) -> Dict[str, Any]:
+        """Возвращает действующие на этом соединении настройки SQLite"""
+        pragmas = {}
+        for name in TUNABLE_PRAGMAS:
+            # mmap_size in-memory базы не возвращает ни одной строки
+            row = self.conn.execute(f"PRAGMA {name}").fetchone()
+            pragmas[name] = row[0] if row else None
+        pragmas["synchronous"] = _SYNCHRONOUS_NAMES.get(
+            pragmas["synchronous"], pragmas["synchronous"]
+        )
+        pragmas["temp_store"] = _TEMP_STORE_NAMES.get(
+            pragmas["temp_store"], pragmas["temp_store"]
+        )
+        return pragmas
 
     def _create_tables(self):
         cursor = self.conn.cursor()
@@ -20,13 +373,17 @@ class Database:
         )
         """
         )
+        has_profiles = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'profiles'"
+        ).fetchone()
+        schema_version = cursor.execute("PRAGMA user_version").fetchone()[0]
         cursor.execute(
             """
         CREATE TABLE IF NOT EXISTS profiles (
             user_id INTEGER PRIMARY KEY,
             name TEXT NOT NULL,
             age INTEGER NOT NULL,
-            gender TEXT NOT NULL,
+            gender TEXT NOT NULL CHECK (gender IN ('m', 'f')),
             faculty TEXT NOT NULL,
             course INTEGER NOT NULL,
             bio TEXT NOT NULL,
@@ -49,7 +406,8 @@ class Database:
         )
         """
         )
-        cursor.execute('''
+        cursor.execute(
+            """
         CREATE TABLE IF NOT EXISTS complaints (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             from_user_id INTEGER NOT NULL,
@@ -59,28 +417,234 @@ class Database:
             FOREIGN KEY (from_user_id) REFERENCES users (user_id),
             FOREIGN KEY (to_user_id) REFERENCES users (user_id)
         )
-        ''')
+        """
+        )
+        # Просмотренные анкеты: одна строка на пару (кто смотрел, кого).
+        # WITHOUT ROWID - таблица и есть индекс по первичному ключу, поэтому
+        # проверка "уже видел" в ленте - один поиск по B-дереву
+        cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS views (
+            viewer_id INTEGER NOT NULL,
+            target_id INTEGER NOT NULL,
+            action TEXT NOT NULL,
+            PRIMARY KEY (viewer_id, target_id)
+        ) WITHOUT ROWID
+        """
+        )
+        # Взаимные лайки, материализованные в момент лайка: матчи пользователя
+        # читаются диапазоном по первичному ключу вместо самосоединения likes
+        has_matches = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'matches'"
+        ).fetchone()
+        cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS matches (
+            user_id INTEGER NOT NULL,
+            match_user_id INTEGER NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, match_user_id)
+        ) WITHOUT ROWID
+        """
+        )
+        if not has_matches:
+            # Таблица только что создана - переносим матчи из уже сохраненных лайков
+            cursor.execute(
+                """
+            INSERT OR IGNORE INTO matches (user_id, match_user_id)
+            SELECT DISTINCT l1.from_user_id, l1.to_user_id
+            FROM likes l1
+            JOIN likes l2
+                ON l2.from_user_id = l1.to_user_id AND l2.to_user_id = l1.from_user_id
+            """
+            )
+        # Сохраненные критерии поиска; courses - номера курсов через запятую
+        cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS search_criteria (
+            user_id INTEGER PRIMARY KEY,
+            gender TEXT,
+            faculty TEXT,
+            courses TEXT,
+            age_min INTEGER,
+            age_max INTEGER
+        )
+        """
+        )
+        # Вторичные индексы: подсчеты лайков и жалоб, поиск взаимного лайка
+        # и выборка активных анкет не должны сканировать таблицы целиком
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_likes_from_to ON likes (from_user_id, to_user_id)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_likes_to_from ON likes (to_user_id, from_user_id)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_complaints_to ON complaints (to_user_id)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_profiles_active_gender ON profiles (active, gender)"
+        )
+        # (active, user_id): лента читается диапазоном по курсору без сортировки
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_profiles_active ON profiles (active)"
+        )
+        # Поиск по критериям: равенства по факультету и полу, затем курсор по user_id
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_profiles_search ON profiles (active, faculty, gender)"
+        )
+        self._create_counters(cursor)
+        self._create_fts(cursor)
         self.conn.commit()
+        if schema_version < SCHEMA_VERSION:
+            if has_profiles:
+                # Старая база: пол записан текстом и без ограничения
+                self.migrate_gender_values()
+                for trigger in GENDER_GUARD_TRIGGERS:
+                    cursor.execute(trigger)
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.commit()
 
-    def add_user(self, user_id: int, username: str, full_name: str):
-        cursor = self.conn.cursor()
+    def _create_fts(self, cursor: sqlite3.Cursor):
+        """Полнотекстовый индекс анкет; для старой базы заполняется из profiles"""
+        has_fts = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'profiles_fts'"
+        ).fetchone()
+        cursor.execute(PROFILES_FTS)
+        if not has_fts:
+            cursor.execute(
+                "INSERT INTO profiles_fts (rowid, name, faculty, bio) "
+                f"SELECT user_id, {_FTS_COLUMNS.format(row='profiles')} FROM profiles"
+            )
+        for trigger in FTS_TRIGGERS:
+            cursor.execute(trigger)
+
+    def _create_counters(self, cursor: sqlite3.Cursor):
+        """Глобальные счетчики для /stats, которые поддерживают триггеры
+
+        Счетчики меняются в той же транзакции, что и строки users/profiles,
+        поэтому /stats читает три значения по ключу вместо COUNT(*).
+        """
+        has_counters = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'counters'"
+        ).fetchone()
         cursor.execute(
-            "INSERT OR IGNORE INTO users (user_id, username, full_name) VALUES (?, ?, ?)",
-            (user_id, username, full_name),
+            """
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """
         )
+        if not has_counters:
+            # Первый запуск на существующей базе - засеваем счетчики подсчетом
+            cursor.execute(
+                """
+            INSERT INTO counters (name, value) VALUES
+                ('users', (SELECT COUNT(*) FROM users)),
+                ('profiles', (SELECT COUNT(*) FROM profiles)),
+                ('active_profiles', (SELECT COUNT(*) FROM profiles WHERE active = 1))
+            """
+            )
+        for trigger in COUNTER_TRIGGERS:
+            cursor.execute(trigger)
+
+    def _get_counter(self, name: str) -> int:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT value FROM counters WHERE name = ?", (name,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _execute_write(self, sql: str, params: tuple):
+        """Выполняет запись сразу или ставит ее в очередь отложенной записи"""
+        if self.write_behind:
+            self._enqueue(sql, params)
+            return
+        cursor = self.conn.cursor()
+        cursor.execute(sql, params)
         self.conn.commit()
 
+    def _enqueue(self, sql: str, params: tuple):
+        self._enqueue_many([(sql, params)])
+
+    def _enqueue_many(self, writes: list[tuple[str, tuple]]):
+        """Ставит в очередь несколько записей, которые попадут в один сброс"""
+        for sql, params in writes:
+            self._pending.setdefault(sql, []).append(params)
+        self._pending_rows += len(writes)
+        if (
+            self._pending_rows >= self.flush_rows
+            or time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            # Ошибка сброса - не ошибка записи, которая его вызвала: строки
+            # остаются в очереди до следующего сброса
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при сбросе отложенной записи: {e}")
+
+    @property
+    def pending_rows(self) -> int:
+        """Строк в очереди отложенной записи"""
+        return self._pending_rows
+
+    def _pending_for(self, sql: str) -> list[tuple]:
+        return self._pending.get(sql, [])
+
+    def flush(self):
+        """Записывает очередь отложенных записей одной транзакцией
+
+        Если запись временно невозможна (sqlite3.OperationalError: база
+        заблокирована, диск занят), строки возвращаются в очередь перед
+        новыми и попадут в следующий сброс. Другие ошибки означают, что
+        пакет не запишется никогда, - он отбрасывается. Ошибка в обоих
+        случаях пробрасывается.
+        """
+        self._last_flush = time.monotonic()
+        if not self._pending_rows:
+            return
+        pending, pending_rows = self._pending, self._pending_rows
+        self._pending, self._pending_rows = {}, 0
+        cursor = self.conn.cursor()
+        try:
+            for sql, rows in pending.items():
+                cursor.executemany(sql, rows)
+            self.conn.commit()
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+            for sql, rows in self._pending.items():
+                pending.setdefault(sql, []).extend(rows)
+            self._pending = pending
+            self._pending_rows += pending_rows
+            raise
+        except Exception:
+            self.conn.rollback()
+            logger.error("Пакет отложенной записи отброшен: %d строк", pending_rows)
+            raise
+
+    def add_user(self, user_id: int, username: str, full_name: str):
+        self._execute_write(INSERT_USER, (user_id, username, full_name))
+
     def save_profile(self, user_id: int, profile_data: Dict):
+        # UPSERT вместо INSERT OR REPLACE: замена удаляет строку без срабатывания
+        # триггеров удаления, и счетчики анкет разошлись бы с таблицей.
+        # Как и раньше, сохранение анкеты снова делает ее активной
+        # Пол приводится к коду 'm' / 'f'; нераспознанное значение - ValueError
         cursor = self.conn.cursor()
         cursor.execute(
-            """INSERT OR REPLACE INTO profiles 
-            (user_id, name, age, gender, faculty, course, bio, photo_id) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            """INSERT INTO profiles
+            (user_id, name, age, gender, faculty, course, bio, photo_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                name = excluded.name, age = excluded.age, gender = excluded.gender,
+                faculty = excluded.faculty, course = excluded.course,
+                bio = excluded.bio, photo_id = excluded.photo_id,
+                active = excluded.active, blocked = excluded.blocked""",
             (
                 user_id,
                 profile_data["name"],
                 profile_data["age"],
-                profile_data["gender"],
+                normalize_gender(profile_data["gender"]),
                 profile_data["faculty"],
                 profile_data["course"],
                 profile_data["bio"],
@@ -89,22 +653,18 @@ class Database:
         )
         self.conn.commit()
 
-    def get_profile(self, user_id: int) -> Optional[Dict]:
+    def _profile_cursor(self) -> sqlite3.Cursor:
+        """Курсор, строки которого - записи Profile"""
         cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM profiles WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
-        if row:
-            return {
-                "user_id": row[0],
-                "name": row[1],
-                "age": row[2],
-                "gender": row[3],
-                "faculty": row[4],
-                "course": row[5],
-                "bio": row[6],
-                "photo_id": row[7],
-            }
-        return None
+        cursor.row_factory = _profile_factory
+        return cursor
+
+    def get_profile(self, user_id: int) -> Optional[Profile]:
+        cursor = self._profile_cursor()
+        cursor.execute(
+            f"SELECT {PROFILE_COLUMNS} FROM profiles WHERE user_id = ?", (user_id,)
+        )
+        return cursor.fetchone()
 
     def delete_profile(self, user_id: int):
         cursor = self.conn.cursor()
@@ -119,147 +679,452 @@ class Database:
         )
         self.conn.commit()
 
-    def get_all_profiles(self, exclude_user_id: int) -> List[Dict]:
+    def get_all_profiles(self, exclude_user_id: int) -> List[Profile]:
+        cursor = self._profile_cursor()
+        cursor.execute(
+            f"SELECT {PROFILE_COLUMNS} FROM profiles "
+            f"WHERE user_id != ? AND active = 1 AND {self.NOT_VIEWED}",
+            (exclude_user_id, exclude_user_id),
+        )
+        return cursor.fetchall()
+
+    def migrate_gender_values(self, batch_size: int = 1000) -> int:
+        """Переводит пол старых анкет в коды 'm' / 'f' пакетами по batch_size
+
+        Каждый пакет - отдельная короткая транзакция, повторный запуск ничего
+        не меняет. Нераспознанные значения остаются как есть и попадают в
+        журнал. Возвращает число обновленных анкет.
+        """
         cursor = self.conn.cursor()
+        updated = 0
+        unknown = 0
+        last_id = -1
+        while True:
+            cursor.execute(
+                "SELECT user_id, gender FROM profiles "
+                "WHERE user_id > ? AND gender NOT IN ('m', 'f') ORDER BY user_id LIMIT ?",
+                (last_id, batch_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            batch = []
+            for user_id, gender in rows:
+                code = _GENDER_CODES.get(str(gender).strip().lower())
+                if code is None:
+                    unknown += 1
+                else:
+                    batch.append((code, user_id))
+            cursor.executemany(
+                "UPDATE profiles SET gender = ? WHERE user_id = ?", batch
+            )
+            self.conn.commit()
+            updated += len(batch)
+        if unknown:
+            logger.warning("Не удалось распознать пол в %d анкетах", unknown)
+        return updated
+
+    def get_profiles_by_gender(
+        self, exclude_user_id: int, gender: str
+    ) -> List[Profile]:
+        cursor = self._profile_cursor()
+        gender_code = normalize_gender(gender)
+        logger.debug("Поиск по полу: gender=%s", gender_code)
         cursor.execute(
-            "SELECT * FROM profiles WHERE user_id != ? AND active = 1",
-            (exclude_user_id,),
-        )
-        rows = cursor.fetchall()
-        return [
-            {
-                "user_id": row[0],
-                "name": row[1],
-                "age": row[2],
-                "gender": row[3],
-                "faculty": row[4],
-                "course": row[5],
-                "bio": row[6],
-                "photo_id": row[7],
-            }
-            for row in rows
-        ]
-
-    def migrate_gender_values(self):
+            f"SELECT {PROFILE_COLUMNS} FROM profiles "
+            f"WHERE active = 1 AND gender = ? AND user_id != ? AND {self.NOT_VIEWED}",
+            (gender_code, exclude_user_id, exclude_user_id),
+        )
+        profiles = cursor.fetchall()
+        logger.debug("Найдено анкет: %d", len(profiles))
+        return profiles
+
+    @staticmethod
+    def _feed_query(
+        columns: str,
+        viewer_id: int,
+        after_user_id: int,
+        criteria: SearchCriteria,
+        limit: int,
+    ) -> tuple[str, list]:
+        conditions, criteria_params = criteria.where()
+        query = (
+            f"SELECT {columns} FROM profiles "
+            "WHERE active = 1 AND user_id > ? AND user_id != ?"
+            f"{conditions} AND {Database.NOT_VIEWED} ORDER BY user_id LIMIT ?"
+        )
+        params = [after_user_id, viewer_id, *criteria_params, viewer_id, limit]
+        return query, params
+
+    def get_feed_page(
+        self,
+        viewer_id: int,
+        after_user_id: int = 0,
+        gender: Optional[str] = None,
+        limit: int = 10,
+        criteria: Optional[SearchCriteria] = None,
+    ) -> List[Profile]:
+        """Возвращает следующую страницу ленты после курсора after_user_id
+
+        Пагинация по ключу: каждая страница стоит O(limit) независимо от
+        того, как далеко пользователь пролистал ленту. Фильтр - либо только
+        пол gender, либо полные критерии criteria.
+        """
+        if criteria is None:
+            criteria = SearchCriteria(gender=gender)
+        cursor = self._profile_cursor()
+        cursor.execute(
+            *self._feed_query(
+                PROFILE_COLUMNS, viewer_id, after_user_id, criteria, limit
+            )
+        )
+        return cursor.fetchall()
+
+    def get_feed_ids(
+        self,
+        viewer_id: int,
+        after_user_id: int = 0,
+        gender: Optional[str] = None,
+        limit: int = 10,
+        criteria: Optional[SearchCriteria] = None,
+    ) -> List[int]:
+        """То же, что get_feed_page, но только user_id кандидатов"""
+        if criteria is None:
+            criteria = SearchCriteria(gender=gender)
         cursor = self.conn.cursor()
-        # Все варианты мужского
         cursor.execute(
-            "UPDATE profiles SET gender = 'мужской' WHERE LOWER(TRIM(gender)) IN ('мужской', 'мужчина', 'male', 'm', 'парень')"
+            *self._feed_query("user_id", viewer_id, after_user_id, criteria, limit)
         )
-        # Все варианты женского
+        return [row[0] for row in cursor.fetchall()]
+
+    def filter_feed_ids(
+        self, viewer_id: int, user_ids: Sequence[int], criteria: SearchCriteria
+    ) -> List[int]:
+        """Те из user_ids, что сейчас подходят в ленту viewer_id (как get_feed_ids)"""
+        conditions, criteria_params = criteria.where()
+        cursor = self.conn.cursor()
+        result = []
+        # Пачками: число параметров запроса в SQLite ограничено
+        for start in range(0, len(user_ids), 500):
+            end = start + 500
+            chunk = list(user_ids[start:end])
+            placeholders = ", ".join("?" * len(chunk))
+            cursor.execute(
+                f"SELECT user_id FROM profiles WHERE user_id IN ({placeholders})"
+                f" AND active = 1 AND user_id != ?{conditions} AND {self.NOT_VIEWED}"
+                " ORDER BY user_id",
+                [*chunk, viewer_id, *criteria_params, viewer_id],
+            )
+            result.extend(row[0] for row in cursor.fetchall())
+        return result
+
+    def search_profiles(
+        self, viewer_id: int, text: str, offset: int = 0, limit: int = 10
+    ) -> List[Profile]:
+        """Анкеты, в имени, факультете или описании которых есть слова из text
+
+        Слова ищутся как префиксы ("гитар" найдет "гитара" и "гитарист"),
+        результаты упорядочены по bm25. Поиск идет по индексу profiles_fts,
+        анкеты дочитываются по первичному ключу. В записях только поля
+        списка результатов, описание - первые 80 символов.
+        """
+        query = fts_query(text)
+        if query is None:
+            return []
+        cursor = self._profile_cursor()
         cursor.execute(
-            "UPDATE profiles SET gender = 'женский' WHERE LOWER(TRIM(gender)) IN ('женский', 'женщина', 'female', 'f', 'девушка')"
+            f"SELECT {SEARCH_RESULT_COLUMNS} FROM profiles_fts "
+            "JOIN profiles p ON p.user_id = profiles_fts.rowid "
+            "WHERE profiles_fts MATCH ? AND p.active = 1 AND p.user_id != ? "
+            f"ORDER BY bm25(profiles_fts, {', '.join(map(str, FTS_WEIGHTS))}) "
+            "LIMIT ? OFFSET ?",
+            (query, viewer_id, limit, offset),
+        )
+        return cursor.fetchall()
+
+    def get_ranking_rows(self, user_ids: Optional[List[int]] = None) -> List[tuple]:
+        """Признаки активных анкет для ранжирования ленты (services.ranking)
+
+        Строка: (user_id, age, course, faculty, gender, лайков получено,
+        время последнего лайка в секундах Unix или None). Лайки считаются по
+        индексам likes; последний лайк - максимальный id из idx_likes_from_to,
+        поэтому из таблицы likes читается одна строка на анкету.
+        user_ids - только эти анкеты (скрытых и удаленных в ответе нет).
+        """
+        query = (
+            "SELECT p.user_id, p.age, p.course, p.faculty, p.gender, "
+            "(SELECT COUNT(*) FROM likes l WHERE l.to_user_id = p.user_id), "
+            "(SELECT CAST(strftime('%s', l.timestamp) AS INTEGER) FROM likes l "
+            "WHERE l.id = (SELECT MAX(id) FROM likes WHERE from_user_id = p.user_id)) "
+            "FROM profiles p WHERE p.active = 1"
+        )
+        params: list = []
+        if user_ids is not None:
+            if not user_ids:
+                return []
+            query += f" AND p.user_id IN ({', '.join('?' * len(user_ids))})"
+            params.extend(user_ids)
+        cursor = self.conn.cursor()
+        cursor.execute(query + " ORDER BY p.user_id", params)
+        return cursor.fetchall()
+
+    def get_viewed_ids(self, viewer_id: int) -> List[int]:
+        """user_id анкет, которые пользователь уже оценил"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT target_id FROM views WHERE viewer_id = ?", (viewer_id,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_likers(self, user_id: int) -> List[int]:
+        """Кто лайкнул пользователя"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT from_user_id FROM likes WHERE to_user_id = ?", (user_id,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    def save_search_criteria(self, user_id: int, criteria: SearchCriteria):
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """INSERT INTO search_criteria
+            (user_id, gender, faculty, courses, age_min, age_max)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                gender = excluded.gender, faculty = excluded.faculty,
+                courses = excluded.courses, age_min = excluded.age_min,
+                age_max = excluded.age_max""",
+            (
+                user_id,
+                criteria.gender,
+                criteria.faculty,
+                ",".join(map(str, criteria.courses)) or None,
+                criteria.age_min,
+                criteria.age_max,
+            ),
         )
         self.conn.commit()
 
-    def get_profiles_by_gender(self, exclude_user_id: int, gender: str) -> List[Dict]:
-        import logging
+    def get_search_criteria(self, user_id: int) -> Optional[SearchCriteria]:
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT gender, faculty, courses, age_min, age_max "
+            "FROM search_criteria WHERE user_id = ?",
+            (user_id,),
+        )
+        row = cursor.fetchone()
+        return _criteria_from_row(row) if row else None
 
+    def get_faculties(self, limit: int = 10) -> List[str]:
+        """Самые частые факультеты активных анкет - варианты для критериев поиска"""
         cursor = self.conn.cursor()
-        gender_param = gender.strip().lower()
-        logging.info(f"Поиск по полу: gender_param={gender_param}")
-        cursor.execute(
-            "SELECT * FROM profiles WHERE user_id != ? AND LOWER(TRIM(gender)) = ? AND active = 1",
-            (exclude_user_id, gender_param),
-        )
-        rows = cursor.fetchall()
-        logging.info(f"Найдено анкет: {len(rows)}")
-        return [
-            {
-                "user_id": row[0],
-                "name": row[1],
-                "age": row[2],
-                "gender": row[3],
-                "faculty": row[4],
-                "course": row[5],
-                "bio": row[6],
-                "photo_id": row[7],
-            }
-            for row in rows
-        ]
+        cursor.execute(
+            "SELECT faculty FROM profiles WHERE active = 1 "
+            "GROUP BY faculty ORDER BY COUNT(*) DESC, faculty LIMIT ?",
+            (limit,),
+        )
+        return [row[0] for row in cursor.fetchall()]
 
     def add_like(self, from_user_id: int, to_user_id: int):
+        self._execute_write(INSERT_LIKE, (from_user_id, to_user_id))
+
+    def like(self, from_user_id: int, to_user_id: int) -> bool:
+        """Ставит лайк и возвращает True, если он взаимный
+
+        Лайк, проверка обратного лайка и запись матча выполняются одной
+        транзакцией (при отложенной записи - попадают в один сброс).
+        """
+        writes = [(INSERT_LIKE, (from_user_id, to_user_id))]
+        try:
+            is_match = self.has_like(to_user_id, from_user_id)
+            if is_match:
+                writes.append((INSERT_MATCH, (from_user_id, to_user_id)))
+                writes.append((INSERT_MATCH, (to_user_id, from_user_id)))
+            if self.write_behind:
+                self._enqueue_many(writes)
+                return is_match
+            cursor = self.conn.cursor()
+            for sql, params in writes:
+                cursor.execute(sql, params)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return is_match
+
+    def has_like(self, from_user_id: int, to_user_id: int) -> bool:
+        """Проверяет, ставил ли from_user_id лайк пользователю to_user_id
+
+        Учитывает и лайки, еще ждущие в очереди отложенной записи.
+        """
+        if (from_user_id, to_user_id) in self._pending_for(INSERT_LIKE):
+            return True
         cursor = self.conn.cursor()
         cursor.execute(
-            "INSERT INTO likes (from_user_id, to_user_id) VALUES (?, ?)",
+            "SELECT 1 FROM likes WHERE from_user_id = ? AND to_user_id = ?",
             (from_user_id, to_user_id),
         )
-        self.conn.commit()
+        return cursor.fetchone() is not None
 
-    def add_complaint(self, from_user_id: int, to_user_id: int, reason: str = ""):
+    def has_view(self, viewer_id: int, target_id: int) -> bool:
+        """Оценивал ли viewer_id анкету target_id, включая очередь отложенной записи"""
+        if any(
+            row[:2] == (viewer_id, target_id) for row in self._pending_for(UPSERT_VIEW)
+        ):
+            return True
         cursor = self.conn.cursor()
         cursor.execute(
-            'INSERT INTO complaints (from_user_id, to_user_id, reason) VALUES (?, ?, ?)',
-            (from_user_id, to_user_id, reason)
+            "SELECT 1 FROM views WHERE viewer_id = ? AND target_id = ?",
+            (viewer_id, target_id),
         )
-        self.conn.commit()
+        return cursor.fetchone() is not None
+
+    def record_view(self, viewer_id: int, target_id: int, action: str):
+        """Запоминает, что viewer_id оценил анкету target_id (like/skip/complain)
+
+        Просмотры всегда пишутся через очередь отложенной записи: пакетом по
+        flush_rows строк, по таймеру или при вызове flush.
+        """
+        if action not in VIEW_ACTIONS:
+            raise ValueError(f"Неизвестное действие просмотра: {action}")
+        self._enqueue(UPSERT_VIEW, (viewer_id, target_id, action))
+
+    def add_complaint(self, from_user_id: int, to_user_id: int, reason: str = ""):
+        self._execute_write(INSERT_COMPLAINT, (from_user_id, to_user_id, reason))
 
     def get_complaints_count(self, to_user_id: int) -> int:
         cursor = self.conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM complaints WHERE to_user_id = ?', (to_user_id,))
-        return cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT COUNT(*) FROM complaints WHERE to_user_id = ?", (to_user_id,)
+        )
+        pending = sum(
+            1 for row in self._pending_for(INSERT_COMPLAINT) if row[1] == to_user_id
+        )
+        return cursor.fetchone()[0] + pending
 
     def block_user(self, user_id: int):
         cursor = self.conn.cursor()
-        cursor.execute('UPDATE profiles SET blocked = 1, active = 0 WHERE user_id = ?', (user_id,))
+        cursor.execute(
+            "UPDATE profiles SET blocked = 1, active = 0 WHERE user_id = ?", (user_id,)
+        )
         self.conn.commit()
 
     def unblock_user(self, user_id: int):
         cursor = self.conn.cursor()
-        cursor.execute('UPDATE profiles SET blocked = 0, active = 1 WHERE user_id = ?', (user_id,))
+        cursor.execute(
+            "UPDATE profiles SET blocked = 0, active = 1 WHERE user_id = ?", (user_id,)
+        )
         self.conn.commit()
 
     def is_user_blocked(self, user_id: int) -> bool:
         cursor = self.conn.cursor()
-        cursor.execute('SELECT blocked FROM profiles WHERE user_id = ?', (user_id,))
+        cursor.execute("SELECT blocked FROM profiles WHERE user_id = ?", (user_id,))
         row = cursor.fetchone()
         return bool(row and row[0])
 
     def get_total_users(self) -> int:
         """Возвращает общее количество пользователей"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM users")
-        return cursor.fetchone()[0]
+        return self._get_counter("users")
 
     def get_total_profiles(self) -> int:
         """Возвращает общее количество анкет"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM profiles")
-        return cursor.fetchone()[0]
+        return self._get_counter("profiles")
 
     def get_active_profiles_count(self) -> int:
         """Возвращает количество активных анкет"""
+        return self._get_counter("active_profiles")
+
+    def get_mutual_likes(self, user_id: int) -> List[Profile]:
+        """Возвращает взаимные лайки (матчи) для пользователя
+
+        Только поля списка матчей; описание - первые 51 символ (50 для
+        показа и признак того, что оно длиннее).
+        """
+        cursor = self._profile_cursor()
+        cursor.execute(
+            f"""
+            SELECT {MATCH_COLUMNS}
+            FROM matches m
+            JOIN profiles p ON p.user_id = m.match_user_id
+            WHERE m.user_id = ? AND p.active = 1
+        """,
+            (user_id,),
+        )
+        return cursor.fetchall()
+
+    def get_matches_count(self, user_id: int) -> int:
+        """Возвращает количество взаимных лайков с активными анкетами"""
         cursor = self.conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM profiles WHERE active = 1")
+        cursor.execute(
+            """
+            SELECT COUNT(*)
+            FROM matches m
+            JOIN profiles p ON p.user_id = m.match_user_id
+            WHERE m.user_id = ? AND p.active = 1
+        """,
+            (user_id,),
+        )
         return cursor.fetchone()[0]
 
-    def get_mutual_likes(self, user_id: int) -> List[Dict]:
-        """Возвращает взаимные лайки (матчи) для пользователя"""
+    def get_user_stats(self, user_id: int) -> Optional[Dict]:
+        """Возвращает имя, число лайков и матчей пользователя одним запросом
+
+        None, если анкеты нет. Учитывает лайки и матчи из очереди отложенной записи.
+        """
         cursor = self.conn.cursor()
         cursor.execute(
             """
-            SELECT DISTINCT p.* 
+            SELECT
+                p.name,
+                (SELECT COUNT(*) FROM likes WHERE from_user_id = p.user_id),
+                (SELECT COUNT(*) FROM likes WHERE to_user_id = p.user_id),
+                (SELECT COUNT(*)
+                 FROM matches m
+                 JOIN profiles mp ON mp.user_id = m.match_user_id
+                 WHERE m.user_id = p.user_id AND mp.active = 1)
             FROM profiles p
-            INNER JOIN likes l1 ON p.user_id = l1.to_user_id AND l1.from_user_id = ?
-            INNER JOIN likes l2 ON p.user_id = l2.from_user_id AND l2.to_user_id = ?
-            WHERE p.active = 1
+            WHERE p.user_id = ?
+        """,
+            (user_id,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        pending_likes = self._pending_for(INSERT_LIKE)
+        return {
+            "name": row[0],
+            "likes_given": row[1]
+            + sum(1 for from_id, _ in pending_likes if from_id == user_id),
+            "likes_received": row[2]
+            + sum(1 for _, to_id in pending_likes if to_id == user_id),
+            "matches": row[3] + self._pending_matches_count(user_id),
+        }
+
+    def _pending_matches_count(self, user_id: int) -> int:
+        """Новые матчи пользователя из очереди отложенной записи
+
+        Повторный лайк ставит в очередь уже сохраненный матч (INSERT OR
+        IGNORE его не продублирует) - такие пары не считаются, как и матчи
+        со скрытыми анкетами.
+        """
+        match_ids = {
+            match_id
+            for uid, match_id in self._pending_for(INSERT_MATCH)
+            if uid == user_id
+        }
+        if not match_ids:
+            return 0
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT COUNT(*) FROM profiles p
+            WHERE p.user_id IN ({', '.join('?' * len(match_ids))}) AND p.active = 1
+            AND NOT EXISTS (
+                SELECT 1 FROM matches m WHERE m.user_id = ? AND m.match_user_id = p.user_id
+            )
         """,
-            (user_id, user_id),
-        )
-        rows = cursor.fetchall()
-        return [
-            {
-                "user_id": row[0],
-                "name": row[1],
-                "age": row[2],
-                "gender": row[3],
-                "faculty": row[4],
-                "course": row[5],
-                "bio": row[6],
-                "photo_id": row[7],
-            }
-            for row in rows
-        ]
+            (*match_ids, user_id),
+        )
+        return cursor.fetchone()[0]
 
     def get_user_likes_count(self, user_id: int) -> int:
         """Возвращает количество лайков, которые поставил пользователь"""
@@ -274,4 +1139,5 @@ class Database:
         return cursor.fetchone()[0]
 
     def close(self):
+        self.flush()
         self.conn.close()
@@ -1,7 +1,17 @@
 from aiogram.filters import BaseFilter
-from aiogram.types import Message
+from aiogram.types import CallbackQuery, Message
 
 
 class IsPhotoDoc(BaseFilter):
     async def __call__(self, message: Message) -> bool | dict[str, str]:
         pass
+
+
+class IsAdmin(BaseFilter):
+    """Пропускает только пользователей из ADMIN_IDS"""
+
+    def __init__(self, admin_ids: list[int]):
+        self.admin_ids = set(admin_ids)
+
+    async def __call__(self, event: Message | CallbackQuery) -> bool:
+        return event.from_user is not None and event.from_user.id in self.admin_ids
@@ -0,0 +1,104 @@
+import logging
+from typing import Optional
+
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message
+from async_database import AsyncDatabase
+from filters.my_filters import IsAdmin
+from services.query_tracer import QueryStats, QueryTracer
+
+logger = logging.getLogger(__name__)
+
+# Лимит длины сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+MAX_QUERY_LENGTH = 300
+
+
+def storage_stats(state: FSMContext) -> Optional[dict]:
+    """Размер хранилища FSM; он есть только у BoundedMemoryStorage"""
+    stats = getattr(state.storage, "stats", None)
+    return stats() if stats else None
+
+
+def format_db_stats(pragmas: dict, cache: dict, fsm: Optional[dict]) -> str:
+    """Текст /db_stats: настройки SQLite, кэш анкет и хранилище FSM"""
+    text = (
+        "⚙️ Настройки SQLite:\n"
+        + "".join(f"• {name}: {value}\n" for name, value in pragmas.items())
+        + "\n🗂 Кэш анкет: "
+        f"{cache['size']}/{cache['max_size']}, "
+        f"попаданий {cache['hits']}, промахов {cache['misses']}, "
+        f"вытеснено {cache['evictions']}\n"
+    )
+    if fsm is not None:
+        text += (
+            f"💾 Состояния FSM: {fsm['size']}/{fsm['max_entries']}, "
+            f"истекло {fsm['expired']}, вытеснено {fsm['evicted']}\n"
+        )
+    return text
+
+
+def parse_limit(args: Optional[str], default: int = 10, maximum: int = 50) -> int:
+    """Число запросов для /top_queries из аргумента команды"""
+    limit = int(args) if args and args.isdigit() else default
+    return min(limit, maximum)
+
+
+def format_query_stats(position: int, stats: QueryStats) -> str:
+    """Строка /top_queries об одном запросе; длинный текст запроса обрезается"""
+    query = stats.query
+    if len(query) > MAX_QUERY_LENGTH:
+        query = query[:MAX_QUERY_LENGTH] + "…"
+    return (
+        f"{position}. {stats.total_time * 1000:.1f} мс всего, {stats.calls} вызовов, "
+        f"в среднем {stats.avg_time * 1000:.2f} мс, макс. {stats.max_time * 1000:.1f} мс, "
+        f"строк {stats.rows}\n{query}\n"
+    )
+
+
+def format_top_queries(
+    top: Optional[list[QueryStats]], tracer: Optional[QueryTracer]
+) -> str:
+    """Текст /top_queries, не длиннее одного сообщения Telegram"""
+    if top is None:
+        return "ℹ️ Трассировка запросов выключена (DB_TRACE=True)."
+    if not top:
+        return "ℹ️ Запросов пока не было."
+
+    lines = [f"🐢 Самые дорогие запросы с запуска (медленных: {tracer.slow_queries}):\n"]
+    lines += [format_query_stats(i, stats) for i, stats in enumerate(top, 1)]
+    text = ""
+    for line in lines:
+        if len(text) + len(line) > MAX_MESSAGE_LENGTH:
+            break
+        text += line + "\n"
+    return text.rstrip()
+
+
+def setup_admin_handlers(router: Router, db: AsyncDatabase, admin_ids: list[int]):
+    """Регистрирует команды администраторов"""
+
+    @router.message(Command("top_queries"), IsAdmin(admin_ids))
+    async def cmd_top_queries(message: Message, command: CommandObject):
+        try:
+            top = db.top_queries(parse_limit(command.args))
+            await message.answer(format_top_queries(top, db.tracer))
+        except Exception as e:
+            logger.error(f"Ошибка при получении статистики запросов: {e}")
+            await message.answer("❌ Ошибка при получении статистики запросов.")
+
+    @router.message(Command("db_stats"), IsAdmin(admin_ids))
+    async def cmd_db_stats(message: Message, state: FSMContext):
+        try:
+            await message.answer(
+                format_db_stats(
+                    await db.get_pragmas(),
+                    db.profile_cache_stats(),
+                    storage_stats(state),
+                )
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при получении статистики базы: {e}")
+            await message.answer("❌ Ошибка при получении статистики базы.")
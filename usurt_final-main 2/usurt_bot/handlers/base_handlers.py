@@ -3,20 +3,20 @@ import logging
 from aiogram import F, Router
 from aiogram.filters import Command, CommandStart
 from aiogram.types import Message
-from database import Database
+from async_database import AsyncDatabase
 from key_boards.main_menu import get_main_keyboard
 
 logger = logging.getLogger(__name__)
 
 
-def setup_base_handlers(router: Router, db: Database):
+def setup_base_handlers(router: Router, db: AsyncDatabase):
     """Регистрирует базовые обработчики"""
 
     @router.message(CommandStart())
     @router.message(Command("start"))
     async def cmd_start(message: Message):
         try:
-            db.add_user(
+            await db.add_user(
                 user_id=message.from_user.id,
                 username=message.from_user.username,
                 full_name=message.from_user.full_name,
@@ -26,7 +26,7 @@ def setup_base_handlers(router: Router, db: Database):
                 "Здесь ты можешь познакомиться с другими студентами.\n\n"
                 "🎯 Что умеет бот:\n"
                 "• Создание анкеты с фото\n"
-                "• Поиск по полу и факультету\n"
+                "• Поиск по полу, факультету, курсу и возрасту\n"
                 "• Система лайков\n"
                 "• Управление видимостью анкеты\n\n"
                 "Выберите действие:",
@@ -57,9 +57,9 @@ def setup_base_handlers(router: Router, db: Database):
     async def cmd_stats(message: Message):
         try:
             # Получаем статистику
-            total_users = db.get_total_users()
-            total_profiles = db.get_total_profiles()
-            active_profiles = db.get_active_profiles_count()
+            total_users = await db.get_total_users()
+            total_profiles = await db.get_total_profiles()
+            active_profiles = await db.get_active_profiles_count()
 
             stats_text = (
                 "📊 Статистика бота:\n\n"
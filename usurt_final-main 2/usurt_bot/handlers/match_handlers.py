@@ -2,19 +2,19 @@ import logging
 
 from aiogram import F, Router
 from aiogram.types import CallbackQuery, Message
-from database import Database
+from async_database import AsyncDatabase
 from key_boards.main_menu import get_main_keyboard, get_match_keyboard
 
 logger = logging.getLogger(__name__)
 
 
-def setup_match_handlers(router: Router, db: Database):
+def setup_match_handlers(router: Router, db: AsyncDatabase):
     """Регистрирует обработчики для системы матчей"""
 
     @router.message(F.text == "Мои матчи")
     async def show_matches(message: Message):
         try:
-            matches = db.get_mutual_likes(message.from_user.id)
+            matches = await db.get_mutual_likes(message.from_user.id)
 
             if not matches:
                 await message.answer(
@@ -27,9 +27,9 @@ def setup_match_handlers(router: Router, db: Database):
             match_text = f"💕 У тебя {len(matches)} взаимных лайков!\n\n"
             for i, match in enumerate(matches[:5], 1):  # Показываем первые 5
                 match_text += (
-                    f"{i}. {match['name']} ({match['age']} лет)\n"
-                    f"   {match['faculty']}, {match['course']} курс\n"
-                    f"   {match['bio'][:50]}{'...' if len(match['bio']) > 50 else ''}\n\n"
+                    f"{i}. {match.name} ({match.age} лет)\n"
+                    f"   {match.faculty}, {match.course} курс\n"
+                    f"   {match.bio[:50]}{'...' if len(match.bio) > 50 else ''}\n\n"
                 )
 
             if len(matches) > 5:
@@ -44,18 +44,18 @@ def setup_match_handlers(router: Router, db: Database):
     @router.message(F.text == "Моя статистика")
     async def show_user_stats(message: Message):
         try:
-            profile = db.get_profile(message.from_user.id)
-            if not profile:
+            # Имя, лайки и матчи - один запрос, повторные нажатия берутся из кэша
+            stats = await db.get_user_stats(message.from_user.id)
+            if not stats:
                 await message.answer("❌ Сначала создай анкету!")
                 return
 
-            likes_given = db.get_user_likes_count(message.from_user.id)
-            likes_received = db.get_user_likes_received_count(message.from_user.id)
-            matches_count = len(db.get_mutual_likes(message.from_user.id))
+            likes_received = stats["likes_received"]
+            matches_count = stats["matches"]
 
             stats_text = (
-                f"📊 Статистика {profile['name']}:\n\n"
-                f"❤️ Поставлено лайков: {likes_given}\n"
+                f"📊 Статистика {stats['name']}:\n\n"
+                f"❤️ Поставлено лайков: {stats['likes_given']}\n"
                 f"💖 Получено лайков: {likes_received}\n"
                 f"💕 Взаимных лайков: {matches_count}\n\n"
             )
@@ -76,7 +76,7 @@ def setup_match_handlers(router: Router, db: Database):
     async def show_match_profile(callback: CallbackQuery):
         try:
             match_user_id = int(callback.data.split("_")[1])
-            match_profile = db.get_profile(match_user_id)
+            match_profile = await db.get_profile(match_user_id)
 
             if not match_profile:
                 await callback.answer("❌ Анкета не найдена", show_alert=True)
@@ -84,17 +84,17 @@ def setup_match_handlers(router: Router, db: Database):
 
             profile_text = (
                 "💕 Взаимный лайк!\n\n"
-                f"Имя: {match_profile['name']}\n"
-                f"Возраст: {match_profile['age']}\n"
-                f"Пол: {match_profile['gender'].capitalize()}\n"
-                f"Факультет: {match_profile['faculty']}\n"
-                f"Курс: {match_profile['course']}\n"
-                f"О себе: {match_profile['bio']}"
+                f"Имя: {match_profile.name}\n"
+                f"Возраст: {match_profile.age}\n"
+                f"Пол: {match_profile.gender_label.capitalize()}\n"
+                f"Факультет: {match_profile.faculty}\n"
+                f"Курс: {match_profile.course}\n"
+                f"О себе: {match_profile.bio}"
             )
 
-            if match_profile.get("photo_id"):
+            if match_profile.photo_id:
                 await callback.message.answer_photo(
-                    photo=match_profile["photo_id"],
+                    photo=match_profile.photo_id,
                     caption=profile_text,
                     reply_markup=get_match_keyboard(match_user_id),
                 )
@@ -4,8 +4,15 @@ from aiogram import F, Router, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message
-from database import Database
-from key_boards.main_menu import get_gender_keyboard, get_main_keyboard, get_cancel_keyboard, get_edit_profile_keyboard
+from async_database import AsyncDatabase
+from database import GENDER_LABELS, normalize_gender
+from key_boards.main_menu import (
+    get_cancel_keyboard,
+    get_edit_profile_keyboard,
+    get_gender_keyboard,
+    get_main_keyboard,
+)
+from services.services import CandidateQueue
 
 logger = logging.getLogger(__name__)
 
@@ -20,24 +27,46 @@ class ProfileStates(StatesGroup):
     photo = State()
 
 
-def setup_profile_handlers(router: Router, db: Database):
+class EditProfileStates(StatesGroup):
+    """Правка одного поля готовой анкеты (отдельно от ее создания)"""
+
+    name = State()
+    age = State()
+    gender = State()
+    faculty = State()
+    course = State()
+    bio = State()
+    photo = State()
+
+
+def setup_profile_handlers(
+    router: Router, db: AsyncDatabase, candidates: CandidateQueue
+):
     """Регистрирует обработчики для работы с профилями"""
 
     @router.message(F.text == "Создать анкету")
     async def create_profile(message: Message, state: FSMContext):
-        await message.answer("📝 Давай создадим твою анкету. Как тебя зовут?", reply_markup=get_cancel_keyboard())
+        await message.answer(
+            "📝 Давай создадим твою анкету. Как тебя зовут?",
+            reply_markup=get_cancel_keyboard(),
+        )
         await state.set_state(ProfileStates.name)
 
     @router.message(F.text == "Отмена")
     async def cancel_profile_creation(message: Message, state: FSMContext):
         """Отмена создания анкеты"""
         await state.clear()
-        await message.answer("❌ Создание анкеты отменено.", reply_markup=get_main_keyboard())
+        await message.answer(
+            "❌ Создание анкеты отменено.", reply_markup=get_main_keyboard()
+        )
 
     @router.message(ProfileStates.name)
     async def process_name(message: Message, state: FSMContext):
         if len(message.text.strip()) < 2:
-            await message.answer("⚠️ Имя должно содержать минимум 2 символа", reply_markup=get_cancel_keyboard())
+            await message.answer(
+                "⚠️ Имя должно содержать минимум 2 символа",
+                reply_markup=get_cancel_keyboard(),
+            )
             return
         await state.update_data(name=message.text.strip())
         await message.answer("🔢 Сколько тебе лет?", reply_markup=get_cancel_keyboard())
@@ -47,7 +76,8 @@ def setup_profile_handlers(router: Router, db: Database):
     async def process_age(message: Message, state: FSMContext):
         if not message.text.isdigit() or not (16 <= int(message.text) <= 99):
             await message.answer(
-                "⚠️ Пожалуйста, введите корректный возраст (число от 16 до 99)", reply_markup=get_cancel_keyboard()
+                "⚠️ Пожалуйста, введите корректный возраст (число от 16 до 99)",
+                reply_markup=get_cancel_keyboard(),
             )
             return
         await state.update_data(age=int(message.text))
@@ -56,42 +86,54 @@ def setup_profile_handlers(router: Router, db: Database):
 
     @router.message(ProfileStates.gender)
     async def process_gender(message: Message, state: FSMContext):
-        gender = message.text.strip().lower()
-        if gender not in ["мужской", "женский"]:
+        try:
+            gender = GENDER_LABELS[normalize_gender(message.text)]
+        except ValueError:
             await message.answer("⚠️ Пожалуйста, выберите пол с клавиатуры!")
             return
         await state.update_data(gender=gender)
-        logger.info(f"Пол выбран: {gender}, убираем клавиатуру")
-        await message.answer("🧑‍🎓 Укажи свой факультет", reply_markup=types.ReplyKeyboardRemove())
+        logger.info("Пол выбран: %s, убираем клавиатуру", gender)
+        await message.answer(
+            "🧑‍🎓 Укажи свой факультет", reply_markup=types.ReplyKeyboardRemove()
+        )
         await state.set_state(ProfileStates.faculty)
 
     @router.message(ProfileStates.faculty)
     async def process_faculty(message: Message, state: FSMContext):
         if len(message.text.strip()) < 3:
             await message.answer(
-                "⚠️ Название факультета должно содержать минимум 3 символа", reply_markup=get_cancel_keyboard()
+                "⚠️ Название факультета должно содержать минимум 3 символа",
+                reply_markup=get_cancel_keyboard(),
             )
             return
         await state.update_data(faculty=message.text.strip())
-        await message.answer("🎓 На каком ты курсе? (Введи число от 1 до 7)", reply_markup=get_cancel_keyboard())
+        await message.answer(
+            "🎓 На каком ты курсе? (Введи число от 1 до 7)",
+            reply_markup=get_cancel_keyboard(),
+        )
         await state.set_state(ProfileStates.course)
 
     @router.message(ProfileStates.course)
     async def process_course(message: Message, state: FSMContext):
         if not message.text.isdigit() or not (1 <= int(message.text) <= 7):
             await message.answer(
-                "⚠️ Пожалуйста, введите корректный курс (число от 1 до 7)", reply_markup=get_cancel_keyboard()
+                "⚠️ Пожалуйста, введите корректный курс (число от 1 до 7)",
+                reply_markup=get_cancel_keyboard(),
             )
             return
         await state.update_data(course=int(message.text))
-        await message.answer("📖 Расскажи немного о себе (минимум 10 символов)", reply_markup=get_cancel_keyboard())
+        await message.answer(
+            "📖 Расскажи немного о себе (минимум 10 символов)",
+            reply_markup=get_cancel_keyboard(),
+        )
         await state.set_state(ProfileStates.bio)
 
     @router.message(ProfileStates.bio)
     async def process_bio(message: Message, state: FSMContext):
         if len(message.text.strip()) < 10:
             await message.answer(
-                "⚠️ Рассказ о себе должен содержать минимум 10 символов", reply_markup=get_cancel_keyboard()
+                "⚠️ Рассказ о себе должен содержать минимум 10 символов",
+                reply_markup=get_cancel_keyboard(),
             )
             return
         await state.update_data(bio=message.text.strip())
@@ -101,14 +143,17 @@ def setup_profile_handlers(router: Router, db: Database):
     @router.message(ProfileStates.photo)
     async def process_photo(message: Message, state: FSMContext):
         if not message.photo:
-            await message.answer("⚠️ Пожалуйста, отправьте фото", reply_markup=get_cancel_keyboard())
+            await message.answer(
+                "⚠️ Пожалуйста, отправьте фото", reply_markup=get_cancel_keyboard()
+            )
             return
 
         data = await state.get_data()
         photo_id = message.photo[-1].file_id
 
         try:
-            db.save_profile(message.from_user.id, {**data, "photo_id": photo_id})
+            await db.save_profile(message.from_user.id, {**data, "photo_id": photo_id})
+            candidates.invalidate(message.from_user.id)
             profile_text = (
                 "🎉 Твоя анкета создана!\n\n"
                 f"Имя: {data['name']}\n"
@@ -129,23 +174,27 @@ def setup_profile_handlers(router: Router, db: Database):
 
     @router.message(F.text == "Моя анкета")
     async def show_my_profile(message: Message):
-        profile = db.get_profile(message.from_user.id)
+        profile = await db.get_profile(message.from_user.id)
         if not profile:
             await message.answer("❌ У тебя еще нет анкеты. Создай ее!")
             return
 
         profile_text = (
             "👤 Твоя анкета:\n\n"
-            f"Имя: {profile['name']}\n"
-            f"Возраст: {profile['age']}\n"
-            f"Пол: {profile['gender'].capitalize()}\n"
-            f"Факультет: {profile['faculty']}\n"
-            f"Курс: {profile['course']}\n"
-            f"О себе: {profile['bio']}"
+            f"Имя: {profile.name}\n"
+            f"Возраст: {profile.age}\n"
+            f"Пол: {profile.gender_label.capitalize()}\n"
+            f"Факультет: {profile.faculty}\n"
+            f"Курс: {profile.course}\n"
+            f"О себе: {profile.bio}"
         )
 
-        if profile.get("photo_id"):
-            await message.answer_photo(photo=profile["photo_id"], caption=profile_text, reply_markup=get_edit_profile_keyboard())
+        if profile.photo_id:
+            await message.answer_photo(
+                photo=profile.photo_id,
+                caption=profile_text,
+                reply_markup=get_edit_profile_keyboard(),
+            )
         else:
             await message.answer(profile_text, reply_markup=get_edit_profile_keyboard())
 
@@ -163,64 +212,101 @@ def setup_profile_handlers(router: Router, db: Database):
             "photo": "Пришлите новое фото:",
         }
         if field == "gender":
-            await callback.message.answer(prompts[field], reply_markup=get_gender_keyboard())
+            await callback.message.answer(
+                prompts[field], reply_markup=get_gender_keyboard()
+            )
         elif field == "photo":
             await callback.message.answer(prompts[field])
         else:
-            await callback.message.answer(prompts[field], reply_markup=get_cancel_keyboard())
-        await state.set_state(ProfileStates.__getattribute__(ProfileStates, field))
+            await callback.message.answer(
+                prompts[field], reply_markup=get_cancel_keyboard()
+            )
+        await state.set_state(getattr(EditProfileStates, field))
         await callback.answer()
 
-    @router.message(ProfileStates.name)
-    async def edit_name(message: Message, state: FSMContext):
-        db.save_profile(message.from_user.id, {**db.get_profile(message.from_user.id), "name": message.text})
+    async def save_field(
+        message: Message, state: FSMContext, changes: dict, done_text: str
+    ):
+        """Сохраняет измененные поля анкеты поверх текущих значений"""
+        user_id = message.from_user.id
+        profile = await db.get_profile(user_id)
+        if profile is None:
+            # Анкету удалили, пока шла правка
+            await state.clear()
+            await message.answer(
+                "❌ У тебя еще нет анкеты. Создай ее!", reply_markup=get_main_keyboard()
+            )
+            return
+        profile = profile._asdict()
+        try:
+            await db.save_profile(user_id, {**profile, **changes})
+        except ValueError:
+            # Пол старой анкеты не распознан миграцией - без него анкету не сохранить
+            logger.warning(
+                "Нераспознанный пол в анкете %s: %r", user_id, profile["gender"]
+            )
+            await state.update_data(pending_changes=changes)
+            await state.set_state(EditProfileStates.gender)
+            await message.answer(
+                "⚠️ Пол в анкете указан в старом формате. Выберите его заново:",
+                reply_markup=get_gender_keyboard(),
+            )
+            return
+        candidates.invalidate(user_id)
         await state.clear()
-        await message.answer("Имя обновлено!", reply_markup=get_main_keyboard())
+        await message.answer(done_text, reply_markup=get_main_keyboard())
 
-    @router.message(ProfileStates.age)
+    @router.message(EditProfileStates.name)
+    async def edit_name(message: Message, state: FSMContext):
+        await save_field(message, state, {"name": message.text}, "Имя обновлено!")
+
+    @router.message(EditProfileStates.age)
     async def edit_age(message: Message, state: FSMContext):
-        db.save_profile(message.from_user.id, {**db.get_profile(message.from_user.id), "age": int(message.text)})
-        await state.clear()
-        await message.answer("Возраст обновлен!", reply_markup=get_main_keyboard())
+        await save_field(
+            message, state, {"age": int(message.text)}, "Возраст обновлен!"
+        )
 
-    @router.message(ProfileStates.gender)
+    @router.message(EditProfileStates.gender)
     async def edit_gender(message: Message, state: FSMContext):
-        db.save_profile(message.from_user.id, {**db.get_profile(message.from_user.id), "gender": message.text.lower()})
-        await state.clear()
-        await message.answer("Пол обновлен!", reply_markup=get_main_keyboard())
+        try:
+            gender = normalize_gender(message.text)
+        except ValueError:
+            await message.answer("⚠️ Пожалуйста, выберите пол с клавиатуры!")
+            return
+        # Правка, отложенная до выбора пола, сохраняется вместе с ним
+        pending = (await state.get_data()).get("pending_changes", {})
+        await save_field(message, state, {**pending, "gender": gender}, "Пол обновлен!")
 
-    @router.message(ProfileStates.faculty)
+    @router.message(EditProfileStates.faculty)
     async def edit_faculty(message: Message, state: FSMContext):
-        db.save_profile(message.from_user.id, {**db.get_profile(message.from_user.id), "faculty": message.text})
-        await state.clear()
-        await message.answer("Факультет обновлен!", reply_markup=get_main_keyboard())
+        await save_field(
+            message, state, {"faculty": message.text}, "Факультет обновлен!"
+        )
 
-    @router.message(ProfileStates.course)
+    @router.message(EditProfileStates.course)
     async def edit_course(message: Message, state: FSMContext):
-        db.save_profile(message.from_user.id, {**db.get_profile(message.from_user.id), "course": int(message.text)})
-        await state.clear()
-        await message.answer("Курс обновлен!", reply_markup=get_main_keyboard())
+        await save_field(
+            message, state, {"course": int(message.text)}, "Курс обновлен!"
+        )
 
-    @router.message(ProfileStates.bio)
+    @router.message(EditProfileStates.bio)
     async def edit_bio(message: Message, state: FSMContext):
-        db.save_profile(message.from_user.id, {**db.get_profile(message.from_user.id), "bio": message.text})
-        await state.clear()
-        await message.answer("Описание обновлено!", reply_markup=get_main_keyboard())
+        await save_field(message, state, {"bio": message.text}, "Описание обновлено!")
 
-    @router.message(ProfileStates.photo)
+    @router.message(EditProfileStates.photo)
     async def edit_photo(message: Message, state: FSMContext):
         if not message.photo:
             await message.answer("Пожалуйста, отправьте фото.")
             return
-        photo_id = message.photo[-1].file_id
-        db.save_profile(message.from_user.id, {**db.get_profile(message.from_user.id), "photo_id": photo_id})
-        await state.clear()
-        await message.answer("Фото обновлено!", reply_markup=get_main_keyboard())
+        await save_field(
+            message, state, {"photo_id": message.photo[-1].file_id}, "Фото обновлено!"
+        )
 
     @router.message(F.text == "Удалить анкету")
     async def delete_profile(message: Message):
         try:
-            db.delete_profile(message.from_user.id)
+            await db.delete_profile(message.from_user.id)
+            candidates.invalidate(message.from_user.id)
             await message.answer(
                 "❌ Ваша анкета удалена. Вы можете создать новую в любой момент.",
                 reply_markup=get_main_keyboard(),
@@ -232,7 +318,8 @@ def setup_profile_handlers(router: Router, db: Database):
     @router.message(F.text == "Отключить анкету")
     async def disable_profile(message: Message):
         try:
-            db.set_profile_active(message.from_user.id, False)
+            await db.set_profile_active(message.from_user.id, False)
+            candidates.invalidate(message.from_user.id)
             await message.answer(
                 "⏸️ Ваша анкета временно скрыта и не будет показываться другим.",
                 reply_markup=get_main_keyboard(),
@@ -244,7 +331,8 @@ def setup_profile_handlers(router: Router, db: Database):
     @router.message(F.text == "Включить анкету")
     async def enable_profile(message: Message):
         try:
-            db.set_profile_active(message.from_user.id, True)
+            await db.set_profile_active(message.from_user.id, True)
+            candidates.invalidate(message.from_user.id)
             await message.answer(
                 "✅ Ваша анкета снова видна другим пользователям!",
                 reply_markup=get_main_keyboard(),
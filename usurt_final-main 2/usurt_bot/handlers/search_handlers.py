@@ -1,27 +1,326 @@
 import logging
+import re
+from typing import Optional, Tuple
 
 from aiogram import F, Router
-from aiogram.types import CallbackQuery, Message
-from database import Database
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+from async_database import AsyncDatabase
+from database import GENDER_LABELS, Profile, SearchCriteria, fts_query
 from key_boards.main_menu import (
+    get_criteria_keyboard,
+    get_found_profile_keyboard,
     get_profile_keyboard,
     get_search_keyboard,
+    get_text_search_keyboard,
     send_like_notification,
     send_match_notification,
 )
+from services.cache import TTLCache
+from services.notifications import NotificationQueue
+from services.services import SAVED_CRITERIA, CandidateQueue
 
 logger = logging.getLogger(__name__)
 
+# Кнопка поиска -> короткий код фильтра, который передается в callback_data
+SEARCH_FILTERS = {
+    "Только женщины": "f",
+    "Только мужчины": "m",
+    "Все анкеты": "all",
+    "По моим критериям": SAVED_CRITERIA,
+}
+# Кнопки шага "пол" в настройке критериев -> код пола
+CRITERIA_GENDERS = {"Женщины": "f", "Мужчины": "m"}
+ANY = "Неважно"
+# Анкет на одной странице поиска по словам
+TEXT_SEARCH_PAGE = 5
+_AGE_RANGE = re.compile(r"^(\d{2})\s*(?:-\s*(\d{2}))?$")
 
-def setup_search_handlers(router: Router, db: Database):
+
+class SearchStates(StatesGroup):
+    gender = State()
+    faculty = State()
+    courses = State()
+    age = State()
+    keywords = State()
+
+
+def parse_courses(text: str) -> Tuple[int, ...]:
+    """ "1, 2" -> (1, 2); ValueError, если это не номера курсов 1-6"""
+    courses = tuple(int(part) for part in re.split(r"[\s,]+", text.strip()) if part)
+    if not courses or not all(1 <= course <= 6 for course in courses):
+        raise ValueError(f"Некорректные курсы: {text}")
+    return courses
+
+
+def parse_age_range(text: str) -> Tuple[int, int]:
+    """ "18-22" -> (18, 22), "20" -> (20, 20); ValueError при ошибке"""
+    match = _AGE_RANGE.match(text.strip())
+    if not match:
+        raise ValueError(f"Некорректный возраст: {text}")
+    age_min = int(match.group(1))
+    age_max = int(match.group(2) or age_min)
+    if not 16 <= age_min <= age_max <= 99:
+        raise ValueError(f"Некорректный возраст: {text}")
+    return age_min, age_max
+
+
+def describe_criteria(criteria: SearchCriteria) -> str:
+    gender = GENDER_LABELS[criteria.gender].capitalize() if criteria.gender else ANY
+    courses = ", ".join(map(str, criteria.courses)) or ANY
+    if criteria.age_min is None and criteria.age_max is None:
+        age = ANY
+    elif criteria.age_min == criteria.age_max:
+        age = str(criteria.age_min)
+    else:
+        age = f"{criteria.age_min or ''}-{criteria.age_max or ''}"
+    return (
+        f"Пол: {gender}\n"
+        f"Факультет: {criteria.faculty or ANY}\n"
+        f"Курс: {courses}\n"
+        f"Возраст: {age}"
+    )
+
+
+async def has_profile(db: AsyncDatabase, user_id: int) -> bool:
+    return await db.get_profile(user_id) is not None
+
+
+async def show_profile(
+    message: Message, profile: Profile, keyboard: InlineKeyboardMarkup
+):
+    """Показывает анкету пользователю"""
+    profile_text = (
+        "👀 Найдена анкета:\n\n"
+        f"Имя: {profile.name}\n"
+        f"Возраст: {profile.age}\n"
+        f"Пол: {profile.gender_label.capitalize()}\n"
+        f"Факультет: {profile.faculty}\n"
+        f"Курс: {profile.course}\n"
+        f"О себе: {profile.bio}"
+    )
+    try:
+        if profile.photo_id:
+            await message.answer_photo(
+                photo=profile.photo_id,
+                caption=profile_text,
+                reply_markup=keyboard,
+            )
+        else:
+            await message.answer(profile_text, reply_markup=keyboard)
+    except Exception as e:
+        logger.error(f"Ошибка при показе анкеты: {e}")
+        await message.answer("❌ Ошибка при показе анкеты.")
+
+
+def setup_criteria_handlers(
+    router: Router, db: AsyncDatabase, candidates: CandidateQueue
+):
+    """Регистрирует шаги настройки сохраненных критериев поиска"""
+
+    # Список факультетов - группировка по всем анкетам, пересчитываем не чаще раза в 5 минут
+    faculties_cache = TTLCache(max_size=1, ttl=300.0)
+
+    async def get_faculties() -> list[str]:
+        faculties = faculties_cache.get("faculties")
+        if faculties is None:
+            faculties = await db.get_faculties()
+            faculties_cache.set("faculties", faculties)
+        return faculties
+
+    @router.message(F.text == "Настроить критерии")
+    async def setup_criteria(message: Message, state: FSMContext):
+        await message.answer(
+            "🚻 Кого показывать?",
+            reply_markup=get_criteria_keyboard(list(CRITERIA_GENDERS)),
+        )
+        await state.set_state(SearchStates.gender)
+
+    @router.message(SearchStates.gender)
+    async def process_criteria_gender(message: Message, state: FSMContext):
+        if message.text != ANY and message.text not in CRITERIA_GENDERS:
+            await message.answer("⚠️ Пожалуйста, выберите вариант с клавиатуры!")
+            return
+        await state.update_data(gender=CRITERIA_GENDERS.get(message.text))
+        try:
+            faculties = await get_faculties()
+        except Exception as e:
+            logger.error(f"Ошибка при получении списка факультетов: {e}")
+            faculties = []
+        await message.answer(
+            "🧑‍🎓 Выберите факультет или напишите его название:",
+            reply_markup=get_criteria_keyboard(faculties),
+        )
+        await state.set_state(SearchStates.faculty)
+
+    @router.message(SearchStates.faculty)
+    async def process_criteria_faculty(message: Message, state: FSMContext):
+        if not message.text:
+            await message.answer("⚠️ Напишите название факультета")
+            return
+        await state.update_data(faculty=None if message.text == ANY else message.text)
+        await message.answer(
+            "🎓 Какие курсы? Например: 1, 2",
+            reply_markup=get_criteria_keyboard([]),
+        )
+        await state.set_state(SearchStates.courses)
+
+    @router.message(SearchStates.courses)
+    async def process_criteria_courses(message: Message, state: FSMContext):
+        courses: Tuple[int, ...] = ()
+        if message.text != ANY:
+            try:
+                courses = parse_courses(message.text or "")
+            except ValueError:
+                await message.answer(
+                    "⚠️ Укажите номера курсов от 1 до 6, например: 1, 2"
+                )
+                return
+        await state.update_data(courses=courses)
+        await message.answer(
+            "🔢 Возраст? Например: 18-22 или 20",
+            reply_markup=get_criteria_keyboard([]),
+        )
+        await state.set_state(SearchStates.age)
+
+    @router.message(SearchStates.age)
+    async def process_criteria_age(message: Message, state: FSMContext):
+        age_min: Optional[int] = None
+        age_max: Optional[int] = None
+        if message.text != ANY:
+            try:
+                age_min, age_max = parse_age_range(message.text or "")
+            except ValueError:
+                await message.answer("⚠️ Укажите возраст от 16 до 99, например: 18-22")
+                return
+        data = await state.get_data()
+        await state.clear()
+        try:
+            criteria = SearchCriteria(
+                gender=data["gender"],
+                faculty=data["faculty"],
+                courses=tuple(data["courses"]),
+                age_min=age_min,
+                age_max=age_max,
+            )
+            await db.save_search_criteria(message.from_user.id, criteria)
+            candidates.reset(message.from_user.id, SAVED_CRITERIA)
+            await message.answer(
+                f"✅ Критерии сохранены:\n\n{describe_criteria(criteria)}",
+                reply_markup=get_search_keyboard(),
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении критериев поиска: {e}")
+            await message.answer("❌ Ошибка при сохранении критериев.")
+
+
+def setup_keyword_search_handlers(router: Router, db: AsyncDatabase):
+    """Регистрирует поиск анкет по словам и листание его результатов"""
+
+    @router.message(F.text == "Поиск по интересам")
+    async def ask_keywords(message: Message, state: FSMContext):
+        if not await has_profile(db, message.from_user.id):
+            await message.answer(
+                "❗️ Сначала создай свою анкету, чтобы просматривать других."
+            )
+            return
+        await message.answer(
+            "✍️ Напишите, кого ищете: увлечения, факультет или имя.\n"
+            "Например: гитара походы"
+        )
+        await state.set_state(SearchStates.keywords)
+
+    @router.message(SearchStates.keywords)
+    async def process_keywords(message: Message, state: FSMContext):
+        text = message.text or ""
+        if fts_query(text) is None:
+            await message.answer("⚠️ Напишите хотя бы одно слово")
+            return
+        # Запрос нужен для следующих страниц - выходим из состояния, но данные храним
+        await state.set_state(None)
+        await state.update_data(text_query=text)
+        await show_text_results(message, message.from_user.id, text, 0)
+
+    async def show_text_results(
+        message: Message, viewer_id: int, text: str, offset: int
+    ):
+        """Страница результатов поиска по словам, начиная с позиции offset"""
+        try:
+            # Одна лишняя анкета показывает, есть ли следующая страница
+            profiles = await db.search_profiles(
+                viewer_id, text, offset, TEXT_SEARCH_PAGE + 1
+            )
+            if not profiles:
+                await message.answer(
+                    "🤷‍♂️ Больше анкет нет."
+                    if offset
+                    else "😔 Никого не нашли. Попробуй другие слова!"
+                )
+                return
+            next_offset = None
+            if len(profiles) > TEXT_SEARCH_PAGE:
+                next_offset = offset + TEXT_SEARCH_PAGE
+            profiles = profiles[:TEXT_SEARCH_PAGE]
+            lines = [
+                f"{offset + i}. {p.name}, {p.age} - {p.faculty}\n{p.bio[:80]}"
+                for i, p in enumerate(profiles, 1)
+            ]
+            await message.answer(
+                f"🔎 Найдено по запросу «{text}»:\n\n" + "\n\n".join(lines),
+                reply_markup=get_text_search_keyboard(profiles, next_offset),
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при поиске по словам: {e}")
+            await message.answer("❌ Ошибка при поиске анкет.")
+
+    @router.callback_query(F.data.startswith("textpage_"))
+    async def next_text_page(callback: CallbackQuery, state: FSMContext):
+        text = (await state.get_data()).get("text_query")
+        if not text:
+            await callback.answer("Поиск устарел, начни его заново.", show_alert=True)
+            return
+        offset = int(callback.data.split("_")[1])
+        await show_text_results(callback.message, callback.from_user.id, text, offset)
+        await callback.answer()
+
+    @router.callback_query(F.data.startswith("found_"))
+    async def show_found_profile(callback: CallbackQuery):
+        profile = await db.get_profile(int(callback.data.split("_")[1]))
+        if profile is None:
+            await callback.answer("❌ Анкета не найдена", show_alert=True)
+            return
+        await show_profile(
+            callback.message, profile, get_found_profile_keyboard(profile.user_id)
+        )
+        await callback.answer()
+
+
+def setup_search_handlers(
+    router: Router,
+    db: AsyncDatabase,
+    candidates: CandidateQueue,
+    notifications: NotificationQueue,
+):
     """Регистрирует обработчики для поиска и просмотра анкет"""
 
-    def has_profile(user_id: int) -> bool:
-        return db.get_profile(user_id) is not None
+    async def next_candidate(
+        viewer_id: int, search_filter: str, cursor: int = 0
+    ) -> Profile | None:
+        """Берет следующую анкету из очереди кандидатов пользователя"""
+        while True:
+            candidate_id = await candidates.pop(viewer_id, search_filter, cursor)
+            if candidate_id is None:
+                return None
+            profile = await db.get_profile(candidate_id)
+            # Анкету могли удалить, пока она ждала в очереди
+            if profile is not None:
+                return profile
+            cursor = candidate_id
 
     @router.message(F.text == "Найти анкеты")
     async def find_profiles(message: Message):
-        if not has_profile(message.from_user.id):
+        if not await has_profile(db, message.from_user.id):
             await message.answer(
                 "❗️ Сначала создай свою анкету, чтобы просматривать других."
             )
@@ -30,85 +329,64 @@ def setup_search_handlers(router: Router, db: Database):
             "🔍 Выберите критерии поиска:", reply_markup=get_search_keyboard()
         )
 
-    @router.message(F.text.in_(["Только женщины", "Только мужчины", "Все анкеты"]))
+    # Шаги критериев ловят любой текст - регистрируем их раньше кнопок фильтров
+    setup_criteria_handlers(router, db, candidates)
+
+    @router.message(F.text.in_(SEARCH_FILTERS))
     async def search_profiles(message: Message):
-        if not has_profile(message.from_user.id):
+        if not await has_profile(db, message.from_user.id):
             await message.answer(
                 "❗️ Сначала создай свою анкету, чтобы просматривать других."
             )
             return
 
         try:
-            if message.text == "Только женщины":
-                profiles = db.get_profiles_by_gender(message.from_user.id, "женский")
-            elif message.text == "Только мужчины":
-                profiles = db.get_profiles_by_gender(message.from_user.id, "мужской")
-            else:
-                profiles = db.get_all_profiles(message.from_user.id)
+            search_filter = SEARCH_FILTERS[message.text]
+            if (
+                search_filter == SAVED_CRITERIA
+                and await db.get_search_criteria(message.from_user.id) is None
+            ):
+                await message.answer(
+                    "⚙️ Сначала настройте критерии поиска.",
+                    reply_markup=get_search_keyboard(),
+                )
+                return
+            candidates.reset(message.from_user.id, search_filter)
+            profile = await next_candidate(message.from_user.id, search_filter)
 
-            if not profiles:
+            if profile is None:
                 await message.answer("😔 Нет подходящих анкет. Попробуй позже!")
                 return
 
-            await show_profile(message, profiles, 0)
+            await show_profile(
+                message, profile, get_profile_keyboard(profile.user_id, search_filter)
+            )
         except Exception as e:
             logger.error(f"Ошибка при поиске анкет: {e}")
             await message.answer("❌ Ошибка при поиске анкет.")
 
-    async def show_profile(message: Message, profiles: list, index: int):
-        """Показывает анкету пользователю"""
-        if index >= len(profiles):
-            await message.answer("🤷‍♂️ Анкеты закончились. Попробуй позже!")
-            return
-
-        profile = profiles[index]
-        profile_text = (
-            "👀 Найдена анкета:\n\n"
-            f"Имя: {profile['name']}\n"
-            f"Возраст: {profile['age']}\n"
-            f"Пол: {profile['gender'].capitalize()}\n"
-            f"Факультет: {profile['faculty']}\n"
-            f"Курс: {profile['course']}\n"
-            f"О себе: {profile['bio']}"
-        )
-
-        try:
-            if profile.get("photo_id"):
-                await message.answer_photo(
-                    photo=profile["photo_id"],
-                    caption=profile_text,
-                    reply_markup=get_profile_keyboard(profile["user_id"], index),
-                )
-            else:
-                await message.answer(
-                    profile_text,
-                    reply_markup=get_profile_keyboard(profile["user_id"], index),
-                )
-        except Exception as e:
-            logger.error(f"Ошибка при показе анкеты: {e}")
-            await message.answer("❌ Ошибка при показе анкеты.")
-
     @router.callback_query(F.data.startswith("like_"))
     async def process_like(callback: CallbackQuery):
         try:
-            target_user_id = int(callback.data.split('_')[1])
+            target_user_id = int(callback.data.split("_")[1])
             from_user_id = callback.from_user.id
             # Проверяем, не лайкает ли пользователь сам себя
             if from_user_id == target_user_id:
                 await callback.answer("🤔 Нельзя лайкнуть самого себя!", show_alert=True)
                 return
-            db.add_like(from_user_id, target_user_id)
-            # Проверяем, есть ли взаимный лайк
-            likes_back = False
-            cursor = db.conn.cursor()
-            cursor.execute('SELECT 1 FROM likes WHERE from_user_id = ? AND to_user_id = ?', (target_user_id, from_user_id))
-            if cursor.fetchone():
-                likes_back = True
+            # Лайк и проверка взаимности - одна транзакция, матч сохраняется сразу
+            likes_back = await db.like(from_user_id, target_user_id)
+            await candidates.record_view(from_user_id, target_user_id, "like")
             if likes_back:
-                await send_match_notification(callback.bot, from_user_id, target_user_id)
+                # Уведомления только ставятся в очередь - ответ на лайк не ждет Bot API
+                await send_match_notification(
+                    notifications, db, from_user_id, target_user_id
+                )
                 await callback.answer("🎉 У вас новый матч!", show_alert=True)
             else:
-                await send_like_notification(callback.bot, from_user_id, target_user_id)
+                await send_like_notification(
+                    notifications, db, from_user_id, target_user_id
+                )
                 await callback.answer("💖 Твой лайк отправлен!", show_alert=True)
         except Exception as e:
             logger.error(f"Ошибка при обработке лайка: {e}")
@@ -118,16 +396,26 @@ def setup_search_handlers(router: Router, db: Database):
     async def next_profile(callback: CallbackQuery):
         try:
             await callback.message.delete()
-            index = int(callback.data.split("_")[1])
+            # Формат: next_<фильтр>_<user_id последней показанной анкеты>
+            _, search_filter, cursor = callback.data.split("_")
+            # Показанная анкета пропущена - больше ее не предлагаем
+            await candidates.record_view(callback.from_user.id, int(cursor), "skip")
 
-            # Получаем все активные анкеты (можно доработать для сохранения фильтра)
-            profiles = db.get_all_profiles(callback.from_user.id)
+            profile = await next_candidate(
+                callback.from_user.id, search_filter, int(cursor)
+            )
 
-            if index >= len(profiles):
-                await callback.message.answer("🤷‍♂️ Анкеты закончились. Попробуй позже!")
+            if profile is None:
+                await callback.message.answer(
+                    "🤷‍♂️ Анкеты закончились. Попробуй позже!"
+                )
                 return
 
-            await show_profile(callback.message, profiles, index)
+            await show_profile(
+                callback.message,
+                profile,
+                get_profile_keyboard(profile.user_id, search_filter),
+            )
         except Exception as e:
             logger.error(f"Ошибка при переходе к следующей анкете: {e}")
             await callback.answer(
@@ -137,17 +425,26 @@ def setup_search_handlers(router: Router, db: Database):
     @router.callback_query(F.data.startswith("complain_"))
     async def process_complaint(callback: CallbackQuery):
         from_user_id = callback.from_user.id
-        to_user_id = int(callback.data.split('_')[1])
+        to_user_id = int(callback.data.split("_")[1])
         if from_user_id == to_user_id:
             await callback.answer("Вы не можете пожаловаться на себя!", show_alert=True)
             return
         # Можно добавить запрос причины жалобы, пока фиксируем без причины
-        db.add_complaint(from_user_id, to_user_id)
-        complaints_count = db.get_complaints_count(to_user_id)
+        await db.add_complaint(from_user_id, to_user_id)
+        await candidates.record_view(from_user_id, to_user_id, "complain")
+        complaints_count = await db.get_complaints_count(to_user_id)
         # Лимит жалоб для блокировки
         COMPLAINTS_LIMIT = 3
         if complaints_count >= COMPLAINTS_LIMIT:
-            db.block_user(to_user_id)
-            await callback.answer("Пользователь заблокирован после нескольких жалоб.", show_alert=True)
+            await db.block_user(to_user_id)
+            candidates.invalidate(to_user_id)
+            await callback.answer(
+                "Пользователь заблокирован после нескольких жалоб.", show_alert=True
+            )
         else:
-            await callback.answer(f"Жалоба отправлена. Жалоб на пользователя: {complaints_count}", show_alert=True)
+            await callback.answer(
+                f"Жалоба отправлена. Жалоб на пользователя: {complaints_count}",
+                show_alert=True,
+            )
+
+    setup_keyword_search_handlers(router, db)
@@ -10,9 +10,8 @@ from aiogram.types import (
     ReplyKeyboardMarkup,
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
-from database import Database
-
-db = Database()
+from async_database import AsyncDatabase
+from services.notifications import NotificationQueue
 
 
 async def set_main_menu(bot: Bot):
@@ -39,7 +38,11 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
 
 def get_gender_keyboard() -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
-    builder.add(KeyboardButton(text="Мужской"), KeyboardButton(text="Женский"), KeyboardButton(text="Отмена"))
+    builder.add(
+        KeyboardButton(text="Мужской"),
+        KeyboardButton(text="Женский"),
+        KeyboardButton(text="Отмена"),
+    )
     builder.adjust(2)
     return builder.as_markup(resize_keyboard=True)
 
@@ -57,85 +60,134 @@ def get_search_keyboard() -> ReplyKeyboardMarkup:
         KeyboardButton(text="Только женщины"),
         KeyboardButton(text="Только мужчины"),
         KeyboardButton(text="Все анкеты"),
+        KeyboardButton(text="По моим критериям"),
+        KeyboardButton(text="Настроить критерии"),
+        KeyboardButton(text="Поиск по интересам"),
     )
     builder.adjust(2)
     return builder.as_markup(resize_keyboard=True)
 
 
-def get_profile_keyboard(profile_user_id: int, index: int) -> InlineKeyboardMarkup:
+def get_criteria_keyboard(options: list[str]) -> ReplyKeyboardMarkup:
+    """Варианты для шага настройки критериев поиска и кнопка «Неважно»"""
+    builder = ReplyKeyboardBuilder()
+    builder.add(*[KeyboardButton(text=option) for option in options])
+    builder.add(KeyboardButton(text="Неважно"))
+    builder.adjust(3)
+    return builder.as_markup(resize_keyboard=True)
+
+
+def get_profile_keyboard(
+    profile_user_id: int, search_filter: str
+) -> InlineKeyboardMarkup:
+    """Клавиатура под анкетой; курсор ленты и фильтр поиска едут в callback_data"""
     builder = InlineKeyboardBuilder()
     builder.row(
+        InlineKeyboardButton(text="❤️ Лайк", callback_data=f"like_{profile_user_id}"),
         InlineKeyboardButton(
-            text="❤️ Лайк",
-            callback_data=f"like_{profile_user_id}"
+            text="➡️ Следующая", callback_data=f"next_{search_filter}_{profile_user_id}"
         ),
+    )
+    builder.row(
         InlineKeyboardButton(
-            text="➡️ Следующая",
-            callback_data=f"next_{index+1}"
+            text="🚫 Пожаловаться", callback_data=f"complain_{profile_user_id}"
         )
     )
+    return builder.as_markup()
+
+
+def get_text_search_keyboard(
+    profiles: list, next_offset: int | None
+) -> InlineKeyboardMarkup:
+    """Найденные по словам анкеты; "Еще" - следующая страница с позиции next_offset"""
+    builder = InlineKeyboardBuilder()
+    for profile in profiles:
+        builder.row(
+            InlineKeyboardButton(
+                text=f"👤 {profile.name}, {profile.age}",
+                callback_data=f"found_{profile.user_id}",
+            )
+        )
+    if next_offset is not None:
+        builder.row(
+            InlineKeyboardButton(text="➡️ Еще", callback_data=f"textpage_{next_offset}")
+        )
+    return builder.as_markup()
+
+
+def get_found_profile_keyboard(profile_user_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура под анкетой из поиска по словам: без перехода по ленте"""
+    builder = InlineKeyboardBuilder()
     builder.row(
+        InlineKeyboardButton(text="❤️ Лайк", callback_data=f"like_{profile_user_id}"),
         InlineKeyboardButton(
-            text="🚫 Пожаловаться",
-            callback_data=f"complain_{profile_user_id}"
-        )
+            text="🚫 Пожаловаться", callback_data=f"complain_{profile_user_id}"
+        ),
     )
     return builder.as_markup()
 
 
-async def send_like_notification(bot: Bot, from_user_id: int, to_user_id: int):
-    """Отправляет уведомление о лайке"""
-    from_profile = db.get_profile(from_user_id)
+async def send_like_notification(
+    notifications: NotificationQueue,
+    db: AsyncDatabase,
+    from_user_id: int,
+    to_user_id: int,
+):
+    """Ставит в очередь уведомление о лайке"""
+    from_profile = await db.get_profile(from_user_id)
     if not from_profile:
         return
 
     try:
-        user_link = f'<a href="tg://user?id={from_user_id}">{from_profile["name"]}</a>'
+        user_link = f'<a href="tg://user?id={from_user_id}">{from_profile.name}</a>'
         caption = (
             f"💌 Тебе поставил(а) лайк {user_link}!\n\n"
-            f"Анкета: {from_profile['name']}\n"
-            f"Факультет: {from_profile['faculty']}\n"
-            f"Курс: {from_profile['course']}\n"
-            f"О себе: {from_profile['bio']}"
+            f"Анкета: {from_profile.name}\n"
+            f"Факультет: {from_profile.faculty}\n"
+            f"Курс: {from_profile.course}\n"
+            f"О себе: {from_profile.bio}"
         )
-        if from_profile.get("photo_id"):
-            await bot.send_photo(
-                chat_id=to_user_id,
-                photo=from_profile["photo_id"],
+        if from_profile.photo_id:
+            notifications.send_photo(
+                to_user_id,
+                from_profile.photo_id,
                 caption=caption,
                 parse_mode=ParseMode.HTML,
             )
         else:
-            await bot.send_message(
-                chat_id=to_user_id, text=caption, parse_mode=ParseMode.HTML
-            )
+            notifications.send_message(to_user_id, caption, parse_mode=ParseMode.HTML)
     except Exception as e:
         logging.error(f"Не удалось отправить уведомление о лайке: {e}")
 
 
-async def send_match_notification(bot: Bot, user1_id: int, user2_id: int):
-    """Уведомляет обоих пользователей о взаимном лайке (матче)"""
-    from_profile = db.get_profile(user1_id)
-    to_profile = db.get_profile(user2_id)
+async def send_match_notification(
+    notifications: NotificationQueue,
+    db: AsyncDatabase,
+    user1_id: int,
+    user2_id: int,
+):
+    """Ставит в очередь уведомления обоим пользователям о взаимном лайке (матче)"""
+    from_profile = await db.get_profile(user1_id)
+    to_profile = await db.get_profile(user2_id)
     if not from_profile or not to_profile:
         return
     try:
         text1 = (
-            f"🎉 У тебя новый матч с {to_profile['name']}!\n\n"
-            f"Факультет: {to_profile['faculty']}\nКурс: {to_profile['course']}\nО себе: {to_profile['bio']}"
+            f"🎉 У тебя новый матч с {to_profile.name}!\n\n"
+            f"Факультет: {to_profile.faculty}\nКурс: {to_profile.course}\nО себе: {to_profile.bio}"
         )
         text2 = (
-            f"🎉 У тебя новый матч с {from_profile['name']}!\n\n"
-            f"Факультет: {from_profile['faculty']}\nКурс: {from_profile['course']}\nО себе: {from_profile['bio']}"
+            f"🎉 У тебя новый матч с {from_profile.name}!\n\n"
+            f"Факультет: {from_profile.faculty}\nКурс: {from_profile.course}\nО себе: {from_profile.bio}"
         )
-        if to_profile.get('photo_id'):
-            await bot.send_photo(user1_id, to_profile['photo_id'], caption=text1)
+        if to_profile.photo_id:
+            notifications.send_photo(user1_id, to_profile.photo_id, caption=text1)
         else:
-            await bot.send_message(user1_id, text1)
-        if from_profile.get('photo_id'):
-            await bot.send_photo(user2_id, from_profile['photo_id'], caption=text2)
+            notifications.send_message(user1_id, text1)
+        if from_profile.photo_id:
+            notifications.send_photo(user2_id, from_profile.photo_id, caption=text2)
         else:
-            await bot.send_message(user2_id, text2)
+            notifications.send_message(user2_id, text2)
     except Exception as e:
         logging.error(f"Не удалось отправить уведомление о матче: {e}")
 
@@ -1,3 +1,13 @@
 from .logging_middleware import LoggingMiddleware
+from .metrics_middleware import (
+    APIMetricsMiddleware,
+    HandlerMetricsMiddleware,
+    MetricsMiddleware,
+)
 
-__all__ = ["LoggingMiddleware"]
+__all__ = [
+    "APIMetricsMiddleware",
+    "HandlerMetricsMiddleware",
+    "LoggingMiddleware",
+    "MetricsMiddleware",
+]
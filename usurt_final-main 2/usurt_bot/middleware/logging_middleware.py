@@ -3,13 +3,13 @@ from typing import Any, Awaitable, Callable, Dict
 
 from aiogram import BaseMiddleware
 from aiogram.types import CallbackQuery, Message
-from database import Database
+from async_database import AsyncDatabase
 
 logger = logging.getLogger(__name__)
 
 
 class LoggingMiddleware(BaseMiddleware):
-    def __init__(self, database: Database):
+    def __init__(self, database: AsyncDatabase):
         self.database = database
         super().__init__()
 
@@ -21,16 +21,21 @@ class LoggingMiddleware(BaseMiddleware):
     ) -> Any:
         # Логируем входящие сообщения
         if isinstance(event, Message):
-            user_id = event.from_user.id
-            username = event.from_user.username
-            text = event.text or "[не текстовое сообщение]"
-
-            logger.info(f"User {user_id} (@{username}) sent: {text}")
+            # Строка собирается в потоке журнала, а не в цикле событий
+            logger.info(
+                "User %s (@%s) sent: %s",
+                event.from_user.id,
+                event.from_user.username,
+                event.text or "[не текстовое сообщение]",
+                extra={"user_id": event.from_user.id, "event": "message"},
+            )
         elif isinstance(event, CallbackQuery):
-            user_id = event.from_user.id
-            username = event.from_user.username
-            callback_data = event.data
-
-            logger.info(f"User {user_id} (@{username}) clicked: {callback_data}")
+            logger.info(
+                "User %s (@%s) clicked: %s",
+                event.from_user.id,
+                event.from_user.username,
+                event.data,
+                extra={"user_id": event.from_user.id, "event": "callback"},
+            )
 
         return await handler(event, data)
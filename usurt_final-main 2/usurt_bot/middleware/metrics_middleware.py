@@ -0,0 +1,81 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+from services.metrics import BotMetrics, current_update_db_time
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Внешняя middleware апдейтов: число, длительность, обрабатываемые сейчас
+    и суммарное время ожидания БД за апдейт"""
+
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+        super().__init__()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        metrics = self.metrics
+        update_type = event.event_type
+        metrics.updates.inc(update_type)
+        metrics.updates_in_flight.inc()
+        db_time = [0.0]
+        token = current_update_db_time.set(db_time)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            metrics.update_latency.observe(time.perf_counter() - started, update_type)
+            metrics.update_db_time.observe(db_time[0])
+            current_update_db_time.reset(token)
+            metrics.updates_in_flight.dec()
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренняя middleware: время и ошибки каждого обработчика"""
+
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+        super().__init__()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.metrics.handler_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            self.metrics.handler_latency.observe(time.perf_counter() - started, name)
+
+
+class APIMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: число, ошибки и время запросов к Bot API"""
+
+    def __init__(self, metrics: BotMetrics):
+        self.metrics = metrics
+
+    async def __call__(self, make_request, bot, method):
+        metrics = self.metrics
+        name = type(method).__name__
+        metrics.api_requests.inc(name)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            metrics.api_errors.inc(name, type(e).__name__)
+            raise
+        finally:
+            metrics.api_latency.observe(time.perf_counter() - started, name)
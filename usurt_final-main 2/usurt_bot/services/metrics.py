@@ -0,0 +1,323 @@
+import bisect
+import math
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence
+
+from aiohttp import web
+
+# Границы гистограмм задержки, секунды
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Суммарное время ожидания БД в текущем апдейте; None вне обработки апдейта.
+# Список из одного числа: его меняют на месте вызовы БД из того же контекста
+current_update_db_time: ContextVar[Optional[List[float]]] = ContextVar(
+    "current_update_db_time", default=None
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _check(self, labels: tuple):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(
+                f"{self.name}: ожидались метки {self.labelnames}, получено {labels}"
+            )
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        values = self._values
+        if labels not in values:
+            self._check(labels)
+            values[labels] = 0
+        values[labels] += amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Текущее значение; может читаться функцией в момент выгрузки"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, *labels: str, amount: float = 1):
+        values = self._values
+        if labels not in values:
+            self._check(labels)
+            values[labels] = 0
+        values[labels] += amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        self._check(labels)
+        self._values[labels] = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Значение без меток вычисляется при каждой выгрузке"""
+        self._function = function
+
+    def value(self, *labels: str) -> float:
+        if self._function is not None and not labels:
+            return self._function()
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_number(self._function())}"]
+        return [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        # Число наблюдений в каждом интервале (не накопленное)
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами.
+
+    observe - поиск интервала делением пополам и три сложения; накопленные
+    значения бакетов считаются только при выгрузке.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, _Series] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            self._check(labels)
+            series = self._series[labels] = _Series(len(self.buckets) + 1)
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series.count if series else 0
+
+    def sum(self, *labels: str) -> float:
+        series = self._series.get(labels)
+        return series.sum if series else 0.0
+
+    def samples(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, series in sorted(self._series.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (math.inf,), series.counts):
+                total += count
+                lines.append(
+                    f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {total}"
+                )
+            label_str = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_number(series.sum)}")
+            lines.append(f"{self.name}_count{label_str} {series.count}")
+        return lines
+
+
+class Registry:
+    """Набор метрик, выгружаемый в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class BotMetrics:
+    """Метрики бота: апдейты, обработчики, БД и запросы к Bot API.
+
+    Запись - обращение к словарю и несколько сложений в цикле событий, без
+    блокировок и выделения памяти на горячем пути, поэтому метрики можно
+    держать включенными в продакшене.
+    """
+
+    def __init__(self, registry: Optional[Registry] = None):
+        self.registry = registry or Registry()
+        r = self.registry
+        self.updates = r.counter("bot_updates_total", "Полученные апдейты", ("type",))
+        self.update_latency = r.histogram(
+            "bot_update_duration_seconds", "Время обработки апдейта", ("type",)
+        )
+        self.updates_in_flight = r.gauge(
+            "bot_updates_in_flight", "Апдейты, обрабатываемые прямо сейчас"
+        )
+        self.handler_latency = r.histogram(
+            "bot_handler_duration_seconds", "Время выполнения обработчика", ("handler",)
+        )
+        self.handler_errors = r.counter(
+            "bot_handler_errors_total",
+            "Исключения в обработчиках",
+            ("handler", "error"),
+        )
+        self.update_db_time = r.histogram(
+            "bot_update_db_seconds", "Суммарное ожидание БД за один апдейт"
+        )
+        self.db_latency = r.histogram(
+            "bot_db_call_duration_seconds", "Время вызова AsyncDatabase", ("method",)
+        )
+        self.api_requests = r.counter(
+            "bot_api_requests_total", "Запросы к Bot API", ("method",)
+        )
+        self.api_errors = r.counter(
+            "bot_api_errors_total", "Неудачные запросы к Bot API", ("method", "error")
+        )
+        self.api_latency = r.histogram(
+            "bot_api_request_duration_seconds", "Время запроса к Bot API", ("method",)
+        )
+        self.notification_queue = r.gauge(
+            "bot_notification_queue_size", "Уведомления, ждущие отправки"
+        )
+
+    def observe_db(self, method: str, seconds: float):
+        """Наблюдатель AsyncDatabase: время вызова и вклад во время апдейта"""
+        self.db_latency.observe(seconds, method)
+        total = current_update_db_time.get()
+        if total is not None:
+            total[0] += seconds
+
+    def render(self) -> str:
+        return self.registry.render()
+
+
+def add_metrics_route(
+    app: web.Application, metrics: BotMetrics, path: str = "/metrics"
+):
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            body=metrics.render().encode(), headers={"Content-Type": CONTENT_TYPE}
+        )
+
+    app.router.add_get(path, handle_metrics)
+
+
+async def start_metrics_server(
+    metrics: BotMetrics, host: str, port: int
+) -> web.AppRunner:
+    """Отдельный HTTP-сервер с /metrics; порт вебхука метрики не отдает"""
+    app = web.Application()
+    add_metrics_route(app, metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Ведро токенов: не больше rate операций в секунду, всплеск до capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "_clock")
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self._clock = clock
+        self.updated = clock()
+
+    def reserve(self) -> float:
+        """Забирает токен и возвращает, сколько секунд нужно подождать до отправки
+
+        Токен резервируется сразу, поэтому конкурентные отправители выстраиваются
+        в очередь, а не просыпаются одновременно.
+        """
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def wait_time(self) -> float:
+        """Через сколько секунд будет свободный токен; токен не забирается"""
+        tokens = min(
+            self.capacity, self.tokens + (self._clock() - self.updated) * self.rate
+        )
+        return max(0.0, (1 - tokens) / self.rate)
+
+
+@dataclass
+class _Outgoing:
+    chat_id: int
+    method: str
+    kwargs: dict[str, Any]
+    # Уже отлежало свое в очереди чата (NotificationQueue._defer)
+    released: bool = False
+
+
+class NotificationQueue:
+    """Очередь исходящих уведомлений с ограничением скорости.
+
+    Обработчики только ставят сообщение в очередь, отправляют его workers
+    фоновых задач. Перед каждой отправкой берется токен из общего ведра
+    (лимит Telegram ~30 сообщений/с на бота) и из ведра чата (~1 сообщение/с).
+    Сообщение в чат, лимит которого исчерпан, откладывается до его времени,
+    не занимая отправителя, - "горячий" чат не тормозит остальные.
+    При TelegramRetryAfter отправка повторяется через указанное Telegram
+    время, при сетевых ошибках и 5xx - с экспоненциальной задержкой.
+    close() дожидается отправки оставшейся очереди.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        workers: int = 4,
+        global_rate: float = 30.0,
+        per_chat_rate: float = 1.0,
+        max_retries: int = 3,
+        retry_delay: float = 1.0,
+        max_queue: int = 10_000,
+        max_chats: int = 10_000,
+    ):
+        self.bot = bot
+        self.workers = workers
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue: asyncio.Queue[_Outgoing] = asyncio.Queue(maxsize=max_queue)
+        self._global = TokenBucket(global_rate)
+        # Ведро простаивающего чата через минуту снова полное - его можно забыть
+        self._chats = TTLCache(max_size=max_chats, ttl=60.0)
+        # Сообщения, отложенные до разрешенного времени отправки в их чат
+        self._waiting: dict[int, deque[_Outgoing]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"notify-{i}")
+            for i in range(self.workers)
+        ]
+
+    def send_message(self, chat_id: int, text: str, **kwargs: Any):
+        self._enqueue(_Outgoing(chat_id, "send_message", {"text": text, **kwargs}))
+
+    def send_photo(self, chat_id: int, photo: str, **kwargs: Any):
+        self._enqueue(_Outgoing(chat_id, "send_photo", {"photo": photo, **kwargs}))
+
+    def _enqueue(self, item: _Outgoing):
+        self.start()
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error(
+                "Очередь уведомлений переполнена, сообщение для %s отброшено",
+                item.chat_id,
+            )
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    async def close(self, timeout: float = 10.0):
+        """Дожидается отправки очереди (не дольше timeout) и останавливает отправителей"""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.error(
+                    f"Не отправлено уведомлений при остановке: {self._queue.qsize()}"
+                )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Без всплесков: в один чат сообщения идут строго с шагом 1/per_chat_rate
+            bucket = TokenBucket(self.per_chat_rate, capacity=1)
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def _acquire(self, chat_id: int):
+        # Сначала ждем свой чат, потом общий лимит: иначе сообщение в "горячий"
+        # чат занимало бы общий токен, пока ждет своей очереди
+        delay = self._chat_bucket(chat_id).reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        delay = self._global.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _worker(self):
+        while True:
+            item = await self._queue.get()
+            if not item.released and self._defer(item):
+                # task_done - когда сообщение вернется в очередь (_release)
+                continue
+            try:
+                await self._send(item)
+            finally:
+                self._queue.task_done()
+
+    def _defer(self, item: _Outgoing) -> bool:
+        """Откладывает сообщение, если его чату еще рано; True - отложено
+
+        Отложенные сообщения чата стоят в своей очереди и возвращаются в общую
+        по одному с шагом лимита чата, так что порядок в чате сохраняется.
+        """
+        waiting = self._waiting.get(item.chat_id)
+        if waiting is not None:
+            waiting.append(item)
+            return True
+        delay = self._chat_bucket(item.chat_id).wait_time()
+        if not delay:
+            return False
+        self._waiting[item.chat_id] = deque([item])
+        asyncio.get_running_loop().call_later(delay, self._release, item.chat_id)
+        return True
+
+    def _release(self, chat_id: int):
+        """Возвращает в общую очередь первое отложенное сообщение чата"""
+        loop = asyncio.get_running_loop()
+        waiting = self._waiting[chat_id]
+        item = waiting[0]
+        item.released = True
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            loop.call_later(self.retry_delay, self._release, chat_id)
+            return
+        waiting.popleft()
+        if waiting:
+            loop.call_later(1 / self.per_chat_rate, self._release, chat_id)
+        else:
+            del self._waiting[chat_id]
+        # Пока сообщение ждало, join() (а с ним и close()) считал его неотправленным
+        self._queue.task_done()
+
+    async def _send(self, item: _Outgoing):
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(item.chat_id)
+            try:
+                await getattr(self.bot, item.method)(
+                    chat_id=item.chat_id, **item.kwargs
+                )
+                self.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                delay = e.retry_after
+            except (TelegramNetworkError, TelegramServerError) as e:
+                delay = self.retry_delay * 2**attempt
+                logger.warning("Ошибка отправки уведомления %s: %s", item.chat_id, e)
+            except Exception as e:
+                # Пользователь заблокировал бота, неверный photo_id и т.п. - не повторяем
+                self.failed += 1
+                logger.error(f"Не удалось отправить уведомление {item.chat_id}: {e}")
+                return
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+        self.failed += 1
+        logger.error(
+            f"Уведомление для {item.chat_id} не отправлено после {self.max_retries} повторов"
+        )
@@ -0,0 +1,241 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+# Строковые и числовые литералы; цифры внутри имен (idx_2) не трогаем
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+# Для этих запросов SQLite умеет показать план
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+def normalize(sql: str) -> str:
+    """Текст запроса без лишних пробелов и литералов - ключ статистики"""
+    sql = _WHITESPACE.sub(" ", sql).strip()
+    sql = _LITERALS.sub("?", sql)
+    return _IN_LIST.sub("(?, ...)", sql)
+
+
+@dataclass
+class QueryStats:
+    query: str
+    calls: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    rows: int = 0
+
+    @property
+    def avg_time(self) -> float:
+        return self.total_time / self.calls if self.calls else 0.0
+
+
+class QueryTracer:
+    """Статистика запросов Database: вызовы, суммарное время, строки.
+
+    Подключается к соединению через TracingConnection (Database(tracer=...)).
+    Время запроса - выполнение плюс чтение результата (fetch*). Запросы
+    дольше slow_threshold секунд пишутся в журнал вместе с EXPLAIN QUERY PLAN.
+    Один трассировщик могут разделять соединения из разных потоков.
+    """
+
+    def __init__(self, slow_threshold: float = 0.05, max_queries: int = 1000):
+        self.slow_threshold = slow_threshold
+        self.max_queries = max_queries
+        self.slow_queries = 0
+        self._stats: Dict[str, QueryStats] = {}
+        # Исходный текст -> нормализованный: запросы в коде - константы
+        self._normalized: Dict[str, str] = {}
+        self._plans: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def normalize(self, sql: str) -> str:
+        query = self._normalized.get(sql)
+        if query is None:
+            if len(self._normalized) >= self.max_queries:
+                self._normalized.clear()
+            query = self._normalized[sql] = normalize(sql)
+        return query
+
+    def record(self, sql: str, elapsed: float, rows: int, new_call: bool):
+        """Добавляет время и строки к статистике запроса"""
+        query = self.normalize(sql)
+        with self._lock:
+            stats = self._stats.get(query)
+            if stats is None:
+                if len(self._stats) >= self.max_queries:
+                    return
+                stats = self._stats[query] = QueryStats(query)
+            if new_call:
+                stats.calls += 1
+            stats.total_time += elapsed
+            stats.rows += rows
+
+    def finish(
+        self,
+        conn: sqlite3.Connection,
+        sql: str,
+        params: Any,
+        elapsed: float,
+        rows: int,
+    ):
+        """Запрос завершен: обновляет максимум и пишет медленный запрос в журнал"""
+        query = self.normalize(sql)
+        with self._lock:
+            stats = self._stats.get(query)
+            if stats is not None and elapsed > stats.max_time:
+                stats.max_time = elapsed
+        if elapsed < self.slow_threshold:
+            return
+        self.slow_queries += 1
+        logger.warning(
+            "Медленный запрос %.1f мс, строк %d: %s\nПлан:\n%s",
+            elapsed * 1000,
+            rows,
+            query,
+            self._plan(conn, sql, params),
+            extra={
+                "query": query,
+                "duration_ms": round(elapsed * 1000, 3),
+                "rows": rows,
+            },
+        )
+
+    def _plan(self, conn: sqlite3.Connection, sql: str, params: Any) -> str:
+        query = self.normalize(sql)
+        plan = self._plans.get(query)
+        if plan is not None:
+            return plan
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return "-"
+        try:
+            # Обычный курсор: сам EXPLAIN в статистику не попадает
+            rows = (
+                sqlite3.Cursor(conn)
+                .execute("EXPLAIN QUERY PLAN " + sql, params)
+                .fetchall()
+            )
+        except Exception as e:
+            return f"не удалось получить план: {e}"
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        plan = self._plans[query] = "\n".join(lines)
+        return plan
+
+    def plan_for(self, query: str) -> Optional[str]:
+        return self._plans.get(query)
+
+    def top(self, n: int = 10) -> List[QueryStats]:
+        """Запросы с наибольшим суммарным временем"""
+        with self._lock:
+            stats = [replace(s) for s in self._stats.values()]
+        return sorted(stats, key=lambda s: s.total_time, reverse=True)[:n]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self.slow_queries = 0
+
+
+class TracingCursor(sqlite3.Cursor):
+    """Курсор, который отчитывается трассировщику соединения"""
+
+    def __init__(self, connection: "TracingConnection"):
+        super().__init__(connection)
+        self._tracer: QueryTracer = connection.tracer
+        # Текущий запрос: [sql, params, время, строки] до его завершения
+        self._active: Optional[list] = None
+
+    def execute(self, sql: str, parameters: Any = ()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            rows = max(self.rowcount, 0)
+            self._tracer.record(sql, elapsed, rows, new_call=True)
+            self._active = [sql, parameters, elapsed, rows]
+        return self
+
+    def executemany(self, sql: str, seq_of_parameters):
+        self._finish()
+        seq_of_parameters = list(seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            rows = max(self.rowcount, 0)
+            self._tracer.record(sql, elapsed, rows, new_call=True)
+            params = seq_of_parameters[0] if seq_of_parameters else ()
+            self._active = [sql, params, elapsed, rows]
+            self._finish()
+        return self
+
+    def _fetched(self, elapsed: float, rows: int, exhausted: bool):
+        active = self._active
+        if active is None:
+            return
+        active[2] += elapsed
+        active[3] += rows
+        self._tracer.record(active[0], elapsed, rows, new_call=False)
+        if exhausted:
+            self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(time.perf_counter() - started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size: int = -1):
+        if size == -1:
+            size = self.arraysize
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(time.perf_counter() - started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(time.perf_counter() - started, len(rows), True)
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _finish(self):
+        active, self._active = self._active, None
+        if active is not None:
+            self._tracer.finish(self.connection, *active)
+
+    def __del__(self):
+        # Точечные запросы читают одну строку и бросают курсор
+        try:
+            self._finish()
+        except Exception as e:
+            logger.error(f"Ошибка трассировки запроса: {e}")
+
+
+class TracingConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого отчитываются трассировщику tracer"""
+
+    tracer: QueryTracer
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TracingCursor)
+
+    def execute(self, sql: str, parameters: Any = ()):
+        return self.cursor().execute(sql, parameters)
@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+from async_database import AsyncDatabase
+from database import SearchCriteria
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Код пола в столбце gender; пол, не распознанный миграцией, - _UNKNOWN_GENDER
+_GENDER_CODES = {"m": 0, "f": 1}
+_UNKNOWN_GENDER = -1
+
+
+@dataclass(frozen=True)
+class RankingWeights:
+    """Вклад признаков в оценку кандидата; каждый признак нормирован в [0, 1]"""
+
+    faculty: float = 2.0
+    course: float = 1.0
+    age: float = 1.0
+    liked_you: float = 3.0
+    recency: float = 1.0
+    popularity: float = 0.5
+    # Через столько секунд без лайков вклад активности падает вдвое
+    recency_half_life: float = 7 * 24 * 3600
+
+
+class ProfileColumns:
+    """Столбцовое хранилище активных анкет, упорядоченное по user_id.
+
+    Каждый признак - отдельный массив NumPy, строка i во всех массивах -
+    одна анкета. Оценка всех анкет - несколько векторных операций над
+    массивами float32 вместо цикла по словарям. Часть оценки, которая не
+    зависит от зрителя (активность, популярность), считается заранее.
+    """
+
+    __slots__ = (
+        "ids",
+        "age",
+        "course",
+        "faculty",
+        "gender",
+        "static_score",
+        "faculty_codes",
+        "weights",
+        "now",
+        "max_likes",
+    )
+
+    def __init__(
+        self,
+        rows: Sequence[tuple],
+        weights: RankingWeights,
+        faculty_codes: Optional[Dict[str, int]] = None,
+        now: Optional[float] = None,
+        max_likes: Optional[int] = None,
+    ):
+        """rows - (user_id, age, course, faculty, gender, likes, last_active), см. get_ranking_rows
+
+        max_likes - нормировка популярности; по умолчанию максимум по rows.
+        """
+        self.weights = weights
+        self.now = time.time() if now is None else now
+        self.faculty_codes = faculty_codes if faculty_codes is not None else {}
+        rows = sorted(rows, key=lambda row: row[0])
+        count = len(rows)
+        self.ids = np.fromiter((r[0] for r in rows), np.int64, count)
+        self.age = np.fromiter((r[1] for r in rows), np.float32, count)
+        self.course = np.fromiter((r[2] for r in rows), np.float32, count)
+        self.faculty = np.fromiter(
+            (self.faculty_code(r[3]) for r in rows), np.int32, count
+        )
+        self.gender = np.fromiter(
+            (_GENDER_CODES.get(r[4], _UNKNOWN_GENDER) for r in rows), np.int8, count
+        )
+        likes = np.fromiter((r[5] for r in rows), np.float64, count)
+        last_active = np.fromiter((r[6] or 0 for r in rows), np.float64, count)
+        if max_likes is None:
+            max_likes = int(likes.max()) if count else 0
+        self.max_likes = max(max_likes, 1)
+        self.static_score = self._static_score(likes, last_active)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def faculty_code(self, faculty: str) -> int:
+        code = self.faculty_codes.get(faculty)
+        if code is None:
+            code = self.faculty_codes[faculty] = len(self.faculty_codes)
+        return code
+
+    def _static_score(self, likes: np.ndarray, last_active: np.ndarray) -> np.ndarray:
+        w = self.weights
+        idle = np.maximum(self.now - last_active, 0.0)
+        recency = np.exp2(-idle / w.recency_half_life)
+        popularity = np.minimum(np.log1p(likes) / math.log1p(self.max_likes), 1.0)
+        return (w.recency * recency + w.popularity * popularity).astype(np.float32)
+
+    def _positions(self, user_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Позиции user_ids в хранилище и маска тех, что в нем есть"""
+        positions = np.searchsorted(self.ids, user_ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == user_ids[found]
+        return positions, found
+
+    def index_of(self, user_id: int) -> Optional[int]:
+        positions, found = self._positions(np.array([user_id], np.int64))
+        return int(positions[0]) if found[0] else None
+
+    def apply(self, rows: Sequence[tuple], changed: Iterable[int]):
+        """Обновляет хранилище после изменения анкет changed
+
+        rows - актуальные строки тех из них, что активны. Изменение уже
+        известной анкеты - запись на месте за O(log n); добавление и
+        удаление копируют массивы, как np.insert / np.delete.
+        """
+        fresh = ProfileColumns(
+            rows, self.weights, self.faculty_codes, self.now, self.max_likes
+        )
+        columns = ("ids", "age", "course", "faculty", "gender", "static_score")
+        positions, found = self._positions(fresh.ids)
+        for name in columns:
+            getattr(self, name)[positions[found]] = getattr(fresh, name)[found]
+
+        gone = np.setdiff1d(np.fromiter(changed, np.int64), fresh.ids)
+        gone_positions, gone_found = self._positions(gone)
+        if gone_found.any():
+            for name in columns:
+                setattr(
+                    self,
+                    name,
+                    np.delete(getattr(self, name), gone_positions[gone_found]),
+                )
+        if not found.all():
+            new = ~found
+            positions = np.searchsorted(self.ids, fresh.ids[new])
+            for name in columns:
+                setattr(
+                    self,
+                    name,
+                    np.insert(
+                        getattr(self, name), positions, getattr(fresh, name)[new]
+                    ),
+                )
+
+    def top(
+        self,
+        viewer_id: int,
+        k: int,
+        criteria: SearchCriteria = SearchCriteria(),
+        liked_you: Collection[int] = (),
+        exclude: Collection[int] = (),
+    ) -> List[int]:
+        """k лучших кандидатов для viewer_id, по убыванию оценки
+
+        Оценка считается сразу для всех анкет; не подходящие под критерии
+        получают -inf. Лучшие k выбираются np.partition за O(n) без полной
+        сортировки. При равной оценке выше анкета с меньшим user_id.
+        """
+        if not len(self.ids):
+            return []
+        score = self._score(viewer_id, liked_you)
+        mask = self._criteria_mask(criteria)
+        if mask is not None:
+            np.copyto(score, np.float32(-np.inf), where=~mask)
+        if exclude:
+            positions, found = self._positions(
+                np.fromiter(exclude, np.int64, len(exclude))
+            )
+            score[positions[found]] = -np.inf
+        return self._best(score, k)
+
+    def _score(self, viewer_id: int, liked_you: Collection[int]) -> np.ndarray:
+        """Оценка всех анкет для viewer_id; своя анкета получает -inf"""
+        w = self.weights
+        score = self.static_score.copy()
+        viewer = self.index_of(viewer_id)
+        if viewer is not None:
+            score += np.float32(w.faculty) * (self.faculty == self.faculty[viewer])
+            score += np.float32(w.course) / (
+                1 + np.abs(self.course - self.course[viewer])
+            )
+            score += np.float32(w.age) / (1 + np.abs(self.age - self.age[viewer]) / 2)
+            score[viewer] = -np.inf
+        if liked_you:
+            positions, found = self._positions(
+                np.fromiter(liked_you, np.int64, len(liked_you))
+            )
+            score[positions[found]] += np.float32(w.liked_you)
+        return score
+
+    def _criteria_mask(self, criteria: SearchCriteria) -> Optional[np.ndarray]:
+        """Маска анкет, подходящих под критерии; None - подходят все"""
+        mask = None
+        if criteria.gender is not None:
+            mask = self.gender == _GENDER_CODES[criteria.gender]
+        if criteria.faculty is not None:
+            code = self.faculty_codes.get(criteria.faculty, -1)
+            mask = _and(mask, self.faculty == code)
+        if criteria.courses:
+            mask = _and(mask, np.isin(self.course, criteria.courses))
+        if criteria.age_min is not None:
+            mask = _and(mask, self.age >= criteria.age_min)
+        if criteria.age_max is not None:
+            mask = _and(mask, self.age <= criteria.age_max)
+        return mask
+
+    def _best(self, score: np.ndarray, k: int) -> List[int]:
+        """user_id k анкет с наибольшей оценкой, кроме оценки -inf"""
+        # partition вырождается на массе одинаковых -inf - отбираем только из подходящих
+        candidates = np.flatnonzero(score > np.float32(-np.inf))
+        if len(candidates) > k:
+            values = score[candidates]
+            threshold = np.partition(values, len(values) - k)[len(values) - k]
+            above = candidates[values > threshold]
+            # Позиции идут по возрастанию user_id: из равных берутся меньшие
+            tied = candidates[values == threshold][: k - len(above)]
+            best = np.concatenate((above, tied))
+        else:
+            best = candidates
+        order = np.lexsort((self.ids[best], -score[best]))
+        return self.ids[best[order]].tolist()
+
+
+def _and(mask: Optional[np.ndarray], condition: np.ndarray) -> np.ndarray:
+    return condition if mask is None else np.logical_and(mask, condition, out=mask)
+
+
+class CandidateRanker:
+    """Ранжирование ленты по столбцовому хранилищу активных анкет.
+
+    Хранилище загружается из базы целиком (get_ranking_rows) и дальше
+    обновляется по одной анкете: AsyncDatabase сообщает об измененных
+    анкетах, и перед следующим ранжированием они перечитываются одним
+    запросом. Популярность и активность меняются с каждым лайком, поэтому
+    раз в reload_interval секунд хранилище перезагружается в фоне.
+
+    Оцененные зрителем анкеты и его лайкнувшие читаются раз в history_ttl
+    секунд: оценки, сделанные за это время, отсекает очередь кандидатов.
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        weights: RankingWeights = RankingWeights(),
+        reload_interval: float = 600.0,
+        clock: Callable[[], float] = time.time,
+        history_ttl: float = 60.0,
+        max_viewers: int = 1_000,
+    ):
+        self.db = db
+        self.weights = weights
+        self.reload_interval = reload_interval
+        self._clock = clock
+        self.columns: Optional[ProfileColumns] = None
+        self._loaded_at = 0.0
+        self._dirty: set[int] = set()
+        # Пока идет загрузка - анкеты, измененные за это время: их правки могли
+        # попасть только в старое хранилище, и после замены их применяют заново
+        self._changed_during_load: Optional[set[int]] = None
+        # viewer_id -> (оцененные анкеты, кто лайкнул зрителя)
+        self._history = TTLCache(max_size=max_viewers, ttl=history_ttl)
+        self._reload_task: Optional[asyncio.Task] = None
+        self._load_lock = asyncio.Lock()
+        db.add_profile_listener(self.mark_dirty)
+
+    async def load(self):
+        started = time.perf_counter()
+        # Загрузка читает все анкеты - накопленные изменения в ней уже есть
+        self._dirty.clear()
+        self._changed_during_load = set()
+        try:
+            rows = await self.db.get_ranking_rows()
+            now = self._clock()
+            self.columns = ProfileColumns(rows, self.weights, now=now)
+            self._loaded_at = now
+            # Изменения, пришедшие во время загрузки, применяются поверх нее
+            self._dirty |= self._changed_during_load
+        finally:
+            self._changed_during_load = None
+        logger.info(
+            "Хранилище ранжирования: %d анкет за %.0f мс",
+            len(rows),
+            (time.perf_counter() - started) * 1000,
+        )
+
+    def mark_dirty(self, user_id: Optional[int]):
+        """Слушатель AsyncDatabase: анкета user_id изменилась (None - все анкеты)"""
+        if user_id is None:
+            self._loaded_at = 0.0
+        else:
+            self._dirty.add(user_id)
+            if self._changed_during_load is not None:
+                self._changed_during_load.add(user_id)
+
+    async def _refresh(self):
+        if self.columns is None:
+            async with self._load_lock:
+                if self.columns is None:
+                    await self.load()
+        elif self._clock() - self._loaded_at >= self.reload_interval:
+            if self._reload_task is None or self._reload_task.done():
+                self._reload_task = asyncio.create_task(self._reload())
+        if self._dirty and self.columns is not None:
+            dirty, self._dirty = self._dirty, set()
+            # Скрытых и удаленных анкет в ответе нет - они просто уходят из хранилища
+            rows = await self.db.get_ranking_rows(sorted(dirty))
+            self.columns.apply(rows, dirty)
+
+    async def _reload(self):
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error(f"Ошибка при перезагрузке хранилища ранжирования: {e}")
+
+    async def rank(
+        self,
+        viewer_id: int,
+        criteria: SearchCriteria,
+        k: int,
+        exclude: Collection[int] = (),
+    ) -> List[int]:
+        """k лучших кандидатов, кроме уже оцененных и переданных в exclude"""
+        await self._refresh()
+        viewed, liked_you = await self._viewer_history(viewer_id)
+        return self.columns.top(
+            viewer_id, k, criteria, liked_you, set(exclude).union(viewed)
+        )
+
+    async def _viewer_history(self, viewer_id: int) -> tuple[set[int], list[int]]:
+        """Оцененные зрителем анкеты и кто его лайкнул, из кэша на history_ttl"""
+        history = self._history.get(viewer_id)
+        if history is None:
+            viewed = set(await self.db.get_viewed_ids(viewer_id))
+            history = (viewed, await self.db.get_likers(viewer_id))
+            self._history.set(viewer_id, history)
+        return history
@@ -0,0 +1,303 @@
+import asyncio
+import hashlib
+import logging
+import math
+from collections import deque
+from typing import Optional
+
+from async_database import AsyncDatabase
+from database import SearchCriteria
+from services.cache import TTLCache
+from services.ranking import CandidateRanker
+
+logger = logging.getLogger(__name__)
+
+# Код фильтра ленты (см. get_profile_keyboard) -> код пола в анкете
+FEED_GENDERS = {"f": "f", "m": "m", "all": None}
+# Фильтр ленты по сохраненным критериям пользователя (get_search_criteria)
+SAVED_CRITERIA = "c"
+
+
+class BloomFilter:
+    """Фильтр Блума для множества user_id.
+
+    Отрицательный ответ точен, положительный ошибочен с вероятностью
+    error_rate, пока в фильтр добавлено не больше capacity элементов.
+    """
+
+    __slots__ = ("capacity", "count", "_bits", "_size", "_hashes")
+
+    def __init__(self, capacity: int = 512, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.count = 0
+        self._size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def _positions(self, item: int):
+        data = item.to_bytes(8, "little", signed=True)
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self._hashes):
+            yield (h1 + i * h2) % self._size
+
+    def add(self, item: int):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: int) -> bool:
+        return all(
+            self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item)
+        )
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class _FeedQueue:
+    """Очередь кандидатов одного пользователя для одного фильтра"""
+
+    __slots__ = (
+        "ids",
+        "cursor",
+        "exhausted",
+        "refill_task",
+        "criteria",
+        "loaded",
+        "reentry",
+        "version",
+    )
+
+    def __init__(self, cursor: int, version: int):
+        self.ids: deque[int] = deque()
+        # Критерии читаются при первом пополнении и живут вместе с очередью
+        self.criteria: Optional[SearchCriteria] = None
+        # user_id последнего кандидата, загруженного из базы
+        self.cursor = cursor
+        self.exhausted = False
+        self.refill_task: Optional[asyncio.Task] = None
+        # Все user_id, когда-либо загруженные в очередь: при ранжировании
+        # курсора нет, и повторно они не запрашиваются
+        self.loaded: set[int] = set()
+        # Измененные анкеты позади курсора: следующее пополнение проверит,
+        # подходят ли они снова (без ранжирования)
+        self.reentry: set[int] = set()
+        # Номер последнего изменения анкет, уже примененного к очереди
+        self.version = version
+
+
+class CandidateQueue:
+    """Предвычисленные очереди кандидатов ленты.
+
+    Для каждой пары (пользователь, фильтр) хранится deque из следующих
+    user_id. Очередь пополняется одним пакетным запросом get_feed_ids,
+    когда в ней остается меньше refill_at кандидатов; выдача - popleft за O(1).
+    Память ограничена LRU + TTL; вытесненная очередь перестраивается с
+    последнего показанного кандидата. Изменения анкет (invalidate) пишутся
+    в журнал и применяются к очереди при следующей выдаче из нее. Уже
+    оцененные анкеты отсекаются анти-join в базе и фильтром Блума в памяти; попадание в
+    фильтр перепроверяется по базе (has_view), чтобы ложное срабатывание
+    не скрыло анкету, которую пользователь не видел.
+
+    С ranker очередь пополняется лучшими по оценке кандидатами
+    (CandidateRanker.rank) вместо порядка user_id.
+    """
+
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        size: int = 20,
+        refill_at: int = 5,
+        max_users: int = 10_000,
+        ttl: float = 600.0,
+        ranker: Optional[CandidateRanker] = None,
+        max_changes: int = 10_000,
+    ):
+        self.db = db
+        self.ranker = ranker
+        self.size = size
+        self.refill_at = refill_at
+        self._queues = TTLCache(max_size=max_users, ttl=ttl)
+        # Недавно оцененные анкеты каждого пользователя. Просмотры пишутся в
+        # базу пакетами, и фильтр закрывает окно, пока запись еще не сброшена
+        self._seen = TTLCache(max_size=max_users, ttl=ttl)
+        # Журнал изменений анкет: (номер изменения, user_id)
+        self._changes: deque[tuple[int, int]] = deque(maxlen=max_changes)
+        self._version = 0
+
+    async def pop(
+        self, viewer_id: int, search_filter: str, cursor: int = 0
+    ) -> Optional[int]:
+        """Возвращает следующего кандидата или None, если лента закончилась
+
+        cursor - user_id последней показанной анкеты; используется, только
+        если очереди нет (вытеснена, истекла или бот перезапущен).
+        """
+        key = (viewer_id, search_filter)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = _FeedQueue(cursor, self._version)
+        self._queues.set(key, queue)
+
+        # Пакет мог целиком состоять из анкет, скрытых за время запроса
+        self._apply_changes(queue)
+        while not queue.ids and not queue.exhausted:
+            if not await self._refill(viewer_id, search_filter, queue):
+                break
+            self._apply_changes(queue)
+        if not queue.ids:
+            return None
+
+        seen = self._seen.get(viewer_id)
+        candidate_id = queue.ids.popleft()
+        # Промах фильтра Блума точен, а попадание может быть ложным - его сверяем с базой
+        while (
+            seen is not None
+            and candidate_id in seen
+            and await self.db.has_view(viewer_id, candidate_id)
+        ):
+            if not queue.ids:
+                return await self.pop(viewer_id, search_filter, candidate_id)
+            candidate_id = queue.ids.popleft()
+        if (
+            len(queue.ids) < self.refill_at
+            and not queue.exhausted
+            and queue.refill_task is None
+        ):
+            queue.refill_task = asyncio.create_task(
+                self._refill(viewer_id, search_filter, queue)
+            )
+        return candidate_id
+
+    async def record_view(self, viewer_id: int, target_id: int, action: str):
+        """Отмечает анкету как оцененную: она больше не попадет в ленту"""
+        seen = self._seen.get(viewer_id)
+        if seen is None or seen.is_full:
+            # Старые отметки к этому моменту уже в базе - хватает анти-join
+            seen = BloomFilter()
+        seen.add(target_id)
+        self._seen.set(viewer_id, seen)
+        await self.db.record_view(viewer_id, target_id, action)
+
+    def reset(self, viewer_id: int, search_filter: str):
+        """Начинает ленту пользователя заново (новый поиск)"""
+        self._queues.pop((viewer_id, search_filter))
+
+    def invalidate(self, user_id: int):
+        """Анкета user_id изменилась: стала видимой, скрытой или другой
+
+        Только отметка в журнале за O(1); очереди применяют ее сами при
+        следующей выдаче (_apply_changes).
+        """
+        self._version += 1
+        self._changes.append((self._version, user_id))
+
+    def _changed_since(self, version: int) -> Optional[set[int]]:
+        """user_id анкет, измененных после version; None - журнал уже обрезан"""
+        if not self._changes or self._changes[0][0] > version + 1:
+            return None
+        changed = set()
+        for change, user_id in reversed(self._changes):
+            if change <= version:
+                break
+            changed.add(user_id)
+        return changed
+
+    def _apply_changes(self, queue: _FeedQueue):
+        """Применяет к очереди изменения анкет, случившиеся после queue.version
+
+        Измененная анкета убирается из очереди. Если она по-прежнему подходит
+        (или только что стала видимой), следующее пополнение вернет ее: при
+        ранжировании ranker снова может ее выбрать, без него анкеты позади
+        курсора перепроверяются по списку (reentry).
+        """
+        if queue.version == self._version:
+            return
+        changed = self._changed_since(queue.version)
+        queue.version = self._version
+        queue.exhausted = False
+        if changed is None:
+            # Очередь строится заново с начала ленты; оцененные отсечет база
+            queue.ids.clear()
+            queue.loaded.clear()
+            queue.reentry.clear()
+            queue.cursor = 0
+            return
+        if not changed.isdisjoint(queue.ids):
+            queue.ids = deque(
+                user_id for user_id in queue.ids if user_id not in changed
+            )
+        if self.ranker is not None:
+            queue.loaded -= changed
+        else:
+            queue.reentry.update(
+                user_id for user_id in changed if user_id <= queue.cursor
+            )
+
+    async def _criteria_for(self, viewer_id: int, search_filter: str) -> SearchCriteria:
+        if search_filter == SAVED_CRITERIA:
+            return await self.db.get_search_criteria(viewer_id) or SearchCriteria()
+        return SearchCriteria(gender=FEED_GENDERS[search_filter])
+
+    async def _fetch_ids(
+        self, viewer_id: int, queue: _FeedQueue, limit: int
+    ) -> list[int]:
+        """Следующие limit кандидатов: по оценке ranker или по порядку user_id"""
+        if self.ranker is not None:
+            return await self.ranker.rank(
+                viewer_id, queue.criteria, limit, exclude=queue.loaded
+            )
+        return await self.db.get_feed_ids(
+            viewer_id,
+            after_user_id=queue.cursor,
+            limit=limit,
+            criteria=queue.criteria,
+        )
+
+    async def _reentered(self, viewer_id: int, queue: _FeedQueue) -> list[int]:
+        """Анкеты из queue.reentry, которые снова подходят в ленту"""
+        if not queue.reentry:
+            return []
+        reentry, queue.reentry = queue.reentry, set()
+        try:
+            return await self.db.filter_feed_ids(
+                viewer_id, sorted(reentry), queue.criteria
+            )
+        except Exception:
+            queue.reentry |= reentry
+            raise
+
+    async def _refill(
+        self, viewer_id: int, search_filter: str, queue: _FeedQueue
+    ) -> bool:
+        """Догружает очередь до size кандидатов; False - запрос не удался"""
+        current_task = asyncio.current_task()
+        if queue.refill_task is not None and queue.refill_task is not current_task:
+            # Фоновое пополнение уже идет - дожидаемся его, а не дублируем запрос
+            return await queue.refill_task
+        limit = self.size - len(queue.ids)
+        started = self._version
+        try:
+            if queue.criteria is None:
+                queue.criteria = await self._criteria_for(viewer_id, search_filter)
+            ids = await self._fetch_ids(viewer_id, queue, limit)
+            if len(ids) < limit:
+                queue.exhausted = True
+            if ids:
+                queue.cursor = ids[-1]
+            ids = await self._reentered(viewer_id, queue) + ids
+            queue.ids.extend(ids)
+            if self.ranker is not None:
+                queue.loaded.update(ids)
+            # Изменения, пришедшие во время запроса, применяются к пакету заново
+            queue.version = min(queue.version, started)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при пополнении очереди кандидатов: {e}")
+            return False
+        finally:
+            if queue.refill_task is current_task:
+                queue.refill_task = None
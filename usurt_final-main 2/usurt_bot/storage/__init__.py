@@ -0,0 +1,4 @@
+from .memory_storage import BoundedMemoryStorage
+from .sqlite_storage import SQLiteStorage
+
+__all__ = ["BoundedMemoryStorage", "SQLiteStorage"]
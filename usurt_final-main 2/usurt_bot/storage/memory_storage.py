@@ -0,0 +1,108 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+
+class _Record:
+    __slots__ = ("state", "data", "touched")
+
+    def __init__(
+        self, state: Optional[str], data: Optional[Dict[str, Any]], touched: float
+    ):
+        self.state = state
+        # None вместо пустого словаря: у большинства записей данных нет
+        self.data = data
+        self.touched = touched
+
+
+class BoundedMemoryStorage(BaseStorage):
+    """FSM-хранилище в памяти с ограничением размера и временем простоя.
+
+    В отличие от MemoryStorage, чтение не создает записей (FSM-middleware
+    спрашивает состояние у каждого апдейта), а пустая запись удаляется.
+    Записи упорядочены по последнему обращению: простаивающие дольше idle_ttl
+    секунд удаляются, а при превышении max_entries вытесняется самая старая.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 50_000,
+        idle_ttl: float = 24 * 3600,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._records: OrderedDict[StorageKey, _Record] = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        record = self._touch(key)
+        self._store(key, state, record.data if record else None)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._touch(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        record = self._touch(key)
+        self._store(key, record.state if record else None, data.copy() or None)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._touch(key)
+        return record.data.copy() if record and record.data else {}
+
+    async def close(self) -> None:
+        self._records.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._records),
+            "max_entries": self.max_entries,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+    def _touch(self, key: StorageKey) -> Optional[_Record]:
+        self._expire()
+        record = self._records.get(key)
+        if record is not None:
+            record.touched = self._clock()
+            self._records.move_to_end(key)
+        return record
+
+    def _store(
+        self, key: StorageKey, state: Optional[str], data: Optional[Dict[str, Any]]
+    ):
+        if state is None and not data:
+            self._records.pop(key, None)
+            return
+        record = self._records.get(key)
+        if record is None:
+            self._records[key] = _Record(state, data, self._clock())
+            while len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+                self.evicted += 1
+        else:
+            record.state = state
+            record.data = data
+
+    def _expire(self):
+        # Самые давние записи в начале - проверяем, пока не встретим свежую
+        deadline = self._clock() - self.idle_ttl
+        while self._records:
+            key, record = next(iter(self._records.items()))
+            if record.touched >= deadline:
+                break
+            del self._records[key]
+            self.expired += 1
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+UPSERT_RECORD = """INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        state = excluded.state, data = excluded.data, updated_at = excluded.updated_at"""
+DELETE_RECORD = "DELETE FROM fsm WHERE key = ?"
+
+
+def _key(key: StorageKey) -> str:
+    return (
+        f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+        f"{key.business_connection_id or ''}:{key.destiny}"
+    )
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище aiogram в отдельном файле SQLite (WAL).
+
+    Состояния переживают перезапуск бота. Запись сквозная: изменение сразу
+    попадает в LRU-кэш и в очередь, которую фоновая задача раз в
+    flush_interval секунд пишет в базу одной транзакцией, поэтому шаг анкеты
+    не ждет диска. Чтение горячего ключа - обращение к словарю. Анкеты,
+    брошенные дольше state_ttl секунд, считаются пустыми и удаляются
+    периодической чисткой.
+    """
+
+    def __init__(
+        self,
+        path: str = "fsm_storage.db",
+        flush_interval: float = 0.05,
+        state_ttl: float = 24 * 3600,
+        sweep_interval: float = 600,
+        cache_size: int = 10_000,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.state_ttl = state_ttl
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._cache = TTLCache(max_size=cache_size, ttl=state_ttl, clock=clock)
+        # Изменения, еще не записанные в базу; None - запись удалена
+        self._dirty: Dict[str, Optional[tuple]] = {}
+        # Изменения, которые пишутся прямо сейчас - видны чтениям до коммита
+        self._flushing: Dict[str, Optional[tuple]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-db")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            """
+        CREATE TABLE IF NOT EXISTS fsm (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+        """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_fsm_updated ON fsm (updated_at)"
+        )
+        self._conn.commit()
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        record = await self._get_record(_key(key))
+        self._put(_key(key), state, record[1])
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get_record(_key(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        record = await self._get_record(_key(key))
+        self._put(_key(key), record[0], data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get_record(_key(key)))[1].copy()
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+        await asyncio.to_thread(self._shutdown)
+
+    # --- Кэш и очередь записи ---
+
+    def _put(self, key: str, state: Optional[str], data: Dict[str, Any]):
+        self._start()
+        self._cache.set(key, (state, data))
+        # Пустая запись (состояние сброшено, данных нет) удаляется из базы
+        self._dirty[key] = (state, data, self._clock()) if state or data else None
+
+    async def _get_record(self, key: str) -> tuple[Optional[str], Dict[str, Any]]:
+        record = self._cache.get(key)
+        if record is not None:
+            return record
+        for pending in (self._dirty, self._flushing):
+            if key in pending:
+                change = pending[key]
+                record = (None, {}) if change is None else change[:2]
+                self._cache.set(key, record)
+                return record
+
+        loop = asyncio.get_running_loop()
+        row = await loop.run_in_executor(self._executor, self._load, key)
+        cached = self._cache.get(key)
+        if cached is not None:
+            # Пока шло чтение, ключ успели записать - запись новее базы
+            return cached
+        record = (row[0], json.loads(row[1])) if row else (None, {})
+        self._cache.set(key, record)
+        return record
+
+    def _load(self, key: str) -> Optional[tuple]:
+        return self._conn.execute(
+            "SELECT state, data FROM fsm WHERE key = ? AND updated_at >= ?",
+            (key, self._clock() - self.state_ttl),
+        ).fetchone()
+
+    def _start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._flush_periodically()),
+                asyncio.create_task(self._sweep_periodically()),
+            ]
+
+    async def flush(self):
+        """Записывает накопленные изменения одной транзакцией"""
+        if not self._dirty:
+            return
+        self._flushing, self._dirty = self._dirty, {}
+        upserts = []
+        deletes = []
+        for key, change in self._flushing.items():
+            if change is None:
+                deletes.append((key,))
+            else:
+                state, data, updated_at = change
+                upserts.append(
+                    (key, state, json.dumps(data, ensure_ascii=False), updated_at)
+                )
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._write, upserts, deletes)
+        except Exception:
+            # Возвращаем в очередь то, что не перезаписано за время сброса
+            self._dirty = {**self._flushing, **self._dirty}
+            raise
+        finally:
+            self._flushing = {}
+
+    def _write(self, upserts: list[tuple], deletes: list[tuple]):
+        try:
+            self._conn.executemany(UPSERT_RECORD, upserts)
+            self._conn.executemany(DELETE_RECORD, deletes)
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def sweep(self) -> int:
+        """Удаляет из базы состояния, не менявшиеся дольше state_ttl"""
+        cursor = self._conn.execute(
+            "DELETE FROM fsm WHERE updated_at < ?", (self._clock() - self.state_ttl,)
+        )
+        self._conn.commit()
+        return cursor.rowcount
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении FSM-состояний: {e}")
+
+    async def _sweep_periodically(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await loop.run_in_executor(self._executor, self.sweep)
+                if removed:
+                    logger.info(f"Удалено брошенных FSM-состояний: {removed}")
+            except Exception as e:
+                logger.error(f"Ошибка при чистке FSM-состояний: {e}")
+
+    def _shutdown(self):
+        self._executor.shutdown(wait=True)
+        self._conn.close()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import Update
+from async_database import AsyncDatabase
+from handlers.admin_handlers import setup_admin_handlers
+from handlers.base_handlers import setup_base_handlers
+from storage import BoundedMemoryStorage
+
+
+class CaptureRequests(BaseRequestMiddleware):
+    """Вместо запроса к Telegram запоминает отправленные тексты"""
+
+    def __init__(self):
+        self.texts = []
+
+    async def __call__(self, make_request, bot, method):
+        self.texts.append(method.text)
+        return True
+
+
+def command_update(user_id: int, text: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": 1700000000,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+                "text": text,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+            },
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_db_stats_is_admin_only_and_stats_stays_public():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabase(os.path.join(tmp, "test.db"), readers=0)
+        dp = Dispatcher(storage=BoundedMemoryStorage(max_entries=10))
+        router = Router()
+        setup_base_handlers(router, db)
+        setup_admin_handlers(router, db, admin_ids=[1])
+        dp.include_router(router)
+        capture = CaptureRequests()
+        bot = Bot(token="42:TEST")
+        bot.session.middleware(capture)
+        try:
+            await dp.feed_update(bot, command_update(2, "/db_stats"))
+            assert capture.texts == []
+
+            # Публичная статистика - без внутренних настроек и кэшей
+            await dp.feed_update(bot, command_update(2, "/stats"))
+            assert "Всего пользователей" in capture.texts[-1]
+            assert "SQLite" not in capture.texts[-1]
+
+            await dp.feed_update(bot, command_update(1, "/db_stats"))
+            assert "journal_mode" in capture.texts[-1]
+            assert "Кэш анкет" in capture.texts[-1]
+            assert "Состояния FSM: 0/10" in capture.texts[-1]
+        finally:
+            await bot.session.close()
+            await db.close()
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+import pytest_asyncio
+from async_database import AsyncDatabase
+
+PROFILE = {
+    "name": "Test Name",
+    "age": 20,
+    "gender": "мужской",
+    "faculty": "Информатики",
+    "course": 3,
+    "bio": "Тестовое описание",
+    "photo_id": "test_photo_id",
+}
+
+
+@pytest_asyncio.fixture
+async def async_db():
+    """Создает асинхронный фасад над временной базой данных"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+
+    db = AsyncDatabase(db_path, readers=2)
+    yield db
+
+    await db.close()
+    os.unlink(db_path)
+
+
+@pytest.mark.asyncio
+async def test_readers_see_committed_writes(async_db):
+    """Чтения из пула видят данные, записанные через писателя"""
+    await async_db.add_user(123, "test_user", "Test User")
+    await async_db.save_profile(123, PROFILE)
+
+    profile = await async_db.get_profile(123)
+    assert profile is not None
+    assert profile.name == "Test Name"
+    assert await async_db.get_total_users() == 1
+
+
+@pytest.mark.asyncio
+async def test_has_like(async_db):
+    """Проверка взаимного лайка без прямого доступа к соединению"""
+    await async_db.add_like(123, 456)
+
+    assert await async_db.has_like(123, 456)
+    assert not await async_db.has_like(456, 123)
+
+
+@pytest.mark.asyncio
+async def test_user_stats_cached_until_like(async_db):
+    """Статистика берется из кэша и сбрасывается лайком любого из участников"""
+    for user_id in (1, 2):
+        await async_db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        await async_db.save_profile(user_id, PROFILE)
+    assert await async_db.get_user_stats(3) is None
+
+    stats = await async_db.get_user_stats(1)
+    assert stats == {
+        "name": "Test Name",
+        "likes_given": 0,
+        "likes_received": 0,
+        "matches": 0,
+    }
+    assert await async_db.get_user_stats(1) is stats
+
+    await async_db.like(1, 2)
+    await async_db.like(2, 1)
+    assert await async_db.get_user_stats(1) == {
+        "name": "Test Name",
+        "likes_given": 1,
+        "likes_received": 1,
+        "matches": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_profile_cache_invalidated_on_write(async_db):
+    """Повторное чтение анкеты берется из кэша, изменение анкеты сбрасывает его"""
+    assert await async_db.get_profile(123) is None
+    await async_db.add_user(123, "test_user", "Test User")
+    await async_db.save_profile(123, PROFILE)
+
+    profile = await async_db.get_profile(123)
+    assert await async_db.get_profile(123) is profile
+    with pytest.raises(AttributeError):
+        profile.name = "Changed"  # запись из кэша неизменяема
+
+    await async_db.save_profile(123, {**profile._asdict(), "name": "New Name"})
+    assert (await async_db.get_profile(123)).name == "New Name"
+
+    await async_db.delete_profile(123)
+    assert await async_db.get_profile(123) is None
+
+    stats = async_db.profile_cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 4
+
+
+@pytest.mark.asyncio
+async def test_in_memory_database_reads_through_writer():
+    """Для :memory: пул читателей не создается"""
+    db = AsyncDatabase(":memory:", readers=2)
+    await db.add_user(1, "user1", "User 1")
+    assert await db.get_total_users() == 1
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_readers_require_wal():
+    """Без WAL пул читателей не создается: чтения идут через писателя"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabase(os.path.join(tmp, "delete.db"), readers=2)
+        await db.add_user(1, "user1", "User 1")
+
+        assert db._read_executor is None
+        assert await db.get_total_users() == 1
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_mutual_like_is_visible_before_flush():
+    """Проверка взаимного лайка видит лайк, еще не сброшенный на диск"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+    db = AsyncDatabase(db_path, write_behind=True, flush_rows=1000, flush_interval=60)
+
+    await db.add_like(1, 2)
+    assert await db.has_like(1, 2)
+    assert await db.get_user_likes_count(1) == 0  # читатели видят только диск
+
+    await db.flush()
+    assert await db.get_user_likes_count(1) == 1
+    await db.close()
+    os.unlink(db_path)
+
+
+@pytest.mark.asyncio
+async def test_timer_flush_is_observed_separately_and_skipped_when_empty():
+    calls = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabase(
+            os.path.join(tmp, "test.db"),
+            flush_interval=60,
+            observer=lambda method, seconds: calls.append(method),
+        )
+        # Частый таймер, но сама Database по времени сбрасывать не станет
+        db.flush_interval = 0.02
+        await db.record_view(1, 2, "skip")
+        await asyncio.sleep(0.2)
+        assert await db.has_view(1, 2)
+        await db.close()
+
+    # Один сброс по таймеру со своей меткой; пустые сбросы не записываются
+    assert calls.count("flush[timer]") == 1
+    assert "flush" not in calls
+
+
+@pytest.mark.asyncio
+async def test_wal_readers_see_writes():
+    """С WAL читатели из пула работают параллельно с писателем"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabase(
+            os.path.join(tmp, "wal.db"),
+            readers=2,
+            pragmas={"journal_mode": "WAL", "synchronous": "NORMAL"},
+        )
+        await db.add_user(1, "user1", "User 1")
+
+        assert await db.get_total_users() == 1
+        assert (await db.get_pragmas())["journal_mode"] == "wal"
+        await db.close()
@@ -0,0 +1,40 @@
+import argparse
+import tempfile
+
+from benchmarks.bench_database import compare, parse_scale, run_scale, uncovered_methods
+
+
+def test_every_public_method_is_benchmarked():
+    assert uncovered_methods() == []
+
+
+def test_small_scale_run_measures_all_cases():
+    with tempfile.TemporaryDirectory() as tmp:
+        args = argparse.Namespace(
+            data_dir=tmp,
+            likes_per_user=3,
+            mutual_rate=0.5,
+            seed=1,
+            storage="default",
+            budget=0.0,
+            min_iterations=2,
+            max_iterations=2,
+        )
+        results = run_scale(args, 200)
+    assert results["get_mutual_likes"]["iterations"] == 2
+    assert all(r["median_ms"] >= 0 for r in results.values())
+
+
+def test_compare_reports_only_significant_regressions():
+    baseline = {
+        "results": {"1000": {"fast": {"median_ms": 0.01}, "slow": {"median_ms": 10.0}}}
+    }
+    current = {
+        "results": {"1000": {"fast": {"median_ms": 0.03}, "slow": {"median_ms": 14.0}}}
+    }
+
+    # Рост fast втрое, но на 0.02 мс - шум; slow вырос на 40%
+    regressions = compare(current, baseline, threshold=0.25, min_delta_ms=0.05)
+    assert [r["method"] for r in regressions] == ["slow"]
+    assert compare(current, baseline, threshold=0.5, min_delta_ms=0.05) == []
+    assert parse_scale("100k") == 100_000 and parse_scale("1M") == 1_000_000
@@ -1,8 +1,9 @@
 import os
+import sqlite3
 import tempfile
 
 import pytest
-from database import Database
+from database import Database, Profile, SearchCriteria
 
 
 @pytest.fixture
@@ -54,9 +55,10 @@ def test_save_profile(temp_db):
     # Проверяем, что профиль сохранен
     profile = temp_db.get_profile(123)
     assert profile is not None
-    assert profile["name"] == "Test Name"
-    assert profile["age"] == 20
-    assert profile["gender"] == "мужской"
+    assert profile.name == "Test Name"
+    assert profile.age == 20
+    assert profile.gender == "m"
+    assert profile.gender_label == "мужской"
 
 
 def test_get_profile_not_exists(temp_db):
@@ -109,6 +111,124 @@ def test_add_like(temp_db):
     assert like[2] == 456
 
 
+def test_like_detects_match(temp_db):
+    """Тест взаимного лайка: матч сохраняется для обоих пользователей"""
+    profile_data = {
+        "name": "Test Name",
+        "age": 20,
+        "gender": "мужской",
+        "faculty": "Информатики",
+        "course": 3,
+        "bio": "Тестовое описание",
+        "photo_id": "test_photo_id",
+    }
+    for user_id in (123, 456):
+        temp_db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        temp_db.save_profile(user_id, profile_data)
+
+    assert not temp_db.like(123, 456)
+    assert temp_db.get_matches_count(123) == 0
+
+    assert temp_db.like(456, 123)
+    assert temp_db.like(456, 123)  # повторный лайк не дублирует матч
+    assert [p.user_id for p in temp_db.get_mutual_likes(123)] == [456]
+    assert [p.user_id for p in temp_db.get_mutual_likes(456)] == [123]
+
+    temp_db.set_profile_active(456, False)
+    assert temp_db.get_matches_count(123) == 0
+
+
+def test_like_write_behind_matches_pending_like():
+    """Тест отложенной записи: взаимность видна до сброса, матч пишется вместе с лайком"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+    db = Database(db_path, write_behind=True, flush_rows=1000, flush_interval=60)
+
+    assert not db.like(1, 2)
+    assert db.like(2, 1)
+    assert db.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0] == 0
+
+    db.flush()
+    assert db.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0] == 2
+    db.close()
+    os.unlink(db_path)
+
+
+def test_user_stats_count_pending_match_once():
+    """Повторный лайк не добавляет к статистике уже сохраненный матч"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+    db = Database(db_path, write_behind=True, flush_rows=1000, flush_interval=60)
+    for user_id in (1, 2):
+        db.save_profile(
+            user_id,
+            {
+                "name": f"User {user_id}",
+                "age": 20,
+                "gender": "ж",
+                "faculty": "ИТ",
+                "course": 2,
+                "bio": "-",
+                "photo_id": "p",
+            },
+        )
+
+    db.like(1, 2)
+    db.like(2, 1)
+    db.like(2, 1)  # тот же матч в очереди дважды
+    assert db.get_user_stats(1)["matches"] == 1
+    db.flush()
+    db.like(2, 1)
+    assert db.get_user_stats(1)["matches"] == 1
+    assert db.get_user_stats(2)["matches"] == 1
+    db.close()
+    os.unlink(db_path)
+
+
+def test_profile_records_hold_only_selected_columns(temp_db):
+    """Список матчей читает только свои поля и начало описания"""
+    for user_id in (1, 2):
+        temp_db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        temp_db.save_profile(
+            user_id,
+            {
+                "name": f"User {user_id}",
+                "age": 20,
+                "gender": "ж",
+                "faculty": "ИТ",
+                "course": 2,
+                "bio": "а" * 200,
+                "photo_id": "p",
+            },
+        )
+    temp_db.like(1, 2)
+    temp_db.like(2, 1)
+
+    [match] = temp_db.get_mutual_likes(1)
+    assert match == Profile(2, "User 2", 20, None, "ИТ", 2, "а" * 51, None)
+    profile = temp_db.get_profile(2)
+    assert isinstance(profile, Profile)
+    assert len(profile.bio) == 200 and profile.photo_id == "p"
+
+
+def test_matches_backfilled_from_existing_likes():
+    """Тест переноса матчей из лайков, сохраненных до появления таблицы matches"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+    db = Database(db_path)
+    db.add_like(1, 2)
+    db.add_like(2, 1)
+    db.add_like(1, 3)
+    db.conn.execute("DROP TABLE matches")
+    db.close()
+
+    db = Database(db_path)
+    pairs = db.conn.execute("SELECT user_id, match_user_id FROM matches").fetchall()
+    assert sorted(pairs) == [(1, 2), (2, 1)]
+    db.close()
+    os.unlink(db_path)
+
+
 def test_get_total_users(temp_db):
     """Тест подсчета пользователей"""
     temp_db.add_user(123, "user1", "User 1")
@@ -139,3 +259,412 @@ def test_get_total_profiles(temp_db):
 
     total = temp_db.get_total_profiles()
     assert total == 2
+
+
+def test_counters_follow_profile_changes(temp_db):
+    """Тест счетчиков /stats: совпадают с COUNT(*) после любых изменений анкет"""
+    profile_data = {
+        "name": "Test Name",
+        "age": 20,
+        "gender": "мужской",
+        "faculty": "Информатики",
+        "course": 3,
+        "bio": "Тестовое описание",
+        "photo_id": "test_photo_id",
+    }
+    for user_id in (1, 2, 3):
+        temp_db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        temp_db.save_profile(user_id, profile_data)
+    temp_db.add_user(1, "user1", "User 1")  # повторная регистрация не считается
+
+    temp_db.set_profile_active(1, False)
+    temp_db.set_profile_active(1, False)
+    temp_db.block_user(2)
+    temp_db.save_profile(3, {**profile_data, "name": "New Name"})
+    temp_db.delete_profile(3)
+
+    assert temp_db.get_total_users() == 3
+    assert temp_db.get_total_profiles() == 2
+    assert temp_db.get_active_profiles_count() == 0
+
+    temp_db.save_profile(1, profile_data)  # пересохранение снова активирует анкету
+    assert temp_db.get_active_profiles_count() == 1
+    assert (
+        temp_db.get_active_profiles_count()
+        == temp_db.conn.execute(
+            "SELECT COUNT(*) FROM profiles WHERE active = 1"
+        ).fetchone()[0]
+    )
+
+
+def test_counters_seeded_on_existing_database():
+    """Тест засева счетчиков для базы, созданной до их появления"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+    db = Database(db_path)
+    db.add_user(1, "user1", "User 1")
+    db.add_user(2, "user2", "User 2")
+    db.conn.execute("DROP TABLE counters")
+    db.close()
+
+    db = Database(db_path)
+    assert db.get_total_users() == 2
+    db.add_user(3, "user3", "User 3")
+    assert db.get_total_users() == 3
+    db.close()
+    os.unlink(db_path)
+
+
+def test_gender_stored_as_code(temp_db):
+    """Тест хранения пола кодом: в таблице 'f', наружу - подпись"""
+    temp_db.add_user(1, "user1", "User 1")
+    temp_db.save_profile(
+        1,
+        {
+            "name": "Аня",
+            "age": 19,
+            "gender": " Женский ",
+            "faculty": "ИТ",
+            "course": 1,
+            "bio": "-",
+            "photo_id": "p",
+        },
+    )
+    temp_db.flush()
+    stored = temp_db.conn.execute(
+        "SELECT gender FROM profiles WHERE user_id = 1"
+    ).fetchone()
+    assert stored == ("f",)
+    assert temp_db.get_profile(1).gender_label == "женский"
+    assert [p.user_id for p in temp_db.get_profiles_by_gender(2, "f")] == [1]
+
+    with pytest.raises(ValueError):
+        temp_db.save_profile(1, {**temp_db.get_profile(1)._asdict(), "gender": "кот"})
+    with pytest.raises(sqlite3.IntegrityError):
+        temp_db.conn.execute("UPDATE profiles SET gender = 'женский' WHERE user_id = 1")
+
+
+def test_legacy_gender_values_migrated():
+    """Тест перевода текстового пола в коды для базы, созданной до CHECK"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE profiles (user_id INTEGER PRIMARY KEY, name TEXT NOT NULL,"
+        " age INTEGER NOT NULL, gender TEXT NOT NULL, faculty TEXT NOT NULL,"
+        " course INTEGER NOT NULL, bio TEXT NOT NULL, photo_id TEXT NOT NULL,"
+        " active INTEGER DEFAULT 1, blocked INTEGER DEFAULT 0)"
+    )
+    conn.executemany(
+        "INSERT INTO profiles (user_id, name, age, gender, faculty, course, bio, photo_id)"
+        " VALUES (?, 'n', 20, ?, 'f', 1, 'b', 'p')",
+        [(1, "Мужской"), (2, " женский "), (3, "Female"), (4, "???")],
+    )
+    conn.commit()
+    conn.close()
+
+    db = Database(db_path)
+    genders = db.conn.execute(
+        "SELECT user_id, gender FROM profiles ORDER BY user_id"
+    ).fetchall()
+    # Нераспознанное значение остается как есть, чтобы его можно было исправить вручную
+    assert genders == [(1, "m"), (2, "f"), (3, "f"), (4, "???")]
+    assert db.conn.execute("PRAGMA user_version").fetchone() == (1,)
+    # Ограничение на старой таблице держат триггеры
+    with pytest.raises(sqlite3.IntegrityError):
+        db.conn.execute("UPDATE profiles SET gender = 'женский' WHERE user_id = 1")
+    assert db.migrate_gender_values() == 0
+    db.close()
+    os.unlink(db_path)
+
+
+def test_get_feed_page_keyset(temp_db):
+    """Тест постраничной ленты по курсору user_id"""
+    for user_id in range(1, 8):
+        temp_db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        temp_db.save_profile(
+            user_id,
+            {
+                "name": f"User {user_id}",
+                "age": 20,
+                "gender": "женский" if user_id % 2 else "мужской",
+                "faculty": "Информатики",
+                "course": 3,
+                "bio": "Тестовое описание",
+                "photo_id": "test_photo_id",
+            },
+        )
+    temp_db.set_profile_active(5, False)
+
+    first = temp_db.get_feed_page(1, limit=3)
+    assert [p.user_id for p in first] == [2, 3, 4]
+
+    second = temp_db.get_feed_page(1, after_user_id=first[-1].user_id, limit=3)
+    assert [p.user_id for p in second] == [6, 7]
+
+    women = temp_db.get_feed_page(1, gender="женский", limit=10)
+    assert [p.user_id for p in women] == [3, 7]
+
+
+def test_feed_filtered_by_search_criteria(temp_db):
+    """Тест ленты по критериям: пол, факультет, курсы и возраст в одном запросе"""
+    for user_id in range(1, 21):
+        temp_db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        temp_db.save_profile(
+            user_id,
+            {
+                "name": f"User {user_id}",
+                "age": 17 + user_id % 6,
+                "gender": "женский" if user_id % 2 else "мужской",
+                "faculty": "ИТ" if user_id % 3 else "Экономика",
+                "course": 1 + user_id % 4,
+                "bio": "-",
+                "photo_id": "p",
+            },
+        )
+
+    criteria = SearchCriteria(
+        gender="женский", faculty=" ИТ ", courses=(4, 2, 2), age_min=18, age_max=20
+    )
+    assert (
+        criteria.gender == "f"
+        and criteria.faculty == "ИТ"
+        and criteria.courses == (2, 4)
+    )
+    expected = [
+        p.user_id
+        for p in temp_db.get_all_profiles(0)
+        if p.gender == "f"
+        and p.faculty == "ИТ"
+        and p.course in (2, 4)
+        and 18 <= p.age <= 20
+    ]
+    assert expected
+    assert temp_db.get_feed_ids(100, limit=50, criteria=criteria) == expected
+    assert (
+        temp_db.get_feed_ids(100, expected[0], limit=50, criteria=criteria)
+        == expected[1:]
+    )
+
+    temp_db.save_search_criteria(100, criteria)
+    assert temp_db.get_search_criteria(100) == criteria
+    assert temp_db.get_search_criteria(101) is None
+    assert temp_db.get_faculties() == ["ИТ", "Экономика"]
+
+    with pytest.raises(ValueError):
+        SearchCriteria(age_min=22, age_max=18)
+
+
+def test_search_profiles_full_text(temp_db):
+    """Тест поиска по словам: префиксы, "ё", ранжирование и синхронизация триггерами"""
+    bios = {
+        1: ("Пётр", "Играю на гитаре, люблю ёлки"),
+        2: ("Аня", "Походы и фотография"),
+        3: ("Гитарист Олег", "Гитара, походы"),
+    }
+    for user_id, (name, bio) in bios.items():
+        temp_db.add_user(user_id, f"user{user_id}", name)
+        temp_db.save_profile(
+            user_id,
+            {
+                "name": name,
+                "age": 20,
+                "gender": "м",
+                "faculty": "ИТ",
+                "course": 1,
+                "bio": bio,
+                "photo_id": "p",
+            },
+        )
+
+    def found(text, viewer_id=0, **kwargs):
+        return [p.user_id for p in temp_db.search_profiles(viewer_id, text, **kwargs)]
+
+    # Совпадение в имени весит больше, чем в описании
+    assert found("гитар") == [3, 1]
+    assert found("гитар", offset=1, limit=1) == [1]
+    assert found("елки") == found("ЁЛКИ") == [1]
+    assert found("петр") == [1]
+    assert found("гитар походы") == [3]
+    assert found("гитар", viewer_id=3) == [1]
+    assert found("!!!") == []
+    # Операторы FTS5 во вводе - обычные слова
+    assert found('походы OR "') == []
+
+    temp_db.save_profile(1, {**temp_db.get_profile(1)._asdict(), "bio": "Шахматы"})
+    assert found("гитар") == [3]
+    assert found("шахм") == [1]
+    temp_db.set_profile_active(3, False)
+    assert found("походы") == [2]
+    temp_db.delete_profile(2)
+    assert found("походы") == []
+
+
+def test_search_index_built_for_existing_profiles():
+    """Тест заполнения полнотекстового индекса для базы, созданной до него"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+    db = Database(db_path)
+    db.add_user(1, "user1", "User 1")
+    db.save_profile(
+        1,
+        {
+            "name": "Маша",
+            "age": 20,
+            "gender": "ж",
+            "faculty": "ИТ",
+            "course": 1,
+            "bio": "Йога и кофе",
+            "photo_id": "p",
+        },
+    )
+    for trigger in ("insert", "delete", "update"):
+        db.conn.execute(f"DROP TRIGGER trg_profiles_fts_{trigger}")
+    db.conn.execute("DROP TABLE profiles_fts")
+    db.close()
+
+    db = Database(db_path)
+    assert [p.user_id for p in db.search_profiles(0, "йога")] == [1]
+    db.close()
+    os.unlink(db_path)
+
+
+def test_record_view_excludes_from_feed(temp_db):
+    """Тест исключения оцененных анкет из ленты"""
+    for user_id in range(1, 5):
+        temp_db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        temp_db.save_profile(
+            user_id,
+            {
+                "name": f"User {user_id}",
+                "age": 20,
+                "gender": "женский",
+                "faculty": "Информатики",
+                "course": 3,
+                "bio": "Тестовое описание",
+                "photo_id": "test_photo_id",
+            },
+        )
+
+    temp_db.record_view(1, 2, "like")
+    temp_db.record_view(1, 3, "skip")
+    # Просмотры копятся в буфере до пакетной записи
+    assert [p.user_id for p in temp_db.get_all_profiles(1)] == [2, 3, 4]
+
+    temp_db.flush()
+    assert temp_db.get_feed_ids(1) == [4]
+    assert [p.user_id for p in temp_db.get_all_profiles(1)] == [4]
+    assert [p.user_id for p in temp_db.get_profiles_by_gender(1, "женский")] == [4]
+    # Чужие просмотры на ленту не влияют
+    assert temp_db.get_feed_ids(2) == [1, 3, 4]
+
+
+def test_skip_does_not_overwrite_like(temp_db):
+    """Тест приоритета лайка над пропуском"""
+    temp_db.record_view(1, 2, "like")
+    temp_db.record_view(1, 2, "skip")
+    temp_db.flush()
+
+    cursor = temp_db.conn.cursor()
+    cursor.execute("SELECT action FROM views WHERE viewer_id = 1 AND target_id = 2")
+    assert cursor.fetchone()[0] == "like"
+
+
+def test_record_view_batches_writes(temp_db):
+    """Тест пакетной записи просмотров"""
+    temp_db.flush_interval = 60
+    for target_id in range(temp_db.flush_rows):
+        temp_db.record_view(1, target_id, "skip")
+
+    cursor = temp_db.conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM views")
+    assert cursor.fetchone()[0] == temp_db.flush_rows
+
+
+def test_write_behind_read_your_writes():
+    """Тест отложенной записи: данные видны до сброса и попадают в базу одним коммитом"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+    db = Database(db_path, write_behind=True, flush_rows=1000, flush_interval=60)
+
+    db.add_user(1, "user1", "User 1")
+    db.add_like(1, 2)
+    db.add_complaint(1, 2, "spam")
+
+    # Взаимный лайк и число жалоб учитывают очередь
+    assert db.has_like(1, 2)
+    assert not db.has_like(2, 1)
+    assert db.get_complaints_count(2) == 1
+    assert db.get_user_likes_count(1) == 0
+
+    db.flush()
+    assert db.get_user_likes_count(1) == 1
+    assert db.get_complaints_count(2) == 1
+    assert db.get_total_users() == 1
+
+    db.add_like(2, 1)
+    db.close()
+    reopened = Database(db_path)
+    assert reopened.has_like(2, 1)
+    reopened.close()
+    os.unlink(db_path)
+
+
+def test_pragmas_applied_and_reported():
+    """Тест применения настроек SQLite при подключении"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(
+            os.path.join(tmp, "tuned.db"),
+            pragmas={
+                "journal_mode": "WAL",
+                "synchronous": "NORMAL",
+                "cache_size": -4096,
+                "temp_store": "MEMORY",
+                "busy_timeout": 1000,
+            },
+        )
+        pragmas = db.get_pragmas()
+        db.close()
+
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == "NORMAL"
+    assert pragmas["cache_size"] == -4096
+    assert pragmas["temp_store"] == "MEMORY"
+    assert pragmas["busy_timeout"] == 1000
+
+
+def test_pragmas_reject_unknown_values():
+    """Тест защиты от произвольного SQL в настройках"""
+    with pytest.raises(ValueError):
+        Database(":memory:", pragmas={"journal_mode": "WAL; DROP TABLE users"})
+    with pytest.raises(ValueError):
+        Database(":memory:", pragmas={"foreign_keys": 1})
+
+
+def test_write_behind_keeps_rows_when_database_is_locked():
+    """Сброс во время чужой блокировки не теряет очередь и не ломает запись"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+    db = Database(
+        db_path,
+        write_behind=True,
+        flush_rows=2,
+        flush_interval=60,
+        pragmas={"busy_timeout": 0},
+    )
+    db.add_user(1, "user1", "User 1")
+    locker = sqlite3.connect(db_path)
+    locker.execute("BEGIN EXCLUSIVE")
+
+    db.add_like(1, 2)  # сброс по flush_rows падает, но ошибка не доходит сюда
+    with pytest.raises(sqlite3.OperationalError):
+        db.flush()
+    assert db.has_like(1, 2)
+
+    locker.rollback()
+    locker.close()
+    db.flush()
+    assert db.get_user_likes_count(1) == 1
+    assert db.get_total_users() == 1
+    db.close()
+    os.unlink(db_path)
@@ -0,0 +1,40 @@
+import argparse
+import os
+import tempfile
+
+import pytest
+from tools.loadtest import LoadTest
+
+
+@pytest.mark.asyncio
+async def test_loadtest_drives_real_handlers(capsys):
+    """Сценарий нагрузочного теста проходит через настоящие обработчики без ошибок"""
+    args = argparse.Namespace(
+        users=6,
+        swipes=3,
+        like_rate=1.0,
+        concurrency=6,
+        api_delay=0.0,
+        readers=1,
+        write_behind=False,
+        storage="default",
+        notify_rate=1000.0,
+        drain_timeout=1.0,
+        metrics=True,
+    )
+    loadtest = LoadTest(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        await loadtest.run(os.path.join(tmp, "loadtest.db"))
+
+    assert loadtest.errors == 0
+    for handler in (
+        "cmd_start",
+        "process_photo",
+        "process_like",
+        "next_profile",
+        "show_matches",
+    ):
+        assert loadtest.handler_stats[handler], handler
+    assert loadtest.db_stats["like"]
+    assert loadtest.api.calls["sendPhoto"] > 0
+    assert "апд/с" in capsys.readouterr().out
@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+import queue
+import tempfile
+
+import pytest
+from config_data.config import Logging, parse_sampling
+from config_data.logging_config import (
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    SamplingFilter,
+    setup_logging,
+)
+
+
+def make_record(
+    name: str, level: int = logging.INFO, msg: str = "клик %s", *args, **extra
+):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args or ("like_1",), None)
+    record.__dict__.update(extra)
+    return record
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_json_formatter_includes_extra_fields():
+    line = JsonFormatter().format(
+        make_record("middleware", user_id=7, event="callback")
+    )
+    entry = json.loads(line)
+    assert entry["msg"] == "клик like_1"
+    assert entry["logger"] == "middleware"
+    assert entry["user_id"] == 7 and entry["event"] == "callback"
+    assert "args" not in entry
+
+
+def test_sampling_keeps_share_of_info_and_all_warnings():
+    sampler = SamplingFilter({"middleware": 0.1})
+    passed = sum(
+        sampler.filter(make_record("middleware.logging_middleware"))
+        for _ in range(1000)
+    )
+    assert passed == 100
+    assert sampler.filter(make_record("middleware", logging.WARNING))
+    assert all(
+        sampler.filter(make_record("handlers.search_handlers")) for _ in range(10)
+    )
+    assert parse_sampling("middleware=0.1, handlers.search_handlers=1") == {
+        "middleware": 0.1,
+        "handlers.search_handlers": 1.0,
+    }
+    with pytest.raises(ValueError):
+        parse_sampling("middleware=2")
+
+
+def test_queue_handler_drops_when_full():
+    handler = NonBlockingQueueHandler(queue.Queue(2))
+    for _ in range(5):
+        handler.handle(make_record("bot"))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    # Аргументы подставляются уже в потоке журнала
+    assert handler.queue.get_nowait().args == ("like_1",)
+
+
+def test_setup_logging_writes_json_and_rotates(restore_root_logger):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bot.log")
+        listener = setup_logging(
+            Logging(path=path, max_bytes=2000, backup_count=2, sampling={"noisy": 0.5})
+        )
+        logger = logging.getLogger("noisy")
+        for i in range(100):
+            logger.info("User %s clicked: %s", i, "next_1", extra={"user_id": i})
+        listener.stop()
+
+        assert os.path.exists(path + ".1") and os.path.exists(path + ".2")
+        assert not os.path.exists(path + ".3")
+        with open(path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f]
+        assert entries[-1]["msg"] == "User 99 clicked: next_1"
+        # Выборка 0.5: в журнал попали только нечетные записи
+        assert all(entry["user_id"] % 2 == 1 for entry in entries)
@@ -0,0 +1,135 @@
+import json
+import os
+import tempfile
+import time
+
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.methods import SendMessage
+from aiogram.types import Message, Update
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from async_database import AsyncDatabase
+from middleware import APIMetricsMiddleware, HandlerMetricsMiddleware, MetricsMiddleware
+from services.metrics import BotMetrics, Registry, add_metrics_route
+
+SAMPLE_UPDATES = os.path.join(
+    os.path.dirname(__file__), "..", "tools", "sample_updates.jsonl"
+)
+
+
+def message_update(update_id: int, text: str) -> Update:
+    with open(SAMPLE_UPDATES, encoding="utf-8") as f:
+        raw = json.loads(f.readline())
+    raw["update_id"] = update_id
+    raw["message"]["text"] = text
+    raw["message"].pop("entities", None)
+    return Update.model_validate(raw)
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Запросы", ("method",))
+    latency = registry.histogram(
+        "latency_seconds", "Задержка", ("method",), buckets=(0.1, 1)
+    )
+    requests.inc('send"Message')
+    latency.observe(0.05, "get")
+    latency.observe(0.5, "get")
+    latency.observe(5, "get")
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{method="send\\"Message"} 1' in text
+    assert 'latency_seconds_bucket{method="get",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{method="get",le="1"} 2' in text
+    assert 'latency_seconds_bucket{method="get",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{method="get"} 3' in text
+
+    with pytest.raises(ValueError):
+        requests.inc()
+
+
+@pytest.mark.asyncio
+async def test_update_and_handler_metrics():
+    """Время обработчиков, ошибки и время БД на апдейт"""
+    metrics = BotMetrics()
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabase(os.path.join(tmp, "test.db"), observer=metrics.observe_db)
+        dp = Dispatcher()
+        dp.update.outer_middleware(MetricsMiddleware(metrics))
+        dp.message.middleware(HandlerMetricsMiddleware(metrics))
+        router = Router()
+
+        @router.message(F.text == "stats")
+        async def show_stats(message: Message):
+            await db.get_total_users()
+            await db.get_user_stats(message.from_user.id)
+
+        @router.message(F.text == "boom")
+        async def broken(message: Message):
+            raise RuntimeError("boom")
+
+        dp.include_router(router)
+        bot = Bot(token="42:TEST")
+        try:
+            await dp.feed_update(bot, message_update(1, "stats"))
+            with pytest.raises(RuntimeError):
+                await dp.feed_update(bot, message_update(2, "boom"))
+        finally:
+            await bot.session.close()
+            await db.close()
+
+    assert metrics.updates.value("message") == 2
+    assert metrics.updates_in_flight.value() == 0
+    assert metrics.handler_latency.count("show_stats") == 1
+    assert metrics.handler_errors.value("broken", "RuntimeError") == 1
+    assert metrics.db_latency.count("get_total_users") == 1
+    # Время БД первого апдейта - сумма двух вызовов, у второго апдейта - ноль
+    assert metrics.update_db_time.count() == 2
+    assert metrics.update_db_time.sum() == pytest.approx(
+        metrics.db_latency.sum("get_total_users")
+        + metrics.db_latency.sum("get_user_stats")
+    )
+
+
+@pytest.mark.asyncio
+async def test_api_metrics_and_endpoint():
+    metrics = BotMetrics()
+    middleware = APIMetricsMiddleware(metrics)
+
+    async def ok(bot, method):
+        return True
+
+    async def fail(bot, method):
+        raise ConnectionError("нет сети")
+
+    method = SendMessage(chat_id=1, text="привет")
+    await middleware(ok, None, method)
+    with pytest.raises(ConnectionError):
+        await middleware(fail, None, method)
+    assert metrics.api_requests.value("SendMessage") == 2
+    assert metrics.api_errors.value("SendMessage", "ConnectionError") == 1
+
+    app = web.Application()
+    add_metrics_route(app, metrics)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    try:
+        response = await client.get("/metrics")
+        assert response.status == 200
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert 'bot_api_requests_total{method="SendMessage"} 2' in await response.text()
+    finally:
+        await client.close()
+
+
+def test_recording_is_cheap():
+    metrics = BotMetrics()
+    observations = 100_000
+    started = time.perf_counter()
+    for i in range(observations):
+        metrics.handler_latency.observe(0.003, "process_like")
+        metrics.updates.inc("message")
+    per_update = (time.perf_counter() - started) / observations
+    assert per_update < 0.00002
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from services.notifications import NotificationQueue, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeBot:
+    """Записывает отправленные сообщения; errors - исключения для первых вызовов"""
+
+    def __init__(self, errors=()):
+        self.sent = []
+        self.errors = list(errors)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+def test_token_bucket_spaces_out_bursts():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+    clock.now = 10
+    assert bucket.wait_time() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.wait_time() == pytest.approx(0.5)
+
+
+@pytest.mark.asyncio
+async def test_queue_drains_on_close():
+    bot = FakeBot()
+    queue = NotificationQueue(bot, workers=2, global_rate=1000, per_chat_rate=1000)
+    for chat_id in range(20):
+        queue.send_message(chat_id, f"hello {chat_id}")
+
+    await queue.close()
+    assert sorted(bot.sent) == sorted((i, f"hello {i}") for i in range(20))
+    assert queue.sent == 20
+
+
+@pytest.mark.asyncio
+async def test_queue_retries_after_flood_limit():
+    method = SendMessage(chat_id=1, text="hi")
+    bot = FakeBot(errors=[TelegramRetryAfter(method, "Flood control", retry_after=0)])
+    queue = NotificationQueue(bot, workers=1, global_rate=1000, per_chat_rate=1000)
+
+    queue.send_message(1, "hi")
+    await queue.close()
+    assert bot.sent == [(1, "hi")]
+
+
+@pytest.mark.asyncio
+async def test_queue_does_not_retry_blocked_user():
+    method = SendMessage(chat_id=1, text="hi")
+    bot = FakeBot(
+        errors=[TelegramForbiddenError(method, "bot was blocked by the user")]
+    )
+    queue = NotificationQueue(bot, workers=1, global_rate=1000, per_chat_rate=1000)
+
+    queue.send_message(1, "hi")
+    queue.send_message(2, "hi")
+    await queue.close()
+    assert bot.sent == [(2, "hi")]
+    assert queue.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_per_chat_limit_does_not_block_other_chats():
+    bot = FakeBot()
+    queue = NotificationQueue(bot, workers=2, global_rate=1000, per_chat_rate=5)
+    queue.send_message(1, "first")
+    queue.send_message(1, "second")  # второе сообщение в чат 1 ждет ~0.2 с
+    queue.send_message(2, "other")
+
+    await asyncio.sleep(0.05)
+    assert (2, "other") in bot.sent
+    assert (1, "second") not in bot.sent
+    await queue.close()
+    assert (1, "second") in bot.sent
+
+
+@pytest.mark.asyncio
+async def test_hot_chat_does_not_hold_workers():
+    bot = FakeBot()
+    queue = NotificationQueue(bot, workers=1, global_rate=1000, per_chat_rate=10)
+    for i in range(5):
+        queue.send_message(1, f"like {i}")  # чату 1 нужно ~0.4 с на все лайки
+    queue.send_message(2, "other")
+
+    await asyncio.sleep(0.05)
+    # Единственный отправитель не ждет чат 1 и сразу отправляет в чат 2
+    assert (2, "other") in bot.sent
+    await queue.close()
+    assert [text for chat_id, text in bot.sent if chat_id == 1] == [
+        f"like {i}" for i in range(5)
+    ]
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import Update
+from async_database import AsyncDatabase
+from handlers.profile_handlers import setup_profile_handlers
+from services.services import CandidateQueue
+
+USER = {"id": 7, "is_bot": False, "first_name": "Test"}
+CHAT = {"id": 7, "type": "private"}
+
+
+class CaptureRequests(BaseRequestMiddleware):
+    """Вместо запроса к Telegram запоминает отправленные тексты"""
+
+    def __init__(self):
+        self.texts = []
+
+    async def __call__(self, make_request, bot, method):
+        if getattr(method, "text", None):
+            self.texts.append(method.text)
+        return True
+
+
+def message_update(update_id: int, text: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 1700000000,
+                "chat": CHAT,
+                "from": USER,
+                "text": text,
+            },
+        }
+    )
+
+
+def callback_update(update_id: int, data: str) -> Update:
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": USER,
+                "chat_instance": "1",
+                "data": data,
+                "message": {"message_id": 1, "date": 1700000000, "chat": CHAT},
+            },
+        }
+    )
+
+
+@pytest.fixture
+def legacy_db_path():
+    """База, созданная до CHECK: пол анкеты 7 миграция не распознает"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "test.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "CREATE TABLE profiles (user_id INTEGER PRIMARY KEY, name TEXT NOT NULL,"
+            " age INTEGER NOT NULL, gender TEXT NOT NULL, faculty TEXT NOT NULL,"
+            " course INTEGER NOT NULL, bio TEXT NOT NULL, photo_id TEXT NOT NULL,"
+            " active INTEGER DEFAULT 1, blocked INTEGER DEFAULT 0)"
+        )
+        conn.execute(
+            "INSERT INTO profiles (user_id, name, age, gender, faculty, course, bio, photo_id)"
+            " VALUES (7, 'Old', 20, 'другое', 'ИТ', 1, 'О себе', 'photo')"
+        )
+        conn.commit()
+        conn.close()
+        yield db_path
+
+
+@pytest.mark.asyncio
+async def test_edit_reprompts_gender_and_keeps_pending_change(legacy_db_path):
+    db = AsyncDatabase(legacy_db_path, readers=1)
+    dp = Dispatcher()
+    router = Router()
+    setup_profile_handlers(router, db, CandidateQueue(db))
+    dp.include_router(router)
+    capture = CaptureRequests()
+    bot = Bot(token="42:TEST")
+    bot.session.middleware(capture)
+    try:
+        await dp.feed_update(bot, callback_update(1, "edit_name"))
+        assert capture.texts[-1] == "Введите новое имя:"
+
+        # Пол не сохранить - правка имени ждет, пока пользователь выберет пол
+        await dp.feed_update(bot, message_update(2, "Новое имя"))
+        assert "Выберите его заново" in capture.texts[-1]
+        assert (await db.get_profile(7)).name == "Old"
+
+        await dp.feed_update(bot, message_update(3, "Женский"))
+        assert capture.texts[-1] == "Пол обновлен!"
+        profile = await db.get_profile(7)
+        assert (profile.name, profile.gender) == ("Новое имя", "f")
+
+        # Обычная правка после этого сохраняется сразу
+        await dp.feed_update(bot, callback_update(4, "edit_bio"))
+        await dp.feed_update(bot, message_update(5, "Новое описание"))
+        assert capture.texts[-1] == "Описание обновлено!"
+        assert (await db.get_profile(7)).bio == "Новое описание"
+    finally:
+        await bot.session.close()
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_edit_without_profile_asks_to_create_one(legacy_db_path):
+    db = AsyncDatabase(legacy_db_path, readers=1)
+    await db.delete_profile(7)
+    dp = Dispatcher()
+    router = Router()
+    setup_profile_handlers(router, db, CandidateQueue(db))
+    dp.include_router(router)
+    capture = CaptureRequests()
+    bot = Bot(token="42:TEST")
+    bot.session.middleware(capture)
+    try:
+        await dp.feed_update(bot, callback_update(1, "edit_age"))
+        await dp.feed_update(bot, message_update(2, "21"))
+        assert capture.texts[-1] == "❌ У тебя еще нет анкеты. Создай ее!"
+    finally:
+        await bot.session.close()
+        await db.close()
@@ -0,0 +1,114 @@
+import pytest
+from database import Database, SearchCriteria
+
+
+@pytest.fixture
+def memory_db():
+    db = Database(":memory:")
+    yield db
+    db.close()
+
+
+def capture_statements(db: Database, call) -> list[str]:
+    """Выполняет call и возвращает выполненные им SELECT с подставленными параметрами"""
+    statements = []
+    db.conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        db.conn.set_trace_callback(None)
+    return [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+
+def query_plan(db: Database, sql: str) -> list[str]:
+    return [row[3] for row in db.conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+
+HOT_QUERIES = {
+    "get_user_likes_count": lambda db: db.get_user_likes_count(1),
+    "get_user_likes_received_count": lambda db: db.get_user_likes_received_count(1),
+    "get_complaints_count": lambda db: db.get_complaints_count(1),
+    "has_like": lambda db: db.has_like(2, 1),
+    "get_mutual_likes": lambda db: db.get_mutual_likes(1),
+    "get_matches_count": lambda db: db.get_matches_count(1),
+    "get_user_stats": lambda db: db.get_user_stats(1),
+    "get_all_profiles": lambda db: db.get_all_profiles(1),
+    "get_profiles_by_gender": lambda db: db.get_profiles_by_gender(1, "женский"),
+    "get_feed_page": lambda db: db.get_feed_page(1, after_user_id=10, limit=5),
+    "get_feed_page_by_gender": lambda db: db.get_feed_page(1, 10, "женский", 5),
+    "get_feed_ids": lambda db: db.get_feed_ids(1, after_user_id=10, limit=20),
+    "get_feed_ids_by_criteria": lambda db: db.get_feed_ids(
+        1, 10, limit=20, criteria=SearchCriteria("f", "ИТ", (1, 2), 18, 22)
+    ),
+    "get_search_criteria": lambda db: db.get_search_criteria(1),
+    "get_active_profiles_count": lambda db: db.get_active_profiles_count(),
+    "get_profile": lambda db: db.get_profile(1),
+}
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_index(memory_db, name):
+    """Горячие запросы не должны откатываться к полному сканированию таблицы"""
+    statements = capture_statements(memory_db, lambda: HOT_QUERIES[name](memory_db))
+    assert statements, f"{name} не выполнил ни одного SELECT"
+
+    for sql in statements:
+        plan = query_plan(memory_db, sql)
+        scans = [step for step in plan if step.startswith("SCAN")]
+        assert not scans, f"{name}: полное сканирование {scans} в плане {plan}"
+
+
+def test_mutual_likes_read_from_matches(memory_db):
+    """Матчи читаются диапазоном по ключу matches, без самосоединения likes"""
+    [sql] = capture_statements(memory_db, lambda: memory_db.get_mutual_likes(1))
+    plan = query_plan(memory_db, sql)
+    assert plan[0].startswith("SEARCH m USING PRIMARY KEY (user_id=?)"), plan
+    assert not any("likes" in step for step in plan), plan
+
+
+@pytest.mark.parametrize("gender", [None, "женский"])
+def test_feed_page_is_range_scan(memory_db, gender):
+    """Страница ленты читается диапазоном по курсору, без сортировки всех анкет"""
+    [sql] = capture_statements(
+        memory_db, lambda: memory_db.get_feed_page(1, 10, gender, 5)
+    )
+    plan = query_plan(memory_db, sql)
+    assert any("rowid>?" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_gender_filter_uses_index_range(memory_db):
+    """Фильтр по полу - диапазон по (active, gender, rowid), без выражения над столбцом"""
+    [sql] = capture_statements(
+        memory_db, lambda: memory_db.get_feed_page(1, 10, "f", 5)
+    )
+    plan = query_plan(memory_db, sql)
+    assert any(
+        "idx_profiles_active_gender (active=? AND gender=? AND rowid>?)" in step
+        for step in plan
+    ), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_criteria_feed_uses_search_index(memory_db):
+    """Пол и факультет - равенства по idx_profiles_search, дальше курсор по user_id"""
+    criteria = SearchCriteria(gender="m", faculty="ИТ", courses=(3,), age_min=18)
+    [sql] = capture_statements(
+        memory_db, lambda: memory_db.get_feed_ids(1, 10, limit=20, criteria=criteria)
+    )
+    plan = query_plan(memory_db, sql)
+    assert any(
+        "idx_profiles_search (active=? AND faculty=? AND gender=? AND rowid>?)" in step
+        for step in plan
+    ), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_text_search_uses_fts_index(memory_db):
+    """Поиск по словам идет по индексу FTS5, анкеты читаются по первичному ключу"""
+    [sql] = capture_statements(
+        memory_db, lambda: memory_db.search_profiles(1, "гитара")
+    )
+    plan = query_plan(memory_db, sql)
+    assert any("profiles_fts VIRTUAL TABLE INDEX" in step for step in plan), plan
+    assert any("USING INTEGER PRIMARY KEY (rowid=?)" in step for step in plan), plan
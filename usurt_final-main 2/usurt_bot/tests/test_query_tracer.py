@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import tempfile
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import Update
+from async_database import AsyncDatabase
+from database import Database
+from handlers.admin_handlers import setup_admin_handlers
+from services.query_tracer import QueryTracer, normalize
+
+SAMPLE_UPDATES = os.path.join(
+    os.path.dirname(__file__), "..", "tools", "sample_updates.jsonl"
+)
+
+PROFILE = {
+    "name": "Test",
+    "age": 20,
+    "gender": "мужской",
+    "faculty": "ИТ",
+    "course": 2,
+    "bio": "О себе",
+    "photo_id": "photo",
+}
+
+
+class CaptureRequests(BaseRequestMiddleware):
+    """Вместо запроса к Telegram запоминает отправленные тексты"""
+
+    def __init__(self):
+        self.texts = []
+
+    async def __call__(self, make_request, bot, method):
+        self.texts.append(method.text)
+        return True
+
+
+def command_update(user_id: int, text: str) -> Update:
+    with open(SAMPLE_UPDATES, encoding="utf-8") as f:
+        raw = json.loads(f.readline())
+    raw["message"]["from"]["id"] = raw["message"]["chat"]["id"] = user_id
+    raw["message"]["text"] = text
+    raw["message"]["entities"][0]["length"] = len(text.split()[0])
+    return Update.model_validate(raw)
+
+
+@pytest.fixture
+def db_path():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield os.path.join(tmp, "test.db")
+
+
+def test_normalize_strips_literals_and_whitespace():
+    sql = "SELECT *\n  FROM profiles WHERE age > 18 AND name = 'Аня' AND user_id IN (?, ?, ?)"
+    assert normalize(sql) == (
+        "SELECT * FROM profiles WHERE age > ? AND name = ? AND user_id IN (?, ...)"
+    )
+    assert normalize("SELECT 1 FROM idx_2") == "SELECT ? FROM idx_2"
+
+
+def test_tracer_counts_calls_time_and_rows(db_path):
+    tracer = QueryTracer(slow_threshold=10)
+    db = Database(db_path, tracer=tracer)
+    for user_id in range(1, 6):
+        db.add_user(user_id, f"user{user_id}", "User")
+        db.save_profile(user_id, PROFILE)
+    assert len(db.get_all_profiles(exclude_user_id=1)) == 4
+    db.get_profile(2)
+    db.get_profile(3)
+    db.close()
+
+    stats = {s.query: s for s in tracer.top(100)}
+    all_profiles = next(
+        s for q, s in stats.items() if "active = ?" in q and "user_id !=" in q
+    )
+    assert all_profiles.calls == 1 and all_profiles.rows == 4
+    profile = next(
+        s for q, s in stats.items() if q.endswith("FROM profiles WHERE user_id = ?")
+    )
+    assert profile.calls == 2 and profile.rows == 2
+    assert profile.total_time >= profile.max_time > 0
+    assert (
+        stats[
+            normalize(
+                "INSERT OR IGNORE INTO users (user_id, username, full_name) VALUES (?, ?, ?)"
+            )
+        ].rows
+        == 5
+    )
+    assert tracer.top(1)[0].total_time == max(s.total_time for s in stats.values())
+
+
+def test_slow_queries_are_logged_with_plan(db_path, caplog):
+    tracer = QueryTracer(slow_threshold=0)
+    db = Database(db_path, tracer=tracer)
+    db.save_profile(1, PROFILE)
+    with caplog.at_level(logging.WARNING, logger="services.query_tracer"):
+        db.get_mutual_likes(1)
+    db.close()
+
+    record = next(r for r in caplog.records if "FROM matches m" in r.query)
+    assert "SEARCH m USING PRIMARY KEY" in record.getMessage()
+    assert tracer.slow_queries > 0
+    assert "SEARCH m USING PRIMARY KEY" in tracer.plan_for(record.query)
+
+
+@pytest.mark.asyncio
+async def test_top_queries_is_admin_only(db_path):
+    db = AsyncDatabase(db_path, tracer=QueryTracer())
+    await db.get_total_users()
+    dp = Dispatcher()
+    router = Router()
+    setup_admin_handlers(router, db, admin_ids=[1])
+    dp.include_router(router)
+    capture = CaptureRequests()
+    bot = Bot(token="42:TEST")
+    bot.session.middleware(capture)
+    try:
+        await dp.feed_update(bot, command_update(2, "/top_queries"))
+        assert capture.texts == []
+
+        await dp.feed_update(bot, command_update(1, "/top_queries 50"))
+        assert len(capture.texts) == 1
+        assert "SELECT value FROM counters WHERE name = ?" in capture.texts[0]
+    finally:
+        await bot.session.close()
+        await db.close()
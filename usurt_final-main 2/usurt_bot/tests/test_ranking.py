@@ -0,0 +1,181 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+import pytest_asyncio
+from async_database import AsyncDatabase
+from database import SearchCriteria
+from services.ranking import CandidateRanker, ProfileColumns, RankingWeights
+from services.services import CandidateQueue
+
+NOW = 1_000_000.0
+# Только совпадение факультета: остальные признаки не мешают проверкам
+FACULTY_ONLY = RankingWeights(
+    faculty=1.0, course=0.0, age=0.0, liked_you=3.0, recency=0.0, popularity=0.0
+)
+
+
+def make_rows() -> list:
+    # (user_id, age, course, faculty, gender, likes, last_active)
+    return [
+        (1, 20, 2, "ИТ", "f", 0, None),
+        (2, 21, 2, "ИТ", "m", 0, None),
+        (3, 19, 1, "Экономика", "f", 0, None),
+        (4, 22, 4, "ИТ", "f", 0, None),
+        (5, 20, 2, "Экономика", "m", 0, None),
+    ]
+
+
+def test_top_orders_by_score_then_user_id():
+    columns = ProfileColumns(make_rows(), FACULTY_ONLY, now=NOW)
+
+    # Факультет зрителя (ИТ) выше; при равной оценке - меньший user_id
+    assert columns.top(1, 10) == [2, 4, 3, 5]
+    assert columns.top(1, 2) == [2, 4]
+
+
+def test_top_applies_criteria_and_exclusions():
+    columns = ProfileColumns(make_rows(), FACULTY_ONLY, now=NOW)
+
+    assert columns.top(1, 10, SearchCriteria(gender="f")) == [4, 3]
+    assert columns.top(1, 10, SearchCriteria(courses=(1, 2), age_max=20)) == [3, 5]
+    assert columns.top(1, 10, SearchCriteria(faculty="Физика")) == []
+    assert columns.top(1, 10, exclude={2, 4}) == [3, 5]
+    # Лайк зрителю перевешивает факультет
+    assert columns.top(1, 10, liked_you=[5]) == [5, 2, 4, 3]
+
+
+def test_top_keeps_unrecognised_gender_out_of_gender_filter():
+    # Пол, который миграция не распознала, остается в базе как есть
+    rows = make_rows() + [(6, 20, 2, "ИТ", "другое", 0, None)]
+    columns = ProfileColumns(rows, FACULTY_ONLY, now=NOW)
+
+    assert columns.top(1, 10) == [2, 4, 6, 3, 5]
+    assert columns.top(1, 10, SearchCriteria(gender="f")) == [4, 3]
+    assert columns.top(1, 10, SearchCriteria(gender="m")) == [2, 5]
+
+
+def test_top_prefers_close_age_and_active_profiles():
+    rows = [
+        (1, 20, 2, "ИТ", "f", 0, None),
+        (2, 25, 2, "ИТ", "m", 0, None),
+        (3, 21, 2, "ИТ", "m", 0, None),
+        (4, 25, 2, "ИТ", "m", 0, NOW - 3600),
+    ]
+    columns = ProfileColumns(rows, RankingWeights(), now=NOW)
+
+    assert columns.top(1, 10) == [4, 3, 2]
+
+
+def test_apply_updates_inserts_and_removes_rows():
+    columns = ProfileColumns(make_rows(), FACULTY_ONLY, now=NOW)
+
+    columns.apply(
+        [(3, 19, 1, "ИТ", "f", 0, None), (9, 20, 2, "Физика", "m", 0, None)],
+        [3, 4, 9],
+    )
+
+    assert columns.ids.tolist() == [1, 2, 3, 5, 9]
+    assert columns.top(1, 10) == [2, 3, 5, 9]
+    assert columns.top(1, 10, SearchCriteria(faculty="Физика")) == [9]
+
+
+@pytest_asyncio.fixture
+async def ranked_db():
+    """Временная база с 6 анкетами: четные user_id - с факультета ИТ"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+
+    db = AsyncDatabase(db_path, readers=1)
+    for user_id in range(1, 7):
+        await db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        await db.save_profile(
+            user_id,
+            {
+                "name": f"User {user_id}",
+                "age": 20,
+                "gender": "женский" if user_id % 2 else "мужской",
+                "faculty": "ИТ" if user_id % 2 == 0 else "Экономика",
+                "course": 2,
+                "bio": "Тестовое описание",
+                "photo_id": "test_photo_id",
+            },
+        )
+    yield db
+
+    await db.close()
+    os.unlink(db_path)
+
+
+@pytest.mark.asyncio
+async def test_ranked_queue_serves_best_candidates_first(ranked_db):
+    ranker = CandidateRanker(ranked_db, FACULTY_ONLY)
+    queue = CandidateQueue(ranked_db, size=2, refill_at=1, ranker=ranker)
+
+    await ranked_db.add_like(5, 2)
+    await ranked_db.record_view(2, 3, "skip")
+    await ranked_db.flush()
+
+    result = []
+    while (candidate_id := await queue.pop(2, "all")) is not None:
+        result.append(candidate_id)
+    # Сначала лайкнувший, затем свой факультет; оцененная анкета 3 пропущена
+    assert result == [5, 4, 6, 1]
+
+
+@pytest.mark.asyncio
+async def test_ranker_picks_up_profile_changes(ranked_db):
+    ranker = CandidateRanker(ranked_db, FACULTY_ONLY)
+    assert await ranker.rank(2, SearchCriteria(), 2) == [4, 6]
+
+    profile = (await ranked_db.get_profile(5))._asdict()
+    await ranked_db.save_profile(5, {**profile, "gender": "мужской", "faculty": "ИТ"})
+    await ranked_db.set_profile_active(4, False)
+
+    assert await ranker.rank(2, SearchCriteria(), 2) == [5, 6]
+    assert len(ranker.columns) == 5
+
+
+@pytest.mark.asyncio
+async def test_changes_during_reload_survive_the_swap(ranked_db):
+    ranker = CandidateRanker(ranked_db, FACULTY_ONLY)
+    await ranker.load()
+    original = ranked_db.get_ranking_rows
+    read_done, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_full_read(user_ids=None):
+        rows = await original(user_ids)
+        if user_ids is None:
+            read_done.set()
+            await release.wait()
+        return rows
+
+    ranked_db.get_ranking_rows = slow_full_read
+    reload = asyncio.create_task(ranker.load())
+    await read_done.wait()
+
+    # Перезагрузка уже прочитала старую анкету 5, а правка попадает в старое хранилище
+    profile = (await ranked_db.get_profile(5))._asdict()
+    await ranked_db.save_profile(5, {**profile, "faculty": "ИТ"})
+    assert await ranker.rank(2, SearchCriteria(), 2) == [4, 5]
+
+    release.set()
+    await reload
+    assert await ranker.rank(2, SearchCriteria(), 2) == [4, 5]
+
+
+@pytest.mark.asyncio
+async def test_viewer_history_is_read_once_per_ttl(ranked_db):
+    ranker = CandidateRanker(ranked_db, FACULTY_ONLY)
+    calls = []
+    original = ranked_db.get_viewed_ids
+
+    async def counting_get_viewed_ids(viewer_id):
+        calls.append(viewer_id)
+        return await original(viewer_id)
+
+    ranked_db.get_viewed_ids = counting_get_viewed_ids
+    assert await ranker.rank(2, SearchCriteria(), 2) == [4, 6]
+    assert await ranker.rank(2, SearchCriteria(), 2, exclude={4, 6}) == [1, 3]
+    assert calls == [2]
@@ -0,0 +1,210 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+import pytest_asyncio
+from async_database import AsyncDatabase
+from database import SearchCriteria
+from services.cache import TTLCache
+from services.services import SAVED_CRITERIA, BloomFilter, CandidateQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_profile(user_id: int, gender: str) -> dict:
+    return {
+        "name": f"User {user_id}",
+        "age": 20,
+        "gender": gender,
+        "faculty": "Информатики",
+        "course": 3,
+        "bio": "Тестовое описание",
+        "photo_id": "test_photo_id",
+    }
+
+
+@pytest_asyncio.fixture
+async def feed_db():
+    """Временная база с 10 анкетами: нечетные user_id - женские"""
+    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
+        db_path = f.name
+
+    db = AsyncDatabase(db_path, readers=1)
+    for user_id in range(1, 11):
+        await db.add_user(user_id, f"user{user_id}", f"User {user_id}")
+        gender = "женский" if user_id % 2 else "мужской"
+        await db.save_profile(user_id, make_profile(user_id, gender))
+    yield db
+
+    await db.close()
+    os.unlink(db_path)
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" становится самым свежим
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_cache_expiry():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=5, clock=clock)
+    cache.set("a", 1)
+
+    clock.now = 4
+    assert cache.get("a") == 1
+    clock.now = 6
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=100, error_rate=0.01)
+    for user_id in range(0, 200, 2):
+        bloom.add(user_id)
+
+    assert all(user_id in bloom for user_id in range(0, 200, 2))
+    false_positives = sum(user_id in bloom for user_id in range(1, 10_001, 2))
+    assert false_positives < 200
+    assert bloom.is_full
+
+
+async def drain(queue: CandidateQueue, viewer_id: int, search_filter: str) -> list:
+    result = []
+    while (candidate_id := await queue.pop(viewer_id, search_filter)) is not None:
+        result.append(candidate_id)
+    return result
+
+
+@pytest.mark.asyncio
+async def test_candidate_queue_serves_filtered_feed_in_order(feed_db):
+    queue = CandidateQueue(feed_db, size=3, refill_at=1)
+
+    assert await drain(queue, 1, "all") == [2, 3, 4, 5, 6, 7, 8, 9, 10]
+    assert await drain(queue, 2, "f") == [1, 3, 5, 7, 9]
+
+
+@pytest.mark.asyncio
+async def test_candidate_queue_invalidation_hides_deactivated(feed_db):
+    queue = CandidateQueue(feed_db, size=5)
+    assert await queue.pop(1, "all") == 2
+
+    await feed_db.set_profile_active(3, False)
+    queue.invalidate(3)
+
+    # Очередь перестраивается с курсора последней показанной анкеты
+    assert await queue.pop(1, "all", cursor=2) == 4
+
+
+@pytest.mark.asyncio
+async def test_candidate_queue_invalidation_during_refill(feed_db):
+    queue = CandidateQueue(feed_db, size=3, refill_at=1)
+    first = asyncio.create_task(queue.pop(1, "all"))
+    await asyncio.sleep(0)  # пополнение ждет ответа базы
+
+    queue.invalidate(2)
+    await feed_db.set_profile_active(2, False)
+    # Пакет не выбрасывается целиком: убирается только скрытая анкета
+    assert await first == 3
+    assert 2 not in await drain(queue, 1, "all")
+
+
+@pytest.mark.asyncio
+async def test_candidate_queue_returns_reactivated_profile_behind_cursor(feed_db):
+    await feed_db.set_profile_active(3, False)
+    queue = CandidateQueue(feed_db, size=5)
+    assert await queue.pop(1, "all") == 2
+    assert await queue.pop(1, "all") == 4
+
+    # Анкета 3 уже позади курсора ленты, но после включения снова в ней
+    await feed_db.set_profile_active(3, True)
+    queue.invalidate(3)
+    assert sorted(await drain(queue, 1, "all")) == [3, 5, 6, 7, 8, 9, 10]
+
+
+@pytest.mark.asyncio
+async def test_candidate_queue_invalidation_keeps_other_queues(feed_db):
+    queue = CandidateQueue(feed_db, size=5)
+    assert await queue.pop(1, "all") == 2
+    assert await queue.pop(2, "f") == 1
+    calls = []
+    original = feed_db.get_feed_ids
+
+    async def counting_get_feed_ids(*args, **kwargs):
+        calls.append(args)
+        return await original(*args, **kwargs)
+
+    feed_db.get_feed_ids = counting_get_feed_ids
+    queue.invalidate(5)
+
+    assert await queue.pop(1, "all") == 3
+    assert await queue.pop(2, "f") == 3
+    assert await queue.pop(2, "f") == 7
+    assert calls == []
+
+
+@pytest.mark.asyncio
+async def test_candidate_queue_rebuilds_from_cursor_after_eviction(feed_db):
+    queue = CandidateQueue(feed_db, size=5, max_users=1)
+    assert await queue.pop(1, "all") == 2
+    assert await queue.pop(2, "all") == 1  # вытесняет очередь пользователя 1
+
+    assert await queue.pop(1, "all", cursor=2) == 3
+
+
+@pytest.mark.asyncio
+async def test_candidate_queue_skips_viewed_before_flush(feed_db):
+    queue = CandidateQueue(feed_db, size=5)
+    assert await queue.pop(1, "all") == 2
+
+    # Лайк еще в буфере базы, но фильтр Блума уже прячет анкету
+    await queue.record_view(1, 3, "like")
+    assert await queue.pop(1, "all") == 4
+
+    await feed_db.flush()
+    queue.reset(1, "all")
+    assert await queue.pop(1, "all") == 2
+    assert await queue.pop(1, "all") == 4
+
+
+@pytest.mark.asyncio
+async def test_candidate_queue_serves_bloom_false_positive(feed_db):
+    queue = CandidateQueue(feed_db, size=5)
+    assert await queue.pop(1, "all") == 2
+
+    # Ложное срабатывание: анкета 3 в фильтре, но пользователь ее не оценивал
+    seen = BloomFilter()
+    seen.add(3)
+    queue._seen.set(1, seen)
+    assert await queue.pop(1, "all") == 3
+
+    await queue.record_view(1, 4, "skip")
+    assert await queue.pop(1, "all") == 5
+
+
+@pytest.mark.asyncio
+async def test_candidate_queue_uses_saved_criteria(feed_db):
+    await feed_db.save_profile(4, {**make_profile(4, "мужской"), "course": 1})
+    await feed_db.save_profile(6, {**make_profile(6, "мужской"), "age": 25})
+    await feed_db.save_search_criteria(
+        1, SearchCriteria(gender="m", courses=(3,), age_max=22)
+    )
+    queue = CandidateQueue(feed_db, size=2, refill_at=1)
+
+    assert await drain(queue, 1, SAVED_CRITERIA) == [2, 8, 10]
+    # Без сохраненных критериев лента не фильтруется
+    assert await drain(queue, 3, SAVED_CRITERIA) == [1, 2, 4, 5, 6, 7, 8, 9, 10]
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import time
+
+import pytest
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from storage import BoundedMemoryStorage, SQLiteStorage
+
+KEY = StorageKey(bot_id=42, chat_id=1, user_id=1)
+
+
+class Form(StatesGroup):
+    name = State()
+    age = State()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def storage_path():
+    with tempfile.TemporaryDirectory() as tmp:
+        yield os.path.join(tmp, "fsm.db")
+
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(storage_path):
+    """Незаконченная анкета восстанавливается после перезапуска"""
+    storage = SQLiteStorage(storage_path)
+    await storage.set_state(KEY, Form.age)
+    await storage.update_data(KEY, {"name": "Аня"})
+    assert await storage.get_state(KEY) == Form.age.state
+    await storage.close()
+
+    storage = SQLiteStorage(storage_path)
+    assert await storage.get_state(KEY) == Form.age.state
+    assert await storage.get_data(KEY) == {"name": "Аня"}
+
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    await storage.close()
+
+    storage = SQLiteStorage(storage_path)
+    assert await storage.get_state(KEY) is None
+    assert storage._conn.execute("SELECT COUNT(*) FROM fsm").fetchone()[0] == 0
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_states_expire(storage_path):
+    clock = FakeClock()
+    storage = SQLiteStorage(storage_path, state_ttl=60, clock=clock)
+    await storage.set_state(KEY, Form.name)
+    await storage.flush()
+
+    clock.now += 61
+    assert await storage.get_state(KEY) is None
+    assert storage.sweep() == 1
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_get_data_returns_copy(storage_path):
+    storage = SQLiteStorage(storage_path)
+    await storage.set_data(KEY, {"name": "Аня"})
+    data = await storage.get_data(KEY)
+    data["name"] = "Другое"
+    assert await storage.get_data(KEY) == {"name": "Аня"}
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_profile_step_overhead_is_small(storage_path):
+    """Шаг анкеты (смена состояния + update_data) не ждет диска"""
+    storage = SQLiteStorage(storage_path)
+    await storage.set_state(KEY, Form.name)
+    steps = 1000
+
+    started = time.perf_counter()
+    for i in range(steps):
+        await storage.update_data(KEY, {"age": i})
+        await storage.set_state(KEY, Form.age if i % 2 else Form.name)
+        await storage.get_state(KEY)
+    per_step = (time.perf_counter() - started) / steps
+
+    assert per_step < 0.0005
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_bounded_storage_reads_do_not_create_entries():
+    storage = BoundedMemoryStorage()
+    for user_id in range(100):
+        await storage.get_state(StorageKey(bot_id=42, chat_id=user_id, user_id=user_id))
+    assert storage.stats()["size"] == 0
+
+    await storage.set_state(KEY, Form.name)
+    await storage.update_data(KEY, {"name": "Аня"})
+    assert await storage.get_data(KEY) == {"name": "Аня"}
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    assert storage.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_bounded_storage_expires_idle_and_evicts_lru():
+    clock = FakeClock()
+    storage = BoundedMemoryStorage(max_entries=2, idle_ttl=60, clock=clock)
+    keys = [StorageKey(bot_id=42, chat_id=i, user_id=i) for i in range(3)]
+
+    await storage.set_state(keys[0], Form.name)
+    await storage.set_state(keys[1], Form.name)
+    await storage.get_state(keys[0])  # keys[0] становится самым свежим
+    await storage.set_state(keys[2], Form.name)
+    assert await storage.get_state(keys[1]) is None
+    assert storage.stats()["evicted"] == 1
+
+    clock.now += 30
+    await storage.get_state(keys[2])
+    clock.now += 31
+    assert await storage.get_state(keys[0]) is None
+    assert await storage.get_state(keys[2]) == Form.name.state
+    assert storage.stats() == {"size": 1, "max_entries": 2, "expired": 1, "evicted": 1}
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+
+import pytest
+from aiogram import Bot, Dispatcher, F
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+from config_data.config import Webhook, load_webhook
+from webhook_server import build_app
+
+SAMPLE_UPDATES = os.path.join(
+    os.path.dirname(__file__), "..", "tools", "sample_updates.jsonl"
+)
+
+
+def load_sample_update() -> dict:
+    with open(SAMPLE_UPDATES, encoding="utf-8") as f:
+        return json.loads(f.readline())
+
+
+async def make_client(dp: Dispatcher, **webhook) -> TestClient:
+    bot = Bot(token="42:TEST")
+    config = Webhook(base_url="https://example.com", secret_token="s3cret", **webhook)
+    client = TestClient(TestServer(build_app(dp, bot, config)))
+    await client.start_server()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_wrong_secret_and_feeds_update():
+    dp = Dispatcher()
+    received = asyncio.Event()
+
+    @dp.message(F.text == "/start")
+    async def on_start(message: Message):
+        received.set()
+
+    client = await make_client(dp)
+    update = load_sample_update()
+    try:
+        response = await client.post("/webhook", json=update)
+        assert response.status == 401
+
+        response = await client.post(
+            "/webhook",
+            json=update,
+            headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"},
+        )
+        assert response.status == 200
+        await asyncio.wait_for(received.wait(), 1)
+
+        response = await client.get("/health")
+        assert response.status == 200
+        assert (await response.json())["status"] == "ok"
+        # Метрики на публичном порту вебхука не отдаются
+        assert (await client.get("/metrics")).status == 404
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_limits_concurrent_updates():
+    dp = Dispatcher()
+    release = asyncio.Event()
+    running = 0
+    peak = 0
+
+    @dp.message()
+    async def slow_handler(message: Message):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await release.wait()
+        running -= 1
+
+    client = await make_client(dp, max_concurrent_updates=2)
+    update = load_sample_update()
+    headers = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+    try:
+        posts = [
+            asyncio.create_task(
+                client.post(
+                    "/webhook", json={**update, "update_id": i}, headers=headers
+                )
+            )
+            for i in range(5)
+        ]
+        await asyncio.sleep(0.2)
+        # Третий и следующие запросы ждут свободного слота
+        assert peak == 2
+        assert sum(task.done() for task in posts) == 2
+
+        release.set()
+        responses = await asyncio.gather(*posts)
+        assert [r.status for r in responses] == [200] * 5
+    finally:
+        await client.close()
+
+
+def test_webhook_mode_requires_secret(monkeypatch):
+    monkeypatch.setenv("BOT_MODE", "webhook")
+    monkeypatch.setenv("WEBHOOK_BASE_URL", "https://example.com")
+    monkeypatch.delenv("WEBHOOK_SECRET", raising=False)
+    with pytest.raises(ValueError, match="WEBHOOK_SECRET"):
+        load_webhook()
+
+    monkeypatch.setenv("WEBHOOK_SECRET", "not allowed!")
+    with pytest.raises(ValueError, match="WEBHOOK_SECRET"):
+        load_webhook()
+
+    monkeypatch.setenv("WEBHOOK_SECRET", "s3cret_token-1")
+    assert load_webhook().secret_token == "s3cret_token-1"
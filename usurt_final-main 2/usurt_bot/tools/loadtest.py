@@ -0,0 +1,436 @@
+"""Нагрузочный тест бота без Telegram.
+
+Поднимает локальную заглушку Bot API (aiohttp), направляет на нее Bot и
+прогоняет синтетических пользователей через настоящие Dispatcher и роутеры
+из setup_dispatcher: /start, создание анкеты, поиск, лайки и пропуски по
+кнопкам из последнего полученного сообщения, матчи и статистика.
+
+Печатает апдейты в секунду, перцентили задержки по обработчикам, время в
+базе по методам AsyncDatabase и число вызовов Bot API.
+
+Запуск из папки usurt_bot:
+    python tools/loadtest.py --users 200 --swipes 20 --api-delay 0.02
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aiogram import BaseMiddleware, Bot, Dispatcher  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiohttp import web  # noqa: E402
+from async_database import AsyncDatabase  # noqa: E402
+from bot import setup_dispatcher  # noqa: E402
+from config_data.config import STORAGE_PRESETS  # noqa: E402
+from middleware import APIMetricsMiddleware  # noqa: E402
+from services.metrics import BotMetrics  # noqa: E402
+from services.notifications import NotificationQueue  # noqa: E402
+from services.services import CandidateQueue  # noqa: E402
+from storage import BoundedMemoryStorage  # noqa: E402
+
+BOT_TOKEN = "42:LOADTEST"
+# Методы Bot API, которые возвращают Message; остальные отвечают True
+MESSAGE_METHODS = {
+    "sendMessage",
+    "sendPhoto",
+    "editMessageText",
+    "editMessageCaption",
+    "editMessageMedia",
+    "editMessageReplyMarkup",
+}
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+class FakeBotAPI:
+    """Заглушка Bot API: отвечает на любые методы и запоминает кнопки
+
+    Последняя inline-клавиатура, отправленная в чат, нужна синтетическому
+    пользователю, чтобы "нажать" на ней лайк или пропуск. Сервер работает в
+    своем потоке со своим циклом событий, чтобы не отнимать время у бота.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls: Counter[str] = Counter()
+        self.keyboards: Dict[int, list[str]] = {}
+        self._message_ids = itertools.count(1)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> int:
+        """Запускает сервер в отдельном потоке и возвращает его порт"""
+        ready = threading.Event()
+        port: list[int] = []
+
+        async def serve():
+            self._loop = asyncio.get_running_loop()
+            self._stopped = asyncio.Event()
+            app = web.Application()
+            app.router.add_post("/bot{token}/{method}", self.handle)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port.append(site._server.sockets[0].getsockname()[1])
+            ready.set()
+            await self._stopped.wait()
+            await runner.cleanup()
+
+        self._thread = threading.Thread(
+            target=asyncio.run, args=(serve(),), daemon=True
+        )
+        self._thread.start()
+        ready.wait()
+        return port[0]
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        form = await request.post()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        if method == "getMe":
+            result: Any = {"id": 42, "is_bot": True, "first_name": "LoadTest"}
+        elif method in MESSAGE_METHODS:
+            chat_id = int(form.get("chat_id", 0))
+            markup = json.loads(form.get("reply_markup", "null") or "null")
+            if markup and "inline_keyboard" in markup:
+                self.keyboards[chat_id] = [
+                    button["callback_data"]
+                    for row in markup["inline_keyboard"]
+                    for button in row
+                    if "callback_data" in button
+                ]
+            result = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+class HandlerTimer(BaseMiddleware):
+    """Внутренняя middleware роутера: время выполнения каждого обработчика"""
+
+    def __init__(self, stats: Dict[str, list[float]]):
+        self.stats = stats
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            name = data["handler"].callback.__name__
+            self.stats[name].append(time.perf_counter() - started)
+
+
+class APITimer(BaseRequestMiddleware):
+    """Middleware сессии бота: время каждого запроса к Bot API"""
+
+    def __init__(self, stats: Dict[str, list[float]]):
+        self.stats = stats
+
+    async def __call__(self, make_request, bot, method):
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            self.stats[type(method).__name__].append(time.perf_counter() - started)
+
+
+def instrument_db(db: AsyncDatabase, stats: Dict[str, list[float]]):
+    """Оборачивает публичные корутины AsyncDatabase замером времени"""
+    for name in dir(db):
+        method = getattr(db, name)
+        if (
+            name.startswith("_")
+            or name == "close"
+            or not asyncio.iscoroutinefunction(method)
+        ):
+            continue
+
+        def timed(method=method, name=name):
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    stats[name].append(time.perf_counter() - started)
+
+            return wrapper
+
+        setattr(db, name, timed())
+
+
+class SyntheticUser:
+    FACULTIES = ("Информатики", "Экономики", "Строительный", "Транспортный")
+
+    def __init__(self, user_id: int, runner: "LoadTest"):
+        self.user_id = user_id
+        self.runner = runner
+        self.rng = random.Random(user_id)
+
+    def _user(self) -> dict:
+        return {
+            "id": self.user_id,
+            "is_bot": False,
+            "first_name": f"User{self.user_id}",
+        }
+
+    def _message(self, **fields) -> dict:
+        return {
+            "message_id": next(self.runner.ids),
+            "date": int(time.time()),
+            "chat": {"id": self.user_id, "type": "private"},
+            "from": self._user(),
+            **fields,
+        }
+
+    async def send(self, text: str):
+        message = self._message(text=text)
+        if text.startswith("/"):
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(text)}
+            ]
+        await self.runner.feed({"message": message})
+
+    async def send_photo(self):
+        photo = {
+            "file_id": f"photo-{self.user_id}",
+            "file_unique_id": f"u{self.user_id}",
+            "width": 640,
+            "height": 480,
+        }
+        await self.runner.feed({"message": self._message(photo=[photo])})
+
+    async def tap(self, data: str):
+        await self.runner.feed(
+            {
+                "callback_query": {
+                    "id": str(next(self.runner.ids)),
+                    "from": self._user(),
+                    "chat_instance": str(self.user_id),
+                    "data": data,
+                    "message": self._message(text="анкета"),
+                }
+            }
+        )
+
+    async def register(self):
+        await self.send("/start")
+        await self.send("Создать анкету")
+        await self.send(f"Студент {self.user_id}")
+        await self.send(str(self.rng.randint(17, 25)))
+        await self.send(self.rng.choice(("мужской", "женский")))
+        await self.send(self.rng.choice(self.FACULTIES))
+        await self.send(str(self.rng.randint(1, 5)))
+        await self.send("Люблю программирование и прогулки")
+        await self.send_photo()
+
+    async def browse(self, swipes: int, like_rate: float):
+        await self.send("Найти анкеты")
+        await self.send("Все анкеты")
+        for _ in range(swipes):
+            buttons = self.runner.api.keyboards.pop(self.user_id, [])
+            like = next((b for b in buttons if b.startswith("like_")), None)
+            skip = next((b for b in buttons if b.startswith("next_")), None)
+            if like is None or skip is None:
+                break
+            if self.rng.random() < like_rate:
+                # Лайк не листает ленту - следующую анкету открывает пропуск
+                await self.tap(like)
+            await self.tap(skip)
+
+    async def check_matches(self):
+        await self.send("Мои матчи")
+        await self.send("Моя статистика")
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.ids = itertools.count(1)
+        self.api = FakeBotAPI(args.api_delay)
+        self.handler_stats: Dict[str, list[float]] = defaultdict(list)
+        self.db_stats: Dict[str, list[float]] = defaultdict(list)
+        self.api_stats: Dict[str, list[float]] = defaultdict(list)
+        self.updates = 0
+        self.errors = 0
+        self.bot: Optional[Bot] = None
+        self.dp: Optional[Dispatcher] = None
+
+    async def feed(self, update: dict):
+        update["update_id"] = next(self.ids)
+        self.updates += 1
+        try:
+            await self.dp.feed_raw_update(self.bot, update)
+        except Exception as e:
+            self.errors += 1
+            logging.getLogger(__name__).error(f"Ошибка обработки апдейта: {e}")
+
+    async def run_phase(self, name: str, users: list[SyntheticUser], action):
+        slots = asyncio.Semaphore(self.args.concurrency)
+
+        async def run_user(user: SyntheticUser):
+            async with slots:
+                await action(user)
+
+        before = self.updates
+        started = time.perf_counter()
+        await asyncio.gather(*(run_user(user) for user in users))
+        elapsed = time.perf_counter() - started
+        count = self.updates - before
+        print(
+            f"{name:<12} {count:7d} апдейтов за {elapsed:6.2f} с  {count / elapsed:8.0f} апд/с"
+        )
+
+    async def run(self, db_path: str):
+        args = self.args
+        port = self.api.start()
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")
+        )
+        session.middleware(APITimer(self.api_stats))
+        # С --metrics включается та же запись метрик, что и в продакшене
+        metrics = BotMetrics() if args.metrics else None
+        if metrics is not None:
+            session.middleware(APIMetricsMiddleware(metrics))
+        self.bot = Bot(token=BOT_TOKEN, session=session)
+
+        db = AsyncDatabase(
+            db_path,
+            readers=args.readers,
+            write_behind=args.write_behind,
+            pragmas=STORAGE_PRESETS[args.storage].as_pragmas(),
+            observer=metrics.observe_db if metrics else None,
+        )
+        instrument_db(db, self.db_stats)
+        candidates = CandidateQueue(db)
+        notifications = NotificationQueue(
+            self.bot, global_rate=args.notify_rate, per_chat_rate=args.notify_rate
+        )
+        self.dp = Dispatcher(storage=BoundedMemoryStorage())
+        router = setup_dispatcher(self.dp, db, candidates, notifications, metrics)
+        timer = HandlerTimer(self.handler_stats)
+        router.message.middleware(timer)
+        router.callback_query.middleware(timer)
+
+        users = [SyntheticUser(user_id, self) for user_id in range(1, args.users + 1)]
+        started = time.perf_counter()
+        try:
+            await self.run_phase("регистрация", users, lambda u: u.register())
+            await self.run_phase(
+                "поиск", users, lambda u: u.browse(args.swipes, args.like_rate)
+            )
+            await self.run_phase("матчи", users, lambda u: u.check_matches())
+            elapsed = time.perf_counter() - started
+            pending = notifications.qsize()
+            await notifications.close(args.drain_timeout)
+        finally:
+            await db.close()
+            await self.bot.session.close()
+            self.api.stop()
+
+        print(
+            f"{'всего':<12} {self.updates:7d} апдейтов за {elapsed:6.2f} с  "
+            f"{self.updates / elapsed:8.0f} апд/с, ошибок: {self.errors}"
+        )
+        print(
+            f"Уведомления: отправлено {notifications.sent}, ошибок {notifications.failed}, "
+            f"в очереди к концу нагрузки {pending}"
+        )
+        self.report()
+
+    def report(self):
+        print("\nОбработчики (мс):")
+        self._table(self.handler_stats)
+        print("\nAsyncDatabase (мс):")
+        self._table(self.db_stats)
+        db_total = sum(sum(v) for v in self.db_stats.values())
+        print(
+            f"Время в базе на апдейт: {db_total / max(self.updates, 1) * 1000:.3f} мс"
+        )
+        print("\nBot API (мс, со стороны клиента):")
+        self._table(self.api_stats)
+        print(
+            "Вызовы на стороне заглушки: "
+            + ", ".join(f"{method}={n}" for method, n in self.api.calls.most_common())
+        )
+
+    @staticmethod
+    def _table(stats: Dict[str, list[float]]):
+        print(f"  {'':<28} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+        for name, values in sorted(stats.items(), key=lambda item: -sum(item[1])):
+            print(
+                f"  {name:<28} {len(values):7d} "
+                + " ".join(
+                    f"{percentile(values, q) * 1000:8.2f}" for q in (0.5, 0.95, 0.99)
+                )
+                + f" {max(values) * 1000:8.2f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--swipes", type=int, default=20, help="анкет на пользователя")
+    parser.add_argument("--like-rate", type=float, default=0.5)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=100,
+        help="одновременно активных пользователей",
+    )
+    parser.add_argument(
+        "--api-delay", type=float, default=0.0, help="задержка заглушки Bot API, с"
+    )
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--write-behind", action="store_true")
+    parser.add_argument(
+        "--storage", choices=sorted(STORAGE_PRESETS), default="production"
+    )
+    parser.add_argument(
+        "--notify-rate", type=float, default=1000.0, help="лимит уведомлений в секунду"
+    )
+    parser.add_argument("--drain-timeout", type=float, default=5.0)
+    parser.add_argument("--metrics", action="store_true", help="включить запись метрик")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(LoadTest(args).run(os.path.join(tmp, "loadtest.db")))
+
+
+if __name__ == "__main__":
+    main()
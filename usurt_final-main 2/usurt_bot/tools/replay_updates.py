@@ -0,0 +1,79 @@
+"""Отправка записанных апдейтов на локальный вебхук бота.
+
+Файл - JSON Lines, по одному объекту Update на строку (например, сохраненные
+из getUpdates или из лога). Каждый апдейт отправляется POST-запросом с
+заголовком секретного токена, как это делает Telegram; update_id по желанию
+перенумеровываются, чтобы повторный прогон не выглядел дубликатом.
+
+Запуск из папки usurt_bot (бот запущен с BOT_MODE=webhook):
+    python tools/replay_updates.py tools/sample_updates.jsonl \\
+        --url http://127.0.0.1:8080/webhook --secret $WEBHOOK_SECRET --repeat 100
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from aiohttp import ClientSession
+
+
+def load_updates(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(args) -> None:
+    updates = load_updates(args.file) * args.repeat
+    update_ids = itertools.count(args.first_update_id)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    statuses: Counter[int] = Counter()
+    latencies: list[float] = []
+    slots = asyncio.Semaphore(args.concurrency)
+
+    async def post(session: ClientSession, update: dict):
+        if args.renumber:
+            update = {**update, "update_id": next(update_ids)}
+        async with slots:
+            started = time.perf_counter()
+            async with session.post(args.url, json=update, headers=headers) as response:
+                await response.read()
+                statuses[response.status] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with ClientSession() as session:
+        await asyncio.gather(*(post(session, update) for update in updates))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(
+        f"Отправлено {len(updates)} апдейтов за {elapsed:.2f} с "
+        f"({len(updates) / elapsed:.0f}/с)"
+    )
+    print(
+        "Ответы: "
+        + ", ".join(f"{status}: {n}" for status, n in sorted(statuses.items()))
+    )
+    if latencies:
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(0.99 * (len(latencies) - 1))] * 1000
+        print(f"Задержка ответа: p50={p50:.2f} ms  p99={p99:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="JSON Lines с объектами Update")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default=None, help="значение WEBHOOK_SECRET")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--no-renumber", dest="renumber", action="store_false")
+    parser.add_argument("--first-update-id", type=int, default=1)
+    asyncio.run(replay(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from config_data.config import Webhook
+
+logger = logging.getLogger(__name__)
+
+
+class LimitedRequestHandler(SimpleRequestHandler):
+    """Обработчик вебхука с ограничением числа одновременно обрабатываемых апдейтов.
+
+    Апдейт подтверждается Telegram сразу, а обрабатывается в фоне. Когда занято
+    max_concurrent_updates слотов, ответ на следующий POST откладывается до
+    освобождения слота: Telegram не шлет больше max_connections запросов
+    одновременно, и очередь задач в памяти не растет без ограничений.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        max_concurrent_updates: int = 100,
+        secret_token: str | None = None,
+        **data: Any,
+    ):
+        super().__init__(
+            dispatcher=dispatcher,
+            bot=bot,
+            handle_in_background=True,
+            secret_token=secret_token,
+            **data,
+        )
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def _handle_request_background(
+        self, bot: Bot, request: web.Request
+    ) -> web.Response:
+        # Слот освобождает _background_feed_update, когда апдейт обработан
+        await self._slots.acquire()
+        try:
+            return await super()._handle_request_background(bot=bot, request=request)
+        except Exception:
+            self._slots.release()
+            raise
+
+    async def _background_feed_update(self, bot: Bot, update: dict[str, Any]):
+        try:
+            await super()._background_feed_update(bot=bot, update=update)
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        """Дожидается обработки принятых апдейтов; сессию бота закрывает bot.py"""
+        if self._background_feed_update_tasks:
+            await asyncio.gather(
+                *self._background_feed_update_tasks, return_exceptions=True
+            )
+
+
+def build_app(
+    dp: Dispatcher,
+    bot: Bot,
+    config: Webhook,
+    **data: Any,
+) -> web.Application:
+    """Создает aiohttp-приложение с маршрутом вебхука и /health
+
+    Метрики сюда не подключаются: порт вебхука публичный, а /metrics
+    обслуживает отдельный локальный сервер (start_metrics_server).
+    """
+    app = web.Application()
+    handler = LimitedRequestHandler(
+        dp,
+        bot,
+        max_concurrent_updates=config.max_concurrent_updates,
+        secret_token=config.secret_token,
+        **data,
+    )
+    handler.register(app, path=config.path)
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "in_flight": handler.in_flight})
+
+    app.router.add_get("/health", health)
+    setup_application(app, dp, bot=bot, **data)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    config: Webhook,
+    **data: Any,
+):
+    """Регистрирует вебхук в Telegram и обслуживает его до отмены задачи"""
+    app = build_app(dp, bot, config, **data)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.host, port=config.port)
+    await site.start()
+    logger.info(f"Webhook server listening on {config.host}:{config.port}{config.path}")
+
+    try:
+        await bot.set_webhook(
+            url=config.url,
+            secret_token=config.secret_token,
+            max_connections=config.max_connections,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=True,
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()